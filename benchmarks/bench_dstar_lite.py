@@ -0,0 +1,61 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import DStarLite, Entity, PathGrid, Vec2, grid_pos, level_visibility, load_level
+
+N_FRAMES = 300
+
+wall = np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+free = np.argwhere(wall == 0)
+# Like BotQuest, paths get their checkpoint and waypoints from the visibility table of the level.
+visibility = level_visibility(wall, 10)
+
+
+def make_entity(x, y):
+  return Entity(dict(type='slime', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+
+
+def make_frames(goals_move: bool):
+  '''The player and the goals walk a couple of pixels per frame around the level, like in a game.'''
+  rng = np.random.default_rng(0)
+  frames = []
+  player = (free[0] + 0.5) * 10
+  goals = [(free[k] + 0.5) * 10 for k in rng.choice(len(free), 3)]
+  for _ in range(N_FRAMES):
+    player = player + rng.uniform(-2, 2, 2)
+    if goals_move:
+      goals = [p + rng.uniform(-2, 2, 2) for p in goals]
+    frames.append((Vec2(*player), [make_entity(*p) for p in goals]))
+  return frames
+
+
+def goal_mask(entities):
+  goal = np.zeros(wall.shape, dtype=np.bool_)
+  for e in entities:
+    i, j = grid_pos(e.p, 10)
+    goal[i % 32, j % 24] = True
+  return goal
+
+
+for name, goals_move in (('moving enemies', True), ('stuck arrows', False)):
+  frames = make_frames(goals_move)
+  searches = [(grid_pos(s, 10), goal_mask(e)) for s, e in frames]
+  path_grid = PathGrid(10)
+  path_grid.visibility = visibility
+  t_search = timeit.timeit(lambda: [path_grid.search((i % 32, j % 24), g, wall) for (i, j), g in searches], number=1)
+  # Total per frame: what the bot pays for the closest entity and the path to it.
+  t_grid = timeit.timeit(lambda: [path_grid.get_closest_entity(s, e, wall) for s, e in frames], number=1)
+  print(f'{name}: PathGrid search {t_search/N_FRAMES*1e6:7.1f}us, total {t_grid/N_FRAMES*1e6:7.1f}us per frame')
+  for budget in (300, 50):
+    planner = DStarLite(10, budget)
+    t_update = timeit.timeit(lambda: [planner.update(s, g, wall) for s, g in searches], number=1)
+    planner = DStarLite(10, budget)
+    planner.visibility = visibility
+    t_total = timeit.timeit(lambda: [planner.get_closest_entity(s, e, wall) for s, e in frames], number=1)
+    print(f'  DStarLite budget {budget:3d}: update {t_update/N_FRAMES*1e6:7.1f}us, total {t_total/N_FRAMES*1e6:7.1f}us'
+          f' per frame, {t_grid/t_total:5.2f}x PathGrid | {planner.repairs} repairs, {planner.replans} replans')
@@ -0,0 +1,40 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+from common import EntityIndex, is_stuck_arrow, to_entities
+
+from benchmarks.synthetic import make_update
+
+N_REPEAT = 2000
+
+
+def scan_lookups(entities, target_ids):
+  '''Lookups the way the envs, objectives and bots did before the index, each one rescanning the entities.'''
+  for e in entities:
+    if e.type == 'archer' and e['playerIndex'] == 0:
+      break
+  enemies = [e for e in entities if e['isEnemy']]
+  targets = [e for e in entities if e['id'] in target_ids]
+  arrows = [e for e in entities if e.type == 'arrow' and is_stuck_arrow(e)]
+  return enemies, targets, arrows
+
+
+def index_lookups(entities, target_ids):
+  '''Same lookups, building the index once and querying it.'''
+  entity_index = EntityIndex(entities)
+  entity_index.archer(0)
+  enemies = entity_index.enemies
+  targets = [e for e in (entity_index.get(id) for id in target_ids) if e]
+  arrows = [e for e in entity_index.of_type('arrow') if is_stuck_arrow(e)]
+  return enemies, targets, arrows
+
+
+for n_arrows in [0, 100, 300, 600]:
+  entities = to_entities(make_update(n_arrows=n_arrows)['entities'])
+  target_list = [e['id'] for e in entities if e['isEnemy']]
+  t_scan = timeit.timeit(lambda: scan_lookups(entities, target_list), number=N_REPEAT) / N_REPEAT
+  t_index = timeit.timeit(lambda: index_lookups(entities, set(target_list)), number=N_REPEAT) / N_REPEAT
+  print(f'{len(entities):4d} entities ({n_arrows:3d} arrows): scan {t_scan*1e6:8.1f}us  index {t_index*1e6:8.1f}us  speedup {t_scan/t_index:5.2f}x')
@@ -0,0 +1,38 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import random
+import timeit
+
+import numpy as np
+
+from common import FreeSpaceIndex, GridView, Vec2, grid_pos, load_level
+
+N_REPEAT = 200
+
+
+def rejection_sample(gv):
+  '''Tries random pixels until one is in a free cell, the way FollowTargetObjective used to pick targets.'''
+  while True:
+    x = random.randint(0, 320)
+    y = random.randint(0, 240)
+    i, j = grid_pos(Vec2(x, y), gv.csize)
+    if not gv.fixed_grid10[i][j]:
+      return x, y
+
+
+scenario = load_level('level_sample.xml')
+for gf in [1, 2, 5]:
+  gv = GridView(gf)
+  gv.set_scenario(scenario)
+  t_build = timeit.timeit(lambda: FreeSpaceIndex(gv, (8, 14), on_floor=True, reachable_from=(160, 130)), number=3) / 3
+  index = FreeSpaceIndex(gv, (5, 5))
+  weighted = FreeSpaceIndex(gv, (5, 5), weights=np.random.default_rng(0).random(gv.grid.shape))
+  t_rej = timeit.timeit(lambda: rejection_sample(gv), number=N_REPEAT) / N_REPEAT
+  t_one = timeit.timeit(lambda: index.sample(), number=N_REPEAT) / N_REPEAT
+  t_weighted = timeit.timeit(lambda: weighted.sample(), number=N_REPEAT) / N_REPEAT
+  t_many = timeit.timeit(lambda: weighted.sample(1000), number=N_REPEAT) / N_REPEAT
+  t_near = timeit.timeit(lambda: index.sample_near((160, 130), 20, 60), number=N_REPEAT) / N_REPEAT
+  print(f'gf {gf}: build {t_build*1e3:6.2f}ms | rejection {t_rej*1e6:6.1f}us | sample {t_one*1e6:6.1f}us'
+        f' | weighted {t_weighted*1e6:6.1f}us | 1000 weighted {t_many*1e6:6.1f}us | band {t_near*1e6:6.1f}us')
@@ -0,0 +1,82 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import HEIGHT, HH, HW, WIDTH, Entity, GridView, Vec2, crop_grid, fill_grid, upsample_grid
+
+from benchmarks.synthetic import make_scenario
+
+N_REPEAT = 200
+
+
+def upsample_loop(grid10, csize, gf):
+  '''The python loop GridView.set_scenario used before.'''
+  grid = np.zeros((WIDTH // gf, HEIGHT // gf), dtype=np.int8)
+  for i in range(grid10.shape[0]):
+    for j in range(grid10.shape[1]):
+      if grid10[i][j] == 1:
+        grid[csize*i // gf:csize*(i+1) // gf, csize*j // gf:csize*(j+1) // gf] = 1
+  return grid
+
+
+scenario = make_scenario()
+
+print('set_scenario per reset:')
+for gf in [2, 5, 10]:
+  t_loop = timeit.timeit(lambda: upsample_loop(np.array(scenario['grid']), 10, gf), number=N_REPEAT) / N_REPEAT
+  t_vec = timeit.timeit(lambda: upsample_grid(np.array(scenario['grid']), 10, gf), number=N_REPEAT) / N_REPEAT
+  gv = GridView(gf)
+  t_cached = timeit.timeit(lambda: gv.set_scenario(scenario), number=N_REPEAT) / N_REPEAT
+  print(f'  grid_factor {gf:2d}: loop {t_loop*1e6:7.1f}us | vectorized {t_vec*1e6:6.1f}us | cached {t_cached*1e6:6.1f}us')
+
+
+def update_roll(gv, entities, me):
+  '''The copy and roll GridView.update used before.'''
+  grid = gv.fixed_grid.copy()
+  for e in entities:
+    if e.type == 'crackedWall':
+      fill_grid(e, grid)
+  shifted = np.roll(grid, -int(me.p.x - HW) // gv.gf, axis=0)
+  return np.roll(shifted, -int(me.p.y - HH) // gv.gf, axis=1)
+
+
+def wall(x, y):
+  return Entity(dict(type='crackedWall', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=False))
+
+
+print('update per step:')
+archer = Entity(dict(type='archer', pos=dict(x=37, y=211), vel=dict(x=0, y=0), size=dict(x=8, y=14), isEnemy=False))
+for n_walls in [0, 4, 16]:
+  entities = [archer] + [wall(20 + 30*k % WIDTH, 15 + 20*k % HEIGHT) for k in range(n_walls)]
+  for gf in [2, 5]:
+    gv = GridView(gf)
+    gv.set_scenario(scenario)
+    t_roll = timeit.timeit(lambda: update_roll(gv, entities, archer), number=N_REPEAT) / N_REPEAT
+    t_view = timeit.timeit(lambda: (gv.update(entities, archer), gv.view(60)), number=N_REPEAT) / N_REPEAT
+    print(f'  {n_walls:2d} cracked walls, grid_factor {gf}: copy+roll {t_roll*1e6:6.1f}us | tiled view {t_view*1e6:6.1f}us')
+
+
+def region_collision_crop(gv, bl, tr):
+  '''The crop_grid based check GridView.is_region_collision used before.'''
+  crop = crop_grid(bl, tr, gv.grid)
+  if crop.shape[1] == 0:
+    return True
+  return crop.max() != 0
+
+
+print('region collision queries:')
+gv = GridView(5)
+gv.set_scenario(scenario)
+gv.update([archer], archer)
+rng = np.random.default_rng(0)
+bl = rng.uniform((0, 0), (WIDTH, HEIGHT), size=(2000, 2))
+tr = bl + rng.uniform(8, 30, size=(2000, 2))
+rects = [(Vec2(*a), Vec2(*b)) for a, b in zip(bl, tr)]
+t_crop = timeit.timeit(lambda: [region_collision_crop(gv, a, b) for a, b in rects], number=5) / 5
+t_sat = timeit.timeit(lambda: [gv.is_region_collision(a, b) for a, b in rects], number=5) / 5
+t_batch = timeit.timeit(lambda: gv.is_region_collision_batch(bl, tr), number=5) / 5
+print(f'  {len(rects)} regions: crop_grid {t_crop*1e3:6.2f}ms | summed-area table {t_sat*1e3:6.2f}ms | batch {t_batch*1e3:6.3f}ms')
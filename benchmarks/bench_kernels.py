@@ -0,0 +1,57 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import (Entity, GridView, PathGrid, Vec2, available_backends, cast_rays, kernels, load_level, ray_directions,
+                    set_backend)
+
+N_REPEAT = 20
+
+
+def time(fn, number=N_REPEAT):
+  fn()
+  return timeit.timeit(fn, number=number) / number
+
+
+gv = GridView(1)
+gv.set_scenario(load_level('level_sample.xml'))
+wall10 = gv.fixed_grid10
+enemy = Entity(dict(type='slime', pos=dict(x=290, y=35), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+start = (16, 13)
+
+blocked = np.asarray(wall10)
+goal = np.zeros(blocked.shape, dtype=np.bool_)
+goal[29, 3] = True
+stamp = np.zeros(blocked.shape, dtype=np.int32)
+parent = np.zeros(blocked.shape, dtype=np.int32)
+dist = np.zeros(blocked.shape, dtype=np.int32)
+queue = np.zeros(blocked.size, dtype=np.int32)
+marks = iter(range(1, 1 << 30))
+
+t = time(lambda: PathGrid(10).get_closest_entity(Vec2(165, 135), [enemy], wall10))
+print(f'bfs 32x24: PathGrid {t*1e3:6.3f}ms')
+for name in available_backends():
+  set_backend(name)
+  t = time(lambda: kernels.bfs(blocked, start, goal, stamp, next(marks), parent, dist, queue))
+  print(f'bfs 32x24: {name} {t*1e3:6.3f}ms')
+
+origin = (160.5, 130.5)
+directions = ray_directions(256)
+fine_blocked = np.asarray(gv.grid)
+fine_goal = np.zeros(fine_blocked.shape, dtype=np.bool_)
+fine_stamp = np.zeros(fine_blocked.shape, dtype=np.int32)
+fine_parent = np.zeros(fine_blocked.shape, dtype=np.int32)
+fine_dist = np.zeros(fine_blocked.shape, dtype=np.int32)
+fine_queue = np.zeros(fine_blocked.size, dtype=np.int32)
+for name in available_backends():
+  set_backend(name)
+  t_bfs = time(lambda: kernels.bfs(fine_blocked, (160, 130), fine_goal, fine_stamp, next(marks), fine_parent, fine_dist,
+                                   fine_queue), number=3)
+  t_rays = time(lambda: cast_rays(gv.grid, 1, origin, directions, 160))
+  print(f'{name}: full bfs 320x240 {t_bfs*1e3:7.2f}ms | 256 rays of 160px at gf 1 {t_rays*1e3:6.2f}ms')
+if 'numba' not in available_backends():
+  print('numba is not installed, only the numpy backend was measured')
@@ -0,0 +1,72 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import (GridView, NavigationTable, PathGrid, all_pairs_distances, entity_distance_fields, kernels, load_level,
+                    next_steps)
+
+N_REPEAT = 200
+
+wall = np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+t_dist = timeit.timeit(lambda: all_pairs_distances(wall), number=3) / 3
+dist = all_pairs_distances(wall)
+t_next = timeit.timeit(lambda: next_steps(wall, dist), number=3) / 3
+print(f'build {wall.shape}: distances {t_dist*1e3:6.1f}ms | next steps {t_next*1e3:6.1f}ms')
+
+table = NavigationTable(wall)
+path_grid = PathGrid(10)
+source = (16, 13)
+target = (29, 3)
+goal = np.zeros(wall.shape, dtype=np.bool_)
+goal[target] = True
+t_bfs = timeit.timeit(lambda: path_grid.search(source, goal, wall), number=N_REPEAT) / N_REPEAT
+t_dist = timeit.timeit(lambda: table.distance(source, target), number=N_REPEAT) / N_REPEAT
+t_next = timeit.timeit(lambda: table.next_cell(source, target), number=N_REPEAT) / N_REPEAT
+t_path = timeit.timeit(lambda: table.path(source, target), number=N_REPEAT) / N_REPEAT
+print(f'{source} to {target}: bfs {t_bfs*1e6:7.1f}us | distance {t_dist*1e6:5.1f}us | next step {t_next*1e6:5.1f}us'
+      f' | path {t_path*1e6:6.1f}us')
+
+# Nearest of many entities: one multi-source pass per category against a search per entity.
+rng = np.random.default_rng(0)
+for gf in (10, 5, 2):
+  gv = GridView(gf)
+  gv.set_scenario(load_level('level_sample.xml'))
+  free = np.argwhere(gv.grid == 0)
+  positions = {name: (free[rng.integers(len(free), size=k)] + 0.5) * gf for name, k in (('enemies', 6), ('arrows', 12))}
+  stamp = np.zeros(gv.grid.shape, dtype=np.int32)
+  parent = np.zeros_like(stamp)
+  dist = np.zeros_like(stamp)
+  queue = np.zeros(gv.grid.size, dtype=np.int32)
+  no_goal = np.zeros(gv.grid.shape, dtype=np.bool_)
+
+  def per_entity():
+    for p in positions.values():
+      for x, y in p:
+        kernels.bfs(gv.grid, (int(x // gf), int(y // gf)), no_goal, stamp, 1, parent, dist, queue)
+
+  t_each = timeit.timeit(per_entity, number=5) / 5
+  t_fields = timeit.timeit(lambda: entity_distance_fields(gv.grid, gf, positions), number=5) / 5
+  t_capped = timeit.timeit(lambda: entity_distance_fields(gv.grid, gf, positions, 120 // gf), number=5) / 5
+  print(f'gf {gf:2d} {gv.grid.shape}, 18 entities: bfs per entity {t_each*1e3:7.2f}ms | fields {t_fields*1e3:6.2f}ms'
+        f' | fields up to 120px {t_capped*1e3:6.2f}ms')
+
+# Many agents on the same level: one batched query against a lookup, or a search, per agent.
+for n in (16, 256):
+  free = np.argwhere(wall == 0)
+  sources = free[rng.integers(len(free), size=n)]
+  targets = free[rng.integers(len(free), size=n)]
+  pairs = [(tuple(s), tuple(t)) for s, t in zip(sources, targets)]
+  goals = []
+  for t in targets:
+    goal = np.zeros(wall.shape, dtype=np.bool_)
+    goal[tuple(t)] = True
+    goals.append(goal)
+  t_batch = timeit.timeit(lambda: table.query(sources, targets), number=20) / 20
+  t_each = timeit.timeit(lambda: [(table.next_cell(s, t), table.distance(s, t)) for s, t in pairs], number=20) / 20
+  t_bfs = timeit.timeit(lambda: [path_grid.search(s, g, wall) for (s, _), g in zip(pairs, goals)], number=1)
+  print(f'{n:3d} agents: query {t_batch*1e6:7.1f}us | lookup per agent {t_each*1e6:8.1f}us'
+        f' | search per agent {t_bfs*1e6:9.1f}us')
@@ -0,0 +1,55 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from gym import spaces
+
+from common import Entity, GridView, load_level
+from envs import (ArrowDangerObservation, DistanceFieldObservation, GridObservation, LidarObservation,
+                  ObservationBuffer, PlayerObservation)
+
+N_STEPS = 500
+
+scenario = load_level('level_sample.xml')
+player = Entity(dict(type='archer', pos=dict(x=160, y=130), vel=dict(x=3, y=-12), size=dict(x=8, y=14), isEnemy=False,
+                     dodgeCooldown=False, state='normal', facing=1, onGround=True, onWall=False))
+entities = [player] + [Entity(dict(type='slime', pos=dict(x=x, y=135), vel=dict(x=0, y=0), size=dict(x=10, y=10),
+                                   isEnemy=True)) for x in (60, 185, 260)]
+
+
+def make_components(gf):
+  gv = GridView(gf)
+  return [PlayerObservation(), GridObservation(gv, sight=50), ArrowDangerObservation(gv), LidarObservation(gv),
+          DistanceFieldObservation(gv, sight=50)]
+
+
+for gf in (5, 2):
+  components = make_components(gf)
+  obs_space = {}
+  for c in components:
+    c.extend_obs_space(obs_space)
+  buffer = ObservationBuffer(spaces.Dict(obs_space))
+  for c in components:
+    c.post_reset(scenario, player, entities, {})
+
+  def step_dict():
+    obs_dict = {}
+    for c in components:
+      c.post_step(player, entities, '', obs_dict)
+    # What a flat policy input needs from the dict.
+    return np.concatenate([np.ravel(obs_dict[k]) for k in buffer.slices]).astype(np.float32)
+
+  def step_buffer():
+    for c in components:
+      c.post_step(player, entities, '', buffer.obs_dict)
+    return buffer.snapshot_flat()
+
+  assert np.allclose(step_dict(), step_buffer())
+  t_dict = min(timeit.repeat(step_dict, number=N_STEPS // 5, repeat=5)) * 5
+  t_buffer = min(timeit.repeat(step_buffer, number=N_STEPS // 5, repeat=5)) * 5
+  print(f'gf {gf}, {buffer.flat.size} values: new dict + concatenate {t_dict/N_STEPS*1e6:7.1f}us,'
+        f' buffer {t_buffer/N_STEPS*1e6:7.1f}us per step')
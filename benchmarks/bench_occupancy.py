@@ -0,0 +1,45 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import CHANNELS, GridView, OccupancyRasterizer, fill_grid, to_entities
+
+from benchmarks.synthetic import make_scenario, make_update
+
+FRAME_BUDGET = 1 / 60
+N_REPEAT = 50
+
+
+def rasterize_fill_grid(gv, entities):
+  '''One fill_grid call per entity into a grid per channel, the way GridView.update fills cracked walls.'''
+  out = np.zeros((len(CHANNELS),) + gv.fixed_grid.shape, dtype=np.int8)
+  out[0] = gv.fixed_grid
+  for e in entities:
+    if e.isEnemy:
+      fill_grid(e, out[1])
+    elif e.type == 'arrow':
+      fill_grid(e, out[2 if e['state'] == 'flying' else 3])
+    elif e.type == 'item':
+      fill_grid(e, out[4])
+    elif e.type == 'archer':
+      fill_grid(e, out[5])
+  return out
+
+
+for gf in [2, 5]:
+  gv = GridView(gf)
+  gv.set_scenario(make_scenario())
+  rasterizer = OccupancyRasterizer(gv, exclude_player=0)
+  # Compiles the kernel, if any, before timing.
+  rasterizer.rasterize(make_update(n_arrows=1)['entities'])
+  for n_arrows in [10, 100, 500]:
+    update = make_update(n_arrows=n_arrows)
+    entities = to_entities(update['entities'])
+    t = timeit.timeit(lambda: rasterizer.rasterize(update['entities']), number=N_REPEAT) / N_REPEAT
+    t_loop = timeit.timeit(lambda: rasterize_fill_grid(gv, entities), number=10) / 10
+    print(f'grid_factor {gf}, {len(entities):3d} entities: {t*1e6:7.1f}us ({t / FRAME_BUDGET:5.2%} of a 60fps frame)'
+          f' | fill_grid per entity {t_loop*1e6:7.1f}us')
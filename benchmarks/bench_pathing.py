@@ -0,0 +1,112 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+from typing import List, Optional, Tuple
+
+from numpy.typing import NDArray
+
+from common import Entity, GPath, GridView, PathGrid, Vec2, get_backend, grid_pos, line_of_sight, load_level
+
+N_REPEAT = 200
+
+
+class LegacyPathCell:
+  def __init__(self, i, j, depth, cell_size: int):
+    self.i = i
+    self.j = j
+    self.pos = Vec2((i+0.5)*cell_size, (j+0.5)*cell_size)
+    self.depth = depth
+    self.visited = False
+    self.prev: Optional[LegacyPathCell] = None
+    self.next: Optional[LegacyPathCell] = None
+    self.entities = []
+
+
+class LegacyPathGrid:
+  '''PathGrid before it searched on arrays: a graph of cell objects searched with list.pop(0), built again every frame.'''
+  def __init__(self, cell_size: int):
+    self.grid = [[LegacyPathCell(i, j, 0, cell_size) for j in range(24)] for i in range(32)]
+    self.csize = cell_size
+
+  def cell(self, i, j) -> LegacyPathCell:
+    return self.grid[i % 32][j % 24]
+
+  def add_to_visit(self, fro: LegacyPathCell, to: LegacyPathCell, to_visit: List[LegacyPathCell]):
+    if to.prev:
+      raise Exception('({}, {}) already linked to ({}, {})'.format(to.i, to.j, to.prev.i, to.prev.j))
+    to.prev = fro
+    to_visit.append(to)
+    to.visited = True
+
+  def is_blocked(self, cell, wall):
+    return wall[cell.i][cell.j] != 0
+
+  def create_path(self, start: LegacyPathCell, end: LegacyPathCell, wall) -> GPath:
+    if start == end:
+      return GPath(start, end, start)
+    next = end
+    cell = end.prev
+    while cell:
+      cell.next = next
+      if cell == start:
+        break
+      next = cell
+      cell = next.prev
+    if cell != start:
+      raise Exception('A contiguous path between start and end is expected')
+    cells = [start]
+    while cells[-1] != end:
+      cells.append(cells[-1].next)
+    clean = line_of_sight(wall, self.csize, (start.pos.x, start.pos.y), [(c.pos.x, c.pos.y) for c in cells[1:]])
+    if clean.all():
+      return GPath(start, end, end)
+    return GPath(start, end, cells[int(clean.argmin())])
+
+  def get_closest_entity(self, startPos: Vec2, entities: List[Entity], wall: NDArray) -> Tuple[Optional[Entity], Optional[GPath]]:
+    for e in entities:
+      p = grid_pos(e.p, self.csize)
+      self.cell(p[0], p[1]).entities.append(e)
+    p = grid_pos(startPos, self.csize)
+    startCell = self.cell(p[0], p[1])
+    to_visit: List[LegacyPathCell] = [startCell]
+    while to_visit:
+      cell = to_visit.pop(0)
+      for e in cell.entities:
+        return e, self.create_path(startCell, cell, wall)
+
+      def visit_next(i, j):
+        next = self.cell(cell.i + i, cell.j + j)
+        if not next.visited and not self.is_blocked(next, wall):
+          self.add_to_visit(cell, next, to_visit)
+
+      visit_next(0, 1)
+      visit_next(0, -1)
+      visit_next(1, 0)
+      visit_next(-1, 0)
+    return None, None
+
+
+def make_entity(x, y):
+  return Entity(dict(type='slime', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+
+
+gv = GridView(1)
+gv.set_scenario(load_level('level_sample.xml'))
+start = Vec2(165, 135)
+path_grid = PathGrid(gv.csize)
+print(f'Kernel backend: {get_backend()}')
+for name, entities in [('near', [make_entity(185, 135)]), ('far', [make_entity(290, 35)]), ('none', [])]:
+  legacy = LegacyPathGrid(gv.csize).get_closest_entity(start, entities, gv.fixed_grid10)
+  current = path_grid.get_closest_entity(start, entities, gv.fixed_grid10)
+  assert legacy[0] is current[0]
+  t_old = timeit.timeit(lambda: LegacyPathGrid(gv.csize).get_closest_entity(start, entities, gv.fixed_grid10),
+                        number=N_REPEAT) / N_REPEAT
+  t_new = timeit.timeit(lambda: PathGrid(gv.csize).get_closest_entity(start, entities, gv.fixed_grid10),
+                        number=N_REPEAT) / N_REPEAT
+  t_reused = timeit.timeit(lambda: path_grid.get_closest_entity(start, entities, gv.fixed_grid10),
+                           number=N_REPEAT) / N_REPEAT
+  print(f'{name:4s} target: PathCell search {t_old*1e3:6.3f}ms | PathGrid per frame {t_new*1e3:6.3f}ms'
+        f' | reused {t_reused*1e3:6.3f}ms ({t_old / t_reused:4.1f}x)')
@@ -0,0 +1,33 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import PlatformGraph, load_level
+
+N_REPEAT = 200
+
+wall = np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+t_build = timeit.timeit(lambda: PlatformGraph(wall), number=5) / 5
+graph = PlatformGraph(wall)
+print(f'build {wall.shape}: {t_build*1e3:6.1f}ms | {len(graph.nodes)} nodes, {len(graph.targets)} edges')
+
+rng = np.random.default_rng(0)
+pairs = [tuple(graph.cell(k) for k in rng.choice(graph.nodes, 2)) for _ in range(N_REPEAT)]
+
+
+def first():
+  for s, g in pairs:
+    graph._routes.clear()
+    graph.route(s, g)
+
+
+t_search = timeit.timeit(first, number=1) / N_REPEAT
+for s, g in pairs:
+  graph.route(s, g)
+t_cached = timeit.timeit(lambda: [graph.route(s, g) for s, g in pairs], number=1) / N_REPEAT
+t_reach = timeit.timeit(lambda: graph._flood(graph.nodes[0]), number=N_REPEAT) / N_REPEAT
+print(f'route: A* {t_search*1e6:7.1f}us | cached {t_cached*1e6:5.1f}us | reachable set {t_reach*1e6:7.1f}us')
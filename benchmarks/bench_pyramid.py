@@ -0,0 +1,42 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import GridView, get_backend, line_of_sight, load_level
+
+N_REPEAT = 20
+
+
+def brute_nearest_free(grid, cell_size, pos):
+  i, j = np.nonzero(grid == 0)
+  size = np.multiply(grid.shape, cell_size)
+  d = (np.stack([i, j], axis=1) * cell_size + cell_size / 2 - pos + size / 2) % size - size / 2
+  return np.argmin(np.hypot(*d.T))
+
+
+scenario = load_level('level_sample.xml')
+rng = np.random.default_rng(0)
+print(f'Kernel backend: {get_backend()}')
+for gf in [1, 2, 5]:
+  gv = GridView(gf)
+  gv.set_scenario(scenario)
+  pyramid = gv.get_pyramid()
+  for n, reach in [(1, 150), (100, 40), (100, 150), (300, 150), (1000, 150)]:
+    p1 = rng.uniform(0, [320, 240], size=(n, 2))
+    p2 = p1 + rng.uniform(-reach, reach, size=(n, 2))
+    # Compiles the kernels, if any, before timing.
+    line_of_sight(gv.grid, gf, p1, p2)
+    pyramid.line_of_sight(p1, p2)
+    t_fine = timeit.timeit(lambda: line_of_sight(gv.grid, gf, p1, p2), number=N_REPEAT) / N_REPEAT
+    t_pyr = timeit.timeit(lambda: pyramid.line_of_sight(p1, p2), number=N_REPEAT) / N_REPEAT
+    print(f'gf {gf}, {len(pyramid)} levels, {n:4d} segments up to {reach:3d}px: fine {t_fine*1e3:6.2f}ms'
+          f' | pyramid {t_pyr*1e3:6.2f}ms')
+
+  pos = (161.3, 118.2)
+  t_brute = timeit.timeit(lambda: brute_nearest_free(gv.grid, gf, pos), number=N_REPEAT) / N_REPEAT
+  t_pyr = timeit.timeit(lambda: pyramid.nearest_free_cell(pos), number=N_REPEAT) / N_REPEAT
+  print(f'gf {gf} nearest free cell: all cells {t_brute*1e3:6.2f}ms | pyramid {t_pyr*1e3:6.2f}ms')
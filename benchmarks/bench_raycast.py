@@ -0,0 +1,65 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import Entity, GridView, cast_rays, line_of_sight, ray_directions
+
+from benchmarks.synthetic import make_scenario
+
+FRAME_BUDGET = 1 / 60
+N_REPEAT = 50
+
+
+def march_ray(grid, cell_size, origin, direction, max_dist):
+  '''Steps a point half a cell at a time, the way GridView.ray used to.'''
+  x, y = origin
+  dx, dy = direction[0] * cell_size / 2, direction[1] * cell_size / 2
+  m, n = grid.shape
+  for k in range(int(2 * max_dist // cell_size)):
+    if grid[int(x // cell_size) % m, int(y // cell_size) % n]:
+      return k * cell_size / 2
+    x += dx
+    y += dy
+  return max_dist
+
+
+gv = GridView(5)
+gv.set_scenario(make_scenario())
+player = Entity(dict(type='archer', pos=dict(x=37, y=45), vel=dict(x=0, y=0), size=dict(x=8, y=14), isEnemy=False))
+gv.update([player], player)
+origin = (player.p.x, player.p.y)
+
+for max_dist in [60, 160]:
+  for n_rays in [16, 64, 256]:
+    directions = ray_directions(n_rays)
+    t = timeit.timeit(lambda: cast_rays(gv.grid, gv.gf, origin, directions, max_dist), number=N_REPEAT) / N_REPEAT
+    t_py = timeit.timeit(lambda: [march_ray(gv.grid, gv.gf, origin, d, max_dist) for d in directions], number=3) / 3
+    print(f'{n_rays:3d} rays, range {max_dist:3d}: {t*1e6:7.1f}us per step ({t / FRAME_BUDGET:5.2%} of a 60fps frame)'
+          f' | python marching {t_py*1e3:6.2f}ms')
+
+
+def sampled_clean_path(p1, p2, grid, cell_size, step):
+  '''Checks points every step pixels, the way GridView.is_clean_path used to. Can skip thin walls and corners.'''
+  d = np.subtract(p2, p1)
+  length = np.hypot(*d)
+  d = d / length * step
+  x, y = p1
+  for _ in range(int(length / step)):
+    if grid[int(x // cell_size) % grid.shape[0], int(y // cell_size) % grid.shape[1]]:
+      return False
+    x += d[0]
+    y += d[1]
+  return True
+
+
+rng = np.random.default_rng(0)
+for n in [10, 100, 1000]:
+  p1 = rng.uniform(0, 240, size=(n, 2))
+  p2 = p1 + rng.uniform(-80, 80, size=(n, 2))
+  t_batch = timeit.timeit(lambda: line_of_sight(gv.grid, gv.gf, p1, p2), number=N_REPEAT) / N_REPEAT
+  t_py = timeit.timeit(lambda: [sampled_clean_path(a, b, gv.grid, gv.gf, gv.gf) for a, b in zip(p1, p2)], number=3) / 3
+  print(f'{n:4d} segments: line_of_sight {t_batch*1e3:6.2f}ms | python sampling {t_py*1e3:6.2f}ms')
@@ -0,0 +1,60 @@
+'''
+Compares computing the level grids in every worker with attaching to the ones published by the first process.
+'''
+import sys
+
+sys.path.insert(0, '.')
+
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from common import SharedLevelCache, level_key, upsample_grid
+
+from benchmarks.synthetic import make_scenario
+
+N_WORKERS = 4
+
+
+def worker(prefix, key, grid_factor, queue):
+  cache = SharedLevelCache(prefix)
+  grid10 = np.array(make_scenario()['grid'], dtype=np.int8)
+  start = time.perf_counter()
+  upsample_grid(grid10, 10, grid_factor)
+  t_compute = time.perf_counter() - start
+  start = time.perf_counter()
+  grid = cache.get(f'{key}_grid')
+  t_first = time.perf_counter() - start
+  # The first block attached by a process also pays for connecting to the resource tracker.
+  cache.close()
+  start = time.perf_counter()
+  grid = cache.get(f'{key}_grid')
+  t_attach = time.perf_counter() - start
+  queue.put((t_compute, t_first, t_attach, grid is not None))
+  cache.close()
+
+
+if __name__ == '__main__':
+  ctx = mp.get_context('spawn')
+  grid10 = np.array(make_scenario()['grid'], dtype=np.int8)
+  for grid_factor in [1, 2, 5]:
+    cache = SharedLevelCache(f'bench{os.getpid()}')
+    key = level_key(grid10, 10, grid_factor)
+    grid = cache.publish(f'{key}_grid', upsample_grid(grid10, 10, grid_factor))
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=worker, args=(cache.prefix, key, grid_factor, queue)) for _ in range(N_WORKERS)]
+    for w in workers:
+      w.start()
+    results = [queue.get() for _ in workers]
+    for w in workers:
+      w.join()
+    t_compute = np.mean([r[0] for r in results])
+    t_first = np.mean([r[1] for r in results])
+    t_attach = np.mean([r[2] for r in results])
+    assert all(r[3] for r in results)
+    print(f'grid_factor {grid_factor}: {grid.nbytes/1024:5.1f}KB per worker saved | compute {t_compute*1e6:6.1f}us'
+          f' | attach {t_attach*1e6:6.1f}us ({t_first*1e3:4.1f}ms the first time)')
+    del grid
+    cache.unlink()
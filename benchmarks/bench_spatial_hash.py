@@ -0,0 +1,55 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import HEIGHT, WIDTH, SpatialHash
+
+N_QUERIES = 200
+
+
+def brute_distance(positions, p):
+  d = np.abs(positions - np.asarray(p))
+  d = np.minimum(d, (WIDTH, HEIGHT) - d)
+  return np.sqrt((d**2).sum(axis=1))
+
+
+def brute_knn(positions, p, k):
+  dist = brute_distance(positions, p)
+  idx = np.argsort(dist)[:k]
+  return idx, dist[idx]
+
+
+def brute_radius(positions, p, r):
+  dist = brute_distance(positions, p)
+  return np.nonzero(dist <= r)[0]
+
+
+def python_knn(points, p, k):
+  '''Linear scan over python tuples, the way the objectives found the closest targets.'''
+  by_dist = []
+  for x, y in points:
+    by_dist.append((((x - p[0])**2 + (y - p[1])**2)**0.5, (x, y)))
+  by_dist.sort(key=lambda x: x[0])
+  return by_dist[:k]
+
+
+rng = np.random.default_rng(0)
+spatial_hash = SpatialHash(cell_size=20)
+for n in [10, 100, 300, 1000, 3000]:
+  positions = rng.uniform((0, 0), (WIDTH, HEIGHT), size=(n, 2))
+  points = [tuple(p) for p in positions]
+  queries = rng.uniform((0, 0), (WIDTH, HEIGHT), size=(N_QUERIES, 2))
+
+  t_build = timeit.timeit(lambda: spatial_hash.build(positions), number=100) / 100
+  t_knn = timeit.timeit(lambda: [spatial_hash.knn(q, 4) for q in queries], number=3) / N_QUERIES / 3
+  t_knn_np = timeit.timeit(lambda: [brute_knn(positions, q, 4) for q in queries], number=3) / N_QUERIES / 3
+  t_knn_py = timeit.timeit(lambda: [python_knn(points, q, 4) for q in queries], number=3) / N_QUERIES / 3
+  t_rad = timeit.timeit(lambda: [spatial_hash.query_radius(q, 30) for q in queries], number=3) / N_QUERIES / 3
+  t_rad_np = timeit.timeit(lambda: [brute_radius(positions, q, 30) for q in queries], number=3) / N_QUERIES / 3
+  t_box = timeit.timeit(lambda: [spatial_hash.query_box(q, q + 40) for q in queries], number=3) / N_QUERIES / 3
+  print(f'N={n:5d}: build {t_build*1e6:7.1f}us | knn hash {t_knn*1e6:6.1f}us numpy {t_knn_np*1e6:6.1f}us python {t_knn_py*1e6:8.1f}us'
+        f' | radius hash {t_rad*1e6:6.1f}us numpy {t_rad_np*1e6:6.1f}us | box hash {t_box*1e6:6.1f}us')
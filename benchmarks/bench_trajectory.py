@@ -0,0 +1,32 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import ArrowPredictor, GridView, HEIGHT, WIDTH
+
+from benchmarks.synthetic import make_scenario
+
+FRAME_BUDGET = 1 / 60
+N_REPEAT = 50
+
+gv = GridView(5)
+gv.set_scenario(make_scenario())
+rng = np.random.default_rng(0)
+
+for frames in [15, 30]:
+  predictor = ArrowPredictor(gv, frames=frames)
+  danger = np.empty((24, 24), dtype=np.float32)
+  for n in [10, 100, 300]:
+    positions = rng.uniform((0, 0), (WIDTH, HEIGHT), size=(n, 2))
+    velocities = rng.uniform(-6, 6, size=(n, 2))
+
+    def step():
+      traj, impact = predictor.predict(positions, velocities)
+      predictor.danger_map((160, 120), traj, impact, danger.shape, 10, out=danger)
+
+    t = timeit.timeit(step, number=N_REPEAT) / N_REPEAT
+    print(f'{n:3d} arrows, {frames} frames ahead: {t*1e3:6.2f}ms per step ({t / FRAME_BUDGET:5.1%} of a 60fps frame)')
@@ -0,0 +1,46 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timeit
+
+import numpy as np
+
+from common import Entity, GridView, PathGrid, Vec2, VisibilityTable, load_level
+
+N = 300
+
+scenario = load_level('level_sample.xml')
+wall = np.array(scenario['grid'], dtype=np.int8)
+free = np.argwhere(wall == 0)
+rng = np.random.default_rng(0)
+
+
+def make_entity(x, y):
+  return Entity(dict(type='slime', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+
+
+t_build = timeit.timeit(lambda: VisibilityTable(wall, 10), number=1)
+table = VisibilityTable(wall, 10)
+print(f'VisibilityTable build {t_build*1e3:7.1f}ms, {table.bits.nbytes/1024:.1f}KB')
+
+frames = [(Vec2(*((free[rng.integers(len(free))] + 0.5) * 10)),
+           [make_entity(*((free[k] + 0.5) * 10)) for k in rng.choice(len(free), 3)]) for _ in range(N)]
+path_grid = PathGrid(10)
+smooth_grid = PathGrid(10)
+smooth_grid.visibility = table
+t_cast = timeit.timeit(lambda: [path_grid.get_closest_entity(s, e, wall) for s, e in frames], number=1)
+t_bits = timeit.timeit(lambda: [smooth_grid.get_closest_entity(s, e, wall) for s, e in frames], number=1)
+print(f'path with line_of_sight checkpoint {t_cast/N*1e6:7.1f}us, with visibility checkpoint and waypoints'
+      f' {t_bits/N*1e6:7.1f}us per path')
+
+gv = GridView(1)
+gv.set_scenario(scenario)
+pairs = [(Vec2(*rng.uniform(0, 320, 2) * (1, 0.75)), Vec2(*rng.uniform(0, 320, 2) * (1, 0.75))) for _ in range(N)]
+t_clean = timeit.timeit(lambda: [gv.is_clean_path(a, b) for a, b in pairs], number=1)
+t_see = timeit.timeit(lambda: [table.can_see((a.x, a.y), (b.x, b.y)) for a, b in pairs], number=1)
+p1 = np.array([(a.x, a.y) for a, _ in pairs])
+p2 = np.array([(b.x, b.y) for _, b in pairs])
+t_batch = timeit.timeit(lambda: table.can_see(p1, p2), number=10) / 10
+print(f'is_clean_path {t_clean/N*1e6:7.1f}us, can_see {t_see/N*1e6:7.1f}us per check,'
+      f' can_see batch of {N} {t_batch*1e6:7.1f}us')
@@ -0,0 +1,62 @@
+import random
+from typing import Any, Dict, List
+
+from common.constants import HEIGHT, WIDTH
+
+
+def _vec(x: float, y: float) -> Dict[str, float]:
+  return dict(x=x, y=y)
+
+
+def make_entity(entity_id: int, entity_type: str, **kwargs) -> Dict[str, Any]:
+  '''Creates an entity dict shaped like the ones sent by the game in an update.'''
+  e: Dict[str, Any] = dict(
+    id=entity_id,
+    type=entity_type,
+    pos=_vec(random.uniform(0, WIDTH), random.uniform(0, HEIGHT)),
+    vel=_vec(random.uniform(-3, 3), random.uniform(-3, 3)),
+    size=_vec(8, 8),
+    isEnemy=False,
+    state='normal')
+  e.update(kwargs)
+  return e
+
+
+def make_update(n_arrows: int = 300, n_enemies: int = 8, n_archers: int = 2, n_items: int = 4, seed: int = 0) -> Dict[str, Any]:
+  '''Creates a synthetic update message with the given amount of entities of each kind.'''
+  random.seed(seed)
+  entities: List[Dict[str, Any]] = []
+  for i in range(n_archers):
+    entities.append(make_entity(len(entities), 'archer',
+      size=_vec(8, 14),
+      playerIndex=i,
+      arrows=['normal'] * 3,
+      facing=1,
+      onGround=True,
+      onWall=False,
+      dodgeCooldown=False))
+  for _ in range(n_enemies):
+    entities.append(make_entity(len(entities), 'slime', isEnemy=True, size=_vec(10, 8), facing=-1))
+  for _ in range(n_arrows):
+    entities.append(make_entity(len(entities), 'arrow',
+      size=_vec(8, 2),
+      state=random.choice(['flying', 'stuck']),
+      arrowType='normal'))
+  for _ in range(n_items):
+    entities.append(make_entity(len(entities), 'item', itemType='arrowBomb'))
+  random.shuffle(entities)
+  return dict(type='update', id=seed, entities=entities)
+
+
+def make_scenario(seed: int = 0) -> Dict[str, Any]:
+  '''Creates a synthetic scenario message: a 32x24 level with a floor and some random platforms.'''
+  random.seed(seed)
+  grid = [[0] * 24 for _ in range(32)]
+  for i in range(32):
+    grid[i][0] = grid[i][1] = 1
+  for _ in range(12):
+    i = random.randint(0, 27)
+    j = random.randint(3, 21)
+    for di in range(random.randint(2, 6)):
+      grid[(i + di) % 32][j] = 1
+  return dict(type='scenario', grid=grid, cellSize=10)
@@ -2,6 +2,8 @@ import json
 import random
 import logging
 
+import numpy as np
+
 from common import *
 
 from .bot import Bot
@@ -11,6 +13,11 @@ from typing import Any, Dict, List, Optional, Tuple
 _HOST = "127.0.0.1"
 _PORT = 12024
 
+# Dodges arrows predicted to go through the player's body within this amount of frames.
+_DODGE_FRAMES = 8
+_DANGER_CELL_SIZE = 5
+_DANGER_SHAPE = (2, 4)
+
 class BotQuest(Bot):
   def __init__(self):
     super(BotQuest, self).__init__()
@@ -20,6 +27,10 @@ class BotQuest(Bot):
     self.control: Controls = Controls()
     self.entities: List[Entity]
     self.shootcd: float = 0
+    self.arrow_predictor = ArrowPredictor(self.gv, frames=_DODGE_FRAMES)
+    self.danger = np.empty(_DANGER_SHAPE, dtype=np.float32)
+    self.path_grid: Optional[PathGrid] = None
+    self.visibility: Optional[VisibilityTable] = None
     self._connection = Connection(_HOST, _PORT)
 
 
@@ -55,27 +66,71 @@ class BotQuest(Bot):
     logging.info("handle_scenario")
     self.state_scenario = state
     self.gv.set_scenario(state)
+    self.visibility = level_visibility(self.gv.fixed_grid10, self.gv.csize)
     self._connection.write('.')
 
 
-  def get_player(self, entities: List[Entity]):
-    for e in entities:
-      if e.type == 'archer':
-        if e['playerIndex'] == self.state_init['index']:
-          self.me: Entity = e
-          return e
+  def get_player(self, entity_index: EntityIndex):
+    self.me: Entity = entity_index.archer(self.state_init['index'])
+    return self.me
 
 
-  def get_closest_enemy(self, entities: List[Entity]) -> Tuple[Optional[Entity], Optional[GPath]]:
-    enemies = [e for e in entities if e['isEnemy']]
-    path_grid = PathGrid(self.gv.csize)
-    return path_grid.get_closest_entity(vec2_from_dict(self.me['pos']), enemies, self.gv.fixed_grid10)
+  def get_closest_enemy(self, entity_index: EntityIndex) -> Tuple[Optional[Entity], Optional[GPath]]:
+    return self._get_path_grid().get_closest_entity(
+      vec2_from_dict(self.me['pos']), entity_index.enemies, self.gv.fixed_grid10)
 
 
   def get_closest_stuck_arrow(self) -> Tuple[Optional[Entity], Optional[GPath]]:
-    stuck_arrows = [e for e in self.entities if e.type == 'arrow' and is_stuck_arrow(e)]
-    path_grid = PathGrid(self.gv.csize)
-    return path_grid.get_closest_entity(vec2_from_dict(self.me['pos']), stuck_arrows, self.gv.fixed_grid10)
+    stuck_arrows = [e for e in self.entity_index.of_type('arrow') if is_stuck_arrow(e)]
+    return self._get_path_grid().get_closest_entity(vec2_from_dict(self.me['pos']), stuck_arrows, self.gv.fixed_grid10)
+
+
+  def _get_path_grid(self) -> PathGrid:
+    '''Path grid reused every frame, created once the cell size of the level is known.'''
+    if self.path_grid is None or self.path_grid.csize != self.gv.csize:
+      self.path_grid = PathGrid(self.gv.csize)
+    self.path_grid.visibility = self.visibility
+    return self.path_grid
+
+
+  def get_route(self, pos: Vec2) -> Optional[List[Tuple[Tuple[int, int], str]]]:
+    '''Moves through the places where the player can stand to get below pos, or None if there is no such route.'''
+    graph = level_platform_graph(self.gv.fixed_grid10, self.gv.csize)
+    start = graph.node_at((self.me.p.x, self.me.p.y))
+    goal = graph.node_at((pos.x, pos.y))
+    if start is None or goal is None:
+      return None
+    return graph.route(start, goal)
+
+
+  def next_route_step(self, pos: Vec2) -> Optional[Tuple[Vec2, str]]:
+    '''
+    Next node of the route to pos, as the position of the player standing there, and the move that gets there. None if
+    there is no route or the player already stands at its end.
+    '''
+    route = self.get_route(pos)
+    if not route or len(route) < 2:
+      return None
+    (i, j), move = route[1]
+    csize = self.gv.csize
+    # Routes can go around the edges, so the node is placed on the side of the player it is closest from.
+    dx, dy = geometry.displacement((self.me.p.x, self.me.p.y), ((i + 0.5) * csize, j * csize + self.me.s.y / 2))
+    return Vec2(self.me.p.x + dx, self.me.p.y + dy), move
+
+
+  def is_in_danger(self) -> bool:
+    '''Checks whether a flying arrow coming towards the player is about to go through it.'''
+    me = (self.me.p.x, self.me.p.y)
+    arrows = [e for e in self.entity_index.of_type('arrow') if is_flying_arrow(e)]
+    if not arrows:
+      return False
+    # Arrows moving away, like the ones just shot by the player, are not a threat.
+    positions = to_positions(arrows)
+    velocities = to_velocities(arrows)
+    approaching = (geometry.displacement(positions, me) * velocities).sum(axis=1) > 0
+    traj, impact = self.arrow_predictor.predict(positions[approaching], velocities[approaching])
+    self.arrow_predictor.danger_map(me, traj, impact, _DANGER_SHAPE, _DANGER_CELL_SIZE, out=self.danger)
+    return bool(np.isfinite(self.danger).any())
 
 
   def get_dist(self, p: Vec2):
@@ -89,7 +144,7 @@ class BotQuest(Bot):
 
     self.control.aim(diff(enemy.p, self.me.p))
     if self.shootcd <= 0:
-      if is_clean_path(self.me.p, enemy.p, self.gv.fixed_grid10, self.gv.csize):
+      if self.gv.is_clean_path(self.me.p, enemy.p):
         self.shoot()
     else:
       self.fight_without_arrows(enemy, path_to_enemy)
@@ -99,11 +154,22 @@ class BotQuest(Bot):
     return self.me.p.y + margin <= ent.p.y
 
 
-  def chase(self, pos: Vec2):
+  def chase(self, pos: Vec2, checkpoint: Optional[Vec2] = None):
+    '''
+    Moves towards pos through the places where the player can stand, walking, falling or jumping to the next one of the
+    route. Without a route, goes straight towards checkpoint, or pos if not given.
+    '''
+    step = self.next_route_step(pos)
+    if step is not None:
+      target, move = step
+      if move == 'jump' and self.me['onGround']:
+        self.control.jump()
+    else:
+      target = pos if checkpoint is None else checkpoint
     if not self.me['onGround']:
-      self.control.aim(diff(pos, self.me.p))
+      self.control.aim(diff(target, self.me.p))
     else:
-      if self.me.p.x < pos.x:
+      if self.me.p.x < target.x:
         self.control.right()
       else:
         self.control.left()
@@ -128,7 +194,7 @@ class BotQuest(Bot):
     if arrow and path_to_arrow:
       self.target = arrow
       self.path_to_target = path_to_arrow
-      self.chase(path_to_arrow.checkpoint.pos)
+      self.chase(arrow.p, path_to_arrow.checkpoint.pos)
       return
 
     if enemy_dist > self.me.s.y * 4:
@@ -148,26 +214,30 @@ class BotQuest(Bot):
       self.target = None
       self.path_to_target = None
       self.entities: List[Entity] = to_entities(state['entities'])
-      self.get_player(self.entities)
+      self.entity_index = EntityIndex(self.entities)
+      self.get_player(self.entity_index)
 
       if self.me == None:
         raise Exception('No me?')
 
       self.gv.update(self.entities, self.me)
 
+      if self.is_in_danger():
+        self.control.dash()
+
       if chance(10):
         self.control.dash()
 
       if chance(20):
         self.control.jump()
 
-      enemy, path_to_enemy = self.get_closest_enemy(self.entities)
+      enemy, path_to_enemy = self.get_closest_enemy(self.entity_index)
       if not enemy or not path_to_enemy:
         arrow, path_to_arrow = self.get_closest_stuck_arrow()
         if arrow and path_to_arrow:
           self.target = arrow
           self.path_to_target = path_to_arrow
-          self.chase(path_to_arrow.checkpoint.pos)
+          self.chase(arrow.p, path_to_arrow.checkpoint.pos)
         self.control.reply(self._connection)
         return
 
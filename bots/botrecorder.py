@@ -96,12 +96,9 @@ class BotRecorder(Bot):
     self.connection.write('.')
 
 
-  def getPlayer(self, entities: List[Entity]):
-    for e in entities:
-      if e.type == 'archer':
-        if e['playerIndex'] == self.stateInit['index']:
-          self.me: Entity = e
-          return e
+  def getPlayer(self, entity_index: EntityIndex):
+    self.me: Entity = entity_index.archer(self.stateInit['index'])
+    return self.me
 
 
   def handle_update(self, state):
@@ -109,7 +106,8 @@ class BotRecorder(Bot):
     try:
       self.replay.handle_update(state)
       self.entities: List[Entity] = to_entities(state['entities'])
-      self.getPlayer(self.entities)
+      self.entity_index = EntityIndex(self.entities)
+      self.getPlayer(self.entity_index)
       self.gv.update(self.entities, self.me)
 
       if self.control.consume_key_up_event(6):
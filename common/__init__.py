@@ -1,8 +1,22 @@
 from .common import *
 from .constants import *
 from .controls import *
+from .dstar_lite import *
 from .entity import *
+from .entity_tracker import *
+from .free_space import *
 from .gamereplay import *
 from .grid import *
+from .kernels import available_backends, get_backend, set_backend
+from .level_loader import *
 from .logging_options import *
+from .navigation import *
+from .occupancy import *
 from .pathing import *
+from .platform_graph import *
+from .pyramid import *
+from .raycast import *
+from .shared_cache import *
+from .spatial_hash import *
+from .trajectory import *
+from .visibility import *
@@ -1,10 +1,9 @@
 import sys
 import random
 
-from math import sqrt
-
+from . import geometry
 from .entity import Vec2, Entity
-from .constants import WIDTH, HEIGHT
+from .raycast import line_of_sight
 
 from typing import Optional, Tuple
 from numpy.typing import NDArray
@@ -32,11 +31,13 @@ def chance(i: int) -> bool:
 
 
 def distance(p1: Vec2, p2: Vec2) -> float:
-  return sqrt(distance2(p1, p2))
+  '''Straight distance between two points, not going around the edges. See geometry.distance.'''
+  return float(geometry.distance((p1.x, p1.y), (p2.x, p2.y), wrap_around=False))
 
 
 def distance2(p1: Vec2, p2: Vec2) -> float:
-  return (p1.x - p2.x)**2 + (p1.y - p2.y)**2
+  '''Squared straight distance between two points, not going around the edges. See geometry.distance2.'''
+  return float(geometry.distance2((p1.x, p1.y), (p2.x, p2.y), wrap_around=False))
 
 
 def diff(p1: Vec2, p2: Vec2) -> Vec2:
@@ -44,28 +45,21 @@ def diff(p1: Vec2, p2: Vec2) -> Vec2:
 
 
 def bounded(v, left, right):
-  if v < left:
-    return v + right - left
-  if v >= right:
-    return v - (right - left)
-  return v
+  '''Wraps v into [left, right). See geometry.wrap.'''
+  return geometry.wrap(v, left, right)
 
 
 def grid_pos(p: Vec2, cell_size: int, cap=True) -> Tuple[int, int]:
-  if cap:
-    return (int(p.x % WIDTH) // cell_size, int(p.y % HEIGHT) // cell_size)
-  return (int(p.x) // cell_size, int(p.y) // cell_size)
+  '''Cell of a point in a grid of the given cell size. See geometry.grid_cells.'''
+  if not cap:
+    # Coordinates are truncated before dividing, unlike grid_cells that floors them, which differs for negative ones.
+    return (int(p.x) // cell_size, int(p.y) // cell_size)
+  i, j = geometry.grid_cells((p.x, p.y), cell_size, cap)
+  return int(i), int(j)
 
 def is_clean_path(p1: Vec2, p2: Vec2, grid: NDArray, cell_size: int) -> bool:
-  dp = diff(p2, p1)
-  dp.set_length(5)
-  p = p1.copy()
-  for i in range(int(dp.length())):
-    pgrid = grid_pos(p, cell_size)
-    if grid[pgrid[0]][pgrid[1]] == 1:
-      return False
-    p.add(dp)
-  return True
+  '''Checks whether the segment from p1 to p2 only goes through free cells of grid. See raycast.line_of_sight.'''
+  return line_of_sight(grid, cell_size, (p1.x, p1.y), (p2.x, p2.y))
 
 
 def rand_double_region(a: float, b: float):
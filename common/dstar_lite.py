@@ -0,0 +1,229 @@
+import heapq
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .common import *
+from .kernels import _DI, _DJ
+from .navigation import distance_fields
+from .pathing import GPath, path_from_cells
+from .visibility import VisibilityTable
+
+_INF = float('inf')
+
+
+class DStarLite:
+  '''
+  Finds paths to the closest of a set of goal cells like PathGrid, but keeps the search between calls and only repairs
+  the part that changed: the start moving, goals appearing, moving or disappearing, and cells of the grid being blocked
+  or freed, like cracked walls breaking.
+
+  The search goes backwards from the goals (D* Lite), so g of a cell is its distance to the closest goal. Goal cells
+  work as cells with a free edge to a single virtual goal, so changing them is an edge change like any other. Moves are
+  the same as in PathGrid: a path can start in a blocked cell but never goes through one, except the goal at its end.
+
+  Repairs that would expand more cells than the budget are abandoned, and the distances to the goals are computed
+  again from scratch with distance_fields instead, which is also how the first search is done.
+
+  On the sample level a PathGrid search takes 20-40us, and most of the cost of a frame is building the path, so the
+  planner is not faster per frame even when the goals don't move (benchmarks/bench_dstar_lite.py). The bots keep using
+  PathGrid.
+
+  :param cell_size: Size in pixels of the cells of the grids searched.
+  :param budget: Maximum amount of cells expanded by a repair before it falls back to searching from scratch.
+  '''
+  def __init__(self, cell_size: int, budget: int = 50):
+    self.csize = cell_size
+    self.budget = budget
+    self.shape: Tuple[int, int] = (0, 0)
+    self.start: Optional[int] = None
+    # Visibility table of the level, used for the paths when it is the one of the grid searched.
+    self.visibility: Optional[VisibilityTable] = None
+    # Amount of repairs done incrementally and from scratch.
+    self.repairs = 0
+    self.replans = 0
+
+
+  def update(self, start: Tuple[int, int], goal: NDArray[np.bool_], wall: NDArray) -> bool:
+    '''
+    Brings the distances to the goals up to date for a start, goals and grid.
+
+    :param start: Cell (i, j) where paths start.
+    :param goal: Goal cells with the shape of the grid.
+    :param wall: Grid indexed [i, j]. Non zero cells are blocked.
+    returns: Whether the distances were repaired instead of computed from scratch.
+    '''
+    wall = np.asarray(wall) != 0
+    goal = np.asarray(goal, dtype=np.bool_)
+    W, H = wall.shape
+    s = (start[0] % W) * H + start[1] % H
+    if wall.shape != self.shape or self.start is None:
+      self._replan(s, goal, wall)
+      return False
+
+    self.km += self._heuristic(self.start, s)
+    self.start = s
+    changed_wall = np.flatnonzero(wall.ravel() != self.wall_array)
+    changed_goal = np.flatnonzero(goal.ravel() != self.goal_array)
+    self.wall_array = wall.ravel().copy()
+    self.goal_array = goal.ravel().copy()
+    for u in changed_wall.tolist():
+      self.wall[u] = bool(self.wall_array[u])
+    for u in changed_goal.tolist():
+      self.goal[u] = bool(self.goal_array[u])
+    # Blocking or freeing a cell changes the cost of the edges into it, so its neighbours have to be updated. Making it
+    # a goal or not changes the edge out of it to the virtual goal, and also the edges into it.
+    dirty = set(changed_goal.tolist())
+    for u in np.concatenate([changed_wall, changed_goal]).tolist():
+      dirty.update(self.adj[u])
+    for u in dirty:
+      self._update_vertex(u)
+    if self._compute(self.budget):
+      self.repairs += 1
+      return True
+    self._replan(s, goal, wall)
+    return False
+
+
+  def distance(self) -> float:
+    '''Steps from the start to the closest goal, inf if none can be reached.'''
+    return self.g[self.start]
+
+
+  def path(self) -> Optional[List[Tuple[int, int]]]:
+    '''Cells of a shortest path from the start to the closest goal, both included, or None if none can be reached.'''
+    if self.g[self.start] == _INF:
+      return None
+    H = self.shape[1]
+    u = self.start
+    cells = [(u // H, u % H)]
+    while not self.goal[u]:
+      # Neighbours are tried in the same order as PathGrid.
+      u = min(self.adj[u], key=lambda v: self._cost(v) + self.g[v])
+      cells.append((u // H, u % H))
+      if len(cells) > len(self.g):
+        raise Exception('Path to the goals goes around in circles')
+    return cells
+
+
+  def get_closest_entity(self, startPos: Vec2, entities: List[Entity], wall: NDArray) -> Tuple[Optional[Entity], Optional[GPath]]:
+    '''Same as PathGrid.get_closest_entity, repairing the search of the previous call.'''
+    wall = np.asarray(wall)
+    W, H = wall.shape
+    goal = np.zeros(wall.shape, dtype=np.bool_)
+    cells = [grid_pos(e.p, self.csize) for e in entities]
+    for i, j in cells:
+      goal[i % W, j % H] = True
+    self.update(grid_pos(startPos, self.csize), goal, wall)
+    path = self.path()
+    if path is None:
+      return None, None
+    end = path[-1]
+    for e, (i, j) in zip(entities, cells):
+      if (i % W, j % H) == end:
+        return e, path_from_cells(path, self.csize, wall, self.visibility)
+    raise Exception(f'No entity in the cell found {end}')
+
+
+  def _replan(self, s: int, goal: NDArray[np.bool_], wall: NDArray[np.bool_]):
+    '''Computes the distances to the goals from scratch, which leaves every cell consistent and the queue empty.'''
+    if wall.shape != self.shape:
+      W, H = self.shape = wall.shape
+      self.adj = [[((u // H + di) % W) * H + (u % H + dj) % H for di, dj in zip(_DI, _DJ)] for u in range(W * H)]
+      self.ci = [u // H for u in range(W * H)]
+      self.cj = [u % H for u in range(W * H)]
+    # The state is kept in lists, which are faster than arrays to read and write one cell at a time.
+    self.wall_array = wall.ravel().copy()
+    self.goal_array = goal.ravel().copy()
+    self.wall: List[bool] = self.wall_array.tolist()
+    self.goal: List[bool] = self.goal_array.tolist()
+    dist = distance_fields(wall, goal[None])[0].ravel()
+    self.g: List[float] = np.where(dist < 0, _INF, dist).astype(np.float64).tolist()
+    self.rhs: List[float] = list(self.g)
+    self.queue: List[Tuple[Tuple[float, float], int]] = []
+    self.queued: Dict[int, Tuple[float, float]] = {}
+    self.km = 0.0
+    self.start = s
+    self.replans += 1
+
+
+  def _compute(self, budget: int) -> bool:
+    '''
+    Expands inconsistent cells until the start is consistent.
+
+    returns: False if the budget ran out first.
+    '''
+    s = self.start
+    expanded = 0
+    while self.queue:
+      key, u = self.queue[0]
+      if self.queued.get(u) != key:
+        heapq.heappop(self.queue)
+        continue
+      if not (key < self._key(s) or self.rhs[s] != self.g[s]):
+        break
+      if expanded == budget:
+        return False
+      expanded += 1
+      heapq.heappop(self.queue)
+      del self.queued[u]
+      new_key = self._key(u)
+      if key < new_key:
+        self._push(u, new_key)
+      elif self.g[u] > self.rhs[u]:
+        self.g[u] = self.rhs[u]
+        for v in self.adj[u]:
+          self._update_vertex(v)
+      else:
+        self.g[u] = _INF
+        self._update_vertex(u)
+        for v in self.adj[u]:
+          self._update_vertex(v)
+    return True
+
+
+  def _update_vertex(self, u: int):
+    if self.goal[u]:
+      rhs = 0.0
+    else:
+      g = self.g
+      wall = self.wall
+      goal = self.goal
+      rhs = _INF
+      for v in self.adj[u]:
+        if g[v] + 1 < rhs and (goal[v] or not wall[v]):
+          rhs = g[v] + 1
+    self.rhs[u] = rhs
+    self.queued.pop(u, None)
+    if self.g[u] != rhs:
+      self._push(u, self._key(u))
+
+
+  def _push(self, u: int, key: Tuple[float, float]):
+    self.queued[u] = key
+    heapq.heappush(self.queue, (key, u))
+
+
+  def _key(self, u: int) -> Tuple[float, float]:
+    g = self.g[u]
+    rhs = self.rhs[u]
+    k = g if g < rhs else rhs
+    W, H = self.shape
+    di = abs(self.ci[self.start] - self.ci[u])
+    dj = abs(self.cj[self.start] - self.cj[u])
+    return (k + min(di, W - di) + min(dj, H - dj) + self.km, k)
+
+
+  def _cost(self, v: int) -> float:
+    '''Cost of moving into v.'''
+    return _INF if self.wall[v] and not self.goal[v] else 1.0
+
+
+  def _heuristic(self, a: int, b: int) -> float:
+    '''Steps between two cells if nothing was blocked, around the edges.'''
+    W, H = self.shape
+    di = abs(a // H - b // H)
+    dj = abs(a % H - b % H)
+    return float(min(di, W - di) + min(dj, H - dj))
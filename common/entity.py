@@ -5,7 +5,7 @@ import numpy as np
 
 from math import sqrt
 
-from typing import Any, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from numpy.typing import NDArray
 
 
@@ -124,9 +124,67 @@ def to_entities(entities: List[Dict[str, Any]]) -> List[Entity]:
   return result
 
 
+class EntityIndex:
+  '''
+  Lookup tables over the entities of a single update. Build it once when the update is parsed so consumers can find
+  entities by type, id or player index without rescanning the whole entity list.
+
+  :param entities: Entities of the update, as returned by to_entities.
+  '''
+  def __init__(self, entities: List[Entity]):
+    self.entities = entities
+    self.by_type: Dict[str, List[Entity]] = {}
+    self.by_id: Dict[int, Entity] = {}
+    self.enemies: List[Entity] = []
+    self.archers: Dict[int, Entity] = {}
+    by_type = self.by_type
+    by_id = self.by_id
+    for e in entities:
+      entity_type = e.type
+      if entity_type in by_type:
+        by_type[entity_type].append(e)
+      else:
+        by_type[entity_type] = [e]
+      entity_id = e.e.get('id')
+      if entity_id is not None:
+        by_id[entity_id] = e
+      if e.isEnemy:
+        self.enemies.append(e)
+    for e in by_type.get('archer', []):
+      self.archers[e['playerIndex']] = e
+
+  def __len__(self):
+    return len(self.entities)
+
+  def of_type(self, entity_type: str) -> List[Entity]:
+    '''Entities of the given type, in the same order as the update.'''
+    return self.by_type.get(entity_type, [])
+
+  def get(self, entity_id: int) -> Optional[Entity]:
+    '''Entity with the given id, or None if it is not in this update.'''
+    return self.by_id.get(entity_id)
+
+  def archer(self, player_index: int) -> Optional[Entity]:
+    '''Archer controlled by the given player index, or None if it is not alive.'''
+    return self.archers.get(player_index)
+
+
+def to_positions(entities: List[Entity]) -> NDArray[np.float64]:
+  '''Positions of the entities as an array with shape (N, 2).'''
+  positions = np.empty((len(entities), 2), dtype=np.float64)
+  for k, e in enumerate(entities):
+    positions[k, 0] = e.p.x
+    positions[k, 1] = e.p.y
+  return positions
+
+
 def is_arrow_pickup(e: Entity) -> bool:
   return e.type == 'item' and e['itemType'].startswith('arrow')
 
 
 def is_stuck_arrow(e: Entity) -> bool:
   return e.type == 'arrow' and e['state'] == 'stuck'
+
+
+def is_flying_arrow(e: Entity) -> bool:
+  return e.type == 'arrow' and e['state'] == 'flying'
@@ -0,0 +1,155 @@
+from typing import Dict, List, Optional, Type, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .entity import Entity, EntityIndex
+
+
+class EntityEvent:
+  '''
+  Base class for the events emitted by EntityTracker when diffing consecutive frames.
+
+  :param id: Id of the entity the event refers to.
+  :param entity: The entity in the current frame, or the last time it was seen if it is gone.
+  '''
+  def __init__(self, id: int, entity: Entity):
+    self.id = id
+    self.entity = entity
+
+  def __repr__(self):
+    return f'{type(self).__name__}({self.id}, {self.entity.type})'
+
+
+class SpawnedEvent(EntityEvent):
+  '''The entity is present in this frame but was not in the previous one.'''
+
+
+class DespawnedEvent(EntityEvent):
+  '''The entity was present in the previous frame but is gone in this one.'''
+
+
+class StateChangedEvent(EntityEvent):
+  '''The 'state' field of the entity changed, for example an arrow going from flying to stuck.'''
+  def __init__(self, id: int, entity: Entity, prev_state: str, state: str):
+    super().__init__(id, entity)
+    self.prev_state = prev_state
+    self.state = state
+
+
+class ArrowsChangedEvent(EntityEvent):
+  '''The amount of arrows held by an archer changed.'''
+  def __init__(self, id: int, entity: Entity, prev_count: int, count: int):
+    super().__init__(id, entity)
+    self.prev_count = prev_count
+    self.count = count
+
+  @property
+  def delta(self) -> int:
+    return self.count - self.prev_count
+
+
+E = TypeVar('E', bound=EntityEvent)
+
+
+class EntityTracker:
+  '''
+  Follows entities across frames by id and emits the events that happened between two consecutive updates.
+  Per-entity age and last seen frame are kept in arrays indexed by a slot that is reused once the entity is gone.
+
+  :param capacity: Initial amount of slots. Grows as needed.
+  '''
+  def __init__(self, capacity: int = 256):
+    self.ids: NDArray[np.int64] = np.full(capacity, -1, dtype=np.int64)
+    self.age: NDArray[np.int32] = np.zeros(capacity, dtype=np.int32)
+    self.last_seen: NDArray[np.int32] = np.full(capacity, -1, dtype=np.int32)
+    self.active: NDArray[np.bool_] = np.zeros(capacity, dtype=bool)
+    self.reset()
+
+  def reset(self):
+    '''Forgets all entities. The next update reports every entity as spawned.'''
+    self.frame = -1
+    self.ids.fill(-1)
+    self.age.fill(0)
+    self.last_seen.fill(-1)
+    self.active.fill(False)
+    self.slots: Dict[int, int] = {}
+    self._free_slots: List[int] = list(range(len(self.ids) - 1, -1, -1))
+    self._prev: Dict[int, Entity] = {}
+    self.events: List[EntityEvent] = []
+
+  def update(self, entity_index: EntityIndex) -> List[EntityEvent]:
+    '''
+    Diffs the entities of a new frame against the previous one.
+
+    returns: The events of this frame. They are also available in self.events until the next update.
+    '''
+    self.frame += 1
+    events: List[EntityEvent] = []
+    prev = self._prev
+    curr = entity_index.by_id
+    self.age[self.active] += 1
+
+    for id, e in curr.items():
+      p = prev.get(id)
+      if p is None:
+        slot = self._alloc(id)
+        events.append(SpawnedEvent(id, e))
+      else:
+        slot = self.slots[id]
+        state = e.e.get('state')
+        prev_state = p.e.get('state')
+        if state != prev_state:
+          events.append(StateChangedEvent(id, e, prev_state, state))
+        if e.type == 'archer':
+          count = len(e['arrows'])
+          prev_count = len(p['arrows'])
+          if count != prev_count:
+            events.append(ArrowsChangedEvent(id, e, prev_count, count))
+      self.last_seen[slot] = self.frame
+
+    for id, p in prev.items():
+      if id not in curr:
+        events.append(DespawnedEvent(id, p))
+        self._release(id)
+
+    self._prev = dict(curr)
+    self.events = events
+    return events
+
+  def of_type(self, event_type: Type[E]) -> List[E]:
+    '''Events of the current frame of the given type.'''
+    return [e for e in self.events if isinstance(e, event_type)]
+
+  def age_of(self, id: int) -> int:
+    '''Amount of frames since the entity spawned, or -1 if it is not being tracked.'''
+    slot = self.slots.get(id)
+    return -1 if slot is None else int(self.age[slot])
+
+  def last_seen_of(self, id: int) -> Optional[int]:
+    '''Last frame in which the entity was seen, or None if it is not being tracked.'''
+    slot = self.slots.get(id)
+    return None if slot is None else int(self.last_seen[slot])
+
+  def _alloc(self, id: int) -> int:
+    if not self._free_slots:
+      self._grow()
+    slot = self._free_slots.pop()
+    self.slots[id] = slot
+    self.ids[slot] = id
+    self.age[slot] = 0
+    self.active[slot] = True
+    return slot
+
+  def _release(self, id: int):
+    slot = self.slots.pop(id)
+    self.active[slot] = False
+    self._free_slots.append(slot)
+
+  def _grow(self):
+    n = len(self.ids)
+    self.ids = np.concatenate([self.ids, np.full(n, -1, dtype=np.int64)])
+    self.age = np.concatenate([self.age, np.zeros(n, dtype=np.int32)])
+    self.last_seen = np.concatenate([self.last_seen, np.full(n, -1, dtype=np.int32)])
+    self.active = np.concatenate([self.active, np.zeros(n, dtype=bool)])
+    self._free_slots.extend(range(2*n - 1, n - 1, -1))
@@ -0,0 +1,222 @@
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .grid import GridView
+
+# Rounds of samples of the whole index tried by sample_near before looking at every position.
+_BAND_TRIES = 4
+
+
+class FreeSpaceIndex:
+  '''
+  Positions of a level where a body fits, to sample targets and spawn positions without trying random pixels until one
+  is free.
+
+  Candidate positions are one per cell of the grid view: centered in the cell horizontally, with the bottom of the body
+  at the bottom of the cell. The valid ones are found for all cells at once when the index is created.
+
+  :param grid_view: Grid view with the scenario set. Its current grid is used, including cracked walls.
+  :param body_size: Width and height of the body.
+  :param on_floor: Only positions where the body stands on the floor.
+  :param floor_depth: How far below the body there has to be floor. Defaults to the cell size of the level.
+  :param reachable_from: Only positions connected to this one through positions where the body fits. This ignores
+    gravity, so it means reachable by something that flies or a path that can be jumped.
+  :param weights: Weight of each cell, with the shape of the grid, to sample some positions more often.
+  :param seed: Seed of the random generator used for sampling.
+  '''
+  def __init__(self,
+      grid_view: GridView,
+      body_size: Tuple[float, float] = (8, 14),
+      on_floor: bool = False,
+      floor_depth: Optional[float] = None,
+      reachable_from: Optional[Tuple[float, float]] = None,
+      weights: Optional[NDArray] = None,
+      seed: Optional[int] = None):
+    self.gv = grid_view
+    self.half = np.array(body_size, dtype=np.float64) / 2
+    self.on_floor = on_floor
+    self.floor_depth = grid_view.csize if floor_depth is None else floor_depth
+    self.rng = np.random.default_rng(seed)
+    gf = grid_view.gf
+    W, H = grid_view.grid.shape
+    self.size = np.array([W * gf, H * gf], dtype=np.float64)
+    i, j = np.meshgrid(np.arange(W), np.arange(H), indexing='ij')
+    lattice = np.stack([(i.ravel() + 0.5) * gf, j.ravel() * gf + self.half[1]], axis=1)
+    fits = ~self._collides(lattice)
+    valid = fits & self._has_floor(lattice) if on_floor else fits
+    if reachable_from is not None:
+      valid &= self._connected(fits.reshape(W, H), self.cell_of(reachable_from)).ravel()
+    self.mask: NDArray[np.bool_] = valid.reshape(W, H)
+    self.cells = np.flatnonzero(valid)
+    self.positions: NDArray = lattice[self.cells]
+    self.set_weights(weights)
+
+  def __len__(self):
+    return len(self.positions)
+
+  def cell_of(self, pos: ArrayLike) -> Tuple[int, int]:
+    '''Cell of the candidate position nearest to pos.'''
+    W, H = self.gv.grid.shape
+    gf = self.gv.gf
+    return int(np.floor(pos[0] / gf)) % W, int(np.round((pos[1] - self.half[1]) / gf)) % H
+
+  def is_valid(self, positions: ArrayLike) -> NDArray[np.bool_]:
+    '''
+    Checks whether the body fits at any positions, and stands on the floor if the index requires it.
+    Reachability is not checked, since it is only known for the candidate positions.
+
+    :param positions: Positions with shape (N, 2).
+    '''
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    valid = ~self._collides(positions)
+    if self.on_floor:
+      valid &= self._has_floor(positions)
+    return valid
+
+  def set_weights(self, weights: Optional[NDArray]):
+    '''
+    Sets the weight of each cell with the shape of the grid, or None to sample uniformly.
+    Builds an alias table (Vose's method), so that sampling stays O(1) per sample.
+    '''
+    if weights is None:
+      self.weights = None
+      return
+    w = np.asarray(weights, dtype=np.float64).ravel()[self.cells]
+    if len(w) == 0 or w.sum() <= 0:
+      raise Exception('Weights of the free positions must add up to more than 0')
+    n = len(w)
+    prob = w * (n / w.sum())
+    alias = np.arange(n)
+    small = list(np.flatnonzero(prob < 1))
+    large = list(np.flatnonzero(prob >= 1))
+    while small and large:
+      s = small.pop()
+      l = large[-1]
+      alias[s] = l
+      prob[l] -= 1 - prob[s]
+      if prob[l] < 1:
+        small.append(large.pop())
+    # What is left only differs from 1 by rounding errors.
+    prob[small + large] = 1
+    self.weights = w
+    self._prob = prob
+    self._alias = alias
+
+  def sample(self, n: Optional[int] = None) -> NDArray:
+    '''
+    Samples valid positions, following the weights if any.
+
+    :param n: Amount of positions. If None a single one.
+    returns: Positions with shape (n, 2), or (2,) if n is None.
+    '''
+    if len(self) == 0:
+      raise Exception('No valid positions to sample')
+    return self.positions[self._sample_indices(n)]
+
+  def sample_near(
+      self,
+      center: ArrayLike,
+      min_distance: float = 0,
+      max_distance: float = np.inf,
+      n: Optional[int] = None,
+      replace: bool = True) -> Optional[NDArray]:
+    '''
+    Samples valid positions within a distance band of a point, measured around the edges of the arena.
+    Samples of the whole index outside the band are rejected a few times, which is enough unless the band holds very
+    few positions. Then the positions in the band are found going through all of them.
+
+    :param replace: Whether a position can be sampled more than once. If not, repeated samples are rejected too.
+    returns: Same as sample, or None if the band has no valid positions, or less than n without replacement.
+    '''
+    if len(self) == 0:
+      return None
+    center = np.asarray(center, dtype=np.float64)
+    want = 1 if n is None else n
+    accepted = np.zeros(0, dtype=np.int64)
+    for _ in range(_BAND_TRIES):
+      k = self._sample_indices(max(4 * want, 32))
+      dist = self._distance(self.positions[k], center)
+      accepted = np.concatenate([accepted, k[(dist >= min_distance) & (dist <= max_distance)]])
+      if not replace:
+        _, first = np.unique(accepted, return_index=True)
+        accepted = accepted[np.sort(first)]
+      if len(accepted) >= want:
+        break
+    else:
+      dist = self._distance(self.positions, center)
+      in_band = np.flatnonzero((dist >= min_distance) & (dist <= max_distance))
+      if not replace:
+        in_band = np.setdiff1d(in_band, accepted)
+        if len(accepted) + len(in_band) < want:
+          return None
+      if len(in_band) == 0:
+        return None
+      p = None if self.weights is None else self.weights[in_band] / self.weights[in_band].sum()
+      rest = self.rng.choice(in_band, size=want - len(accepted), p=p, replace=replace)
+      accepted = np.concatenate([accepted, rest])
+    positions = self.positions[accepted[:want]]
+    return positions[0] if n is None else positions
+
+  def _sample_indices(self, n: Optional[int]) -> NDArray:
+    k = self.rng.integers(len(self), size=n)
+    if self.weights is not None:
+      k = np.where(self.rng.random(size=n) < self._prob[k], k, self._alias[k])
+    return k
+
+  def _distance(self, positions: NDArray, center: NDArray) -> NDArray:
+    d = (positions - center + self.size / 2) % self.size - self.size / 2
+    return np.sqrt((d**2).sum(axis=1))
+
+  def _collides(self, positions: NDArray) -> NDArray[np.bool_]:
+    return self.gv.is_region_collision_batch(positions - self.half, positions + self.half)
+
+  def _has_floor(self, positions: NDArray) -> NDArray[np.bool_]:
+    feet = positions - [self.half[0], self.half[1]]
+    return self.gv.is_region_collision_batch(feet - [0, self.floor_depth], feet + [2 * self.half[0], 0])
+
+  @staticmethod
+  def _connected(free: NDArray[np.bool_], start: Tuple[int, int]) -> NDArray[np.bool_]:
+    '''Free cells connected to start through free cells, around the edges of the arena.'''
+    reached = np.zeros_like(free)
+    if not free[start]:
+      return reached
+    reached[start] = True
+    while True:
+      grown = reached.copy()
+      for axis in (0, 1):
+        grown |= np.roll(reached, 1, axis=axis)
+        grown |= np.roll(reached, -1, axis=axis)
+      grown &= free
+      if (grown == reached).all():
+        return reached
+      reached = grown
+
+
+# Indices derived by level_free_space, shared by everything in the process that samples positions of the same level.
+_index_cache: Dict[Tuple[Any, ...], FreeSpaceIndex] = {}
+
+
+def level_free_space(
+    state_scenario: Mapping[str, Any],
+    grid_factor: int,
+    body_size: Tuple[float, float] = (8, 14),
+    on_floor: bool = False,
+    reachable_from: Optional[Tuple[float, float]] = None) -> FreeSpaceIndex:
+  '''
+  Index of the positions of a level without its entities, created the first time it is asked for.
+
+  :param state_scenario: Scenario message of the level.
+  :param grid_factor: Size in pixels of the cells that have candidate positions.
+  '''
+  grid10 = np.array(state_scenario['grid'], dtype=np.int8)
+  key = (grid10.tobytes(), grid10.shape, int(state_scenario['cellSize']), grid_factor, tuple(body_size), on_floor,
+         None if reachable_from is None else tuple(reachable_from))
+  index = _index_cache.get(key)
+  if index is None:
+    gv = GridView(grid_factor)
+    gv.set_scenario(state_scenario)
+    index = FreeSpaceIndex(gv, body_size, on_floor, reachable_from=reachable_from)
+    _index_cache[key] = index
+  return index
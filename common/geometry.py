@@ -0,0 +1,68 @@
+from typing import Tuple, Union
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .constants import HEIGHT, HH, HW, WIDTH
+
+# The kernels only use arithmetic operators, so they work the same on python scalars and on numpy arrays.
+# Points are arrays with shape (..., 2) and broadcast against each other.
+
+Scalar = Union[int, float]
+SIZE = (WIDTH, HEIGHT)
+HALF_SIZE = (HW, HH)
+
+
+def wrap(v, low, high):
+  '''Brings v into [low, high) by wrapping around. Works with scalars or arrays.'''
+  return (v - low) % (high - low) + low
+
+
+def wrap_positions(p: ArrayLike, size: Tuple[int, int] = SIZE) -> NDArray:
+  '''Brings positions with shape (..., 2) inside the arena.'''
+  return np.mod(p, size)
+
+
+def displacement(a: ArrayLike, b: ArrayLike, wrap_around: bool = True, size: Tuple[int, int] = SIZE) -> NDArray:
+  '''
+  Displacement from a to b, with shape (..., 2).
+
+  :param wrap_around: When True takes the shortest way around the edges of the arena, so each axis is in [-size/2, size/2).
+  '''
+  d = np.subtract(b, a, dtype=np.float64)
+  if wrap_around:
+    d = wrap(d, np.divide(size, -2), np.divide(size, 2))
+  return d
+
+
+def distance2(a: ArrayLike, b: ArrayLike, wrap_around: bool = True, size: Tuple[int, int] = SIZE) -> NDArray:
+  '''Squared distance from a to b, with shape (...).'''
+  d = displacement(a, b, wrap_around, size)
+  return d[..., 0]**2 + d[..., 1]**2
+
+
+def distance(a: ArrayLike, b: ArrayLike, wrap_around: bool = True, size: Tuple[int, int] = SIZE) -> NDArray:
+  '''Distance from a to b, with shape (...).'''
+  return np.sqrt(distance2(a, b, wrap_around, size))
+
+
+def normalized_displacement(a: ArrayLike, b: ArrayLike) -> NDArray:
+  '''
+  Wrap-aware displacement from a to b scaled to [-1, 1], where 1 is half the arena. This is how observations encode
+  relative positions.
+  '''
+  return displacement(a, b) / HALF_SIZE
+
+
+def grid_cells(p: ArrayLike, cell_size: int, cap: bool = True) -> Tuple[NDArray, NDArray]:
+  '''
+  Cell indices of positions with shape (..., 2) in a grid of the given cell size.
+
+  :param cap: Wraps the positions inside the arena first, so indices are always valid.
+  returns: Arrays of i and j indices, each with shape (...).
+  '''
+  p = np.asarray(p)
+  if cap:
+    p = wrap_positions(p)
+  cells = np.floor_divide(p, cell_size).astype(np.int64)
+  return cells[..., 0], cells[..., 1]
@@ -1,12 +1,17 @@
 import logging
+import os
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import matplotlib.pyplot as plt
 import numpy as np
 from numpy.typing import NDArray
 
-from .common import Entity, Vec2, bounded, grid_pos
+from . import kernels
+from .common import Entity, Vec2, bounded
 from .constants import HEIGHT, HH, HW, WIDTH
+from .pyramid import OccupancyPyramid
+from .raycast import cast_rays, line_of_sight
+from .shared_cache import SharedLevelCache, level_key
 
 
 def plot_grid(grid: NDArray, name: str):
@@ -23,35 +28,38 @@ def plot_grid(grid: NDArray, name: str):
   plt.show()
 
 
-def fill_grid(e: Entity, grid: NDArray, shouldLog = False):
-  factor = WIDTH / grid.shape[0]
-  if WIDTH % grid.shape[0] != 0:
+def grid_rects(e: Entity, shape: Tuple[int, int]) -> List[Tuple[slice, slice]]:
+  '''Rectangles of cells of a grid with the given shape that are covered by the entity, wrapping around the edges.'''
+  factor = WIDTH / shape[0]
+  if WIDTH % shape[0] != 0:
     raise Exception('fillGrid requires factor to be integer: {}'.format(factor))
-  if HEIGHT / grid.shape[1] != factor:
-    raise Exception('Invalid aspect rate for grid: {}'.format(grid.shape))
+  if HEIGHT / shape[1] != factor:
+    raise Exception('Invalid aspect rate for grid: {}'.format(shape))
   bot_left = e.bot_left()
   top_right = e.top_right()
-  x1 = int(bounded(bot_left.x // factor, 0, grid.shape[0]))
-  x2 = int(bounded(top_right.x // factor, 0, grid.shape[0]))
-  y1 = int(bounded(bot_left.y // factor, 0, grid.shape[1]))
-  y2 = int(bounded(top_right.y // factor, 0, grid.shape[1]))
-  if shouldLog:
-    logging.info("{} {} {} {}".format(x1,x2,y1,y2))
+  x1 = int(bounded(bot_left.x // factor, 0, shape[0]))
+  x2 = int(bounded(top_right.x // factor, 0, shape[0]))
+  y1 = int(bounded(bot_left.y // factor, 0, shape[1]))
+  y2 = int(bounded(top_right.y // factor, 0, shape[1]))
   if x2 > x1:
     if y2 > y1:
-      grid[x1:x2, y1:y2] = 1
-    else:
-      grid[x1:x2, y1:grid.shape[1]] = 1
-      grid[x1:x2, 0:y2] = 1
-  else:
-    if y2 > y1:
-      grid[x1:grid.shape[0], y1:y2] = 1
-      grid[0:x2, y1:y2] = 1
-    else:
-      grid[x1:grid.shape[0], y1:grid.shape[1]] = 1
-      grid[x1:grid.shape[0], 0:y2] = 1
-      grid[0:x2, 0:grid.shape[1]] = 1
-      grid[0:x2, 0:y2] = 1
+      return [(slice(x1, x2), slice(y1, y2))]
+    return [(slice(x1, x2), slice(y1, shape[1])), (slice(x1, x2), slice(0, y2))]
+  if y2 > y1:
+    return [(slice(x1, shape[0]), slice(y1, y2)), (slice(0, x2), slice(y1, y2))]
+  return [
+    (slice(x1, shape[0]), slice(y1, shape[1])),
+    (slice(x1, shape[0]), slice(0, y2)),
+    (slice(0, x2), slice(0, shape[1])),
+    (slice(0, x2), slice(0, y2))]
+
+
+def fill_grid(e: Entity, grid: NDArray, shouldLog = False):
+  rects = grid_rects(e, grid.shape)
+  if shouldLog:
+    logging.info("{}".format(rects))
+  for rect in rects:
+    grid[rect] = 1
 
 
 def crop_grid(bot_left: Vec2, top_right: Vec2, grid: NDArray) -> NDArray:
@@ -104,6 +112,76 @@ def crop_grid(bot_left: Vec2, top_right: Vec2, grid: NDArray) -> NDArray:
   return grid[x1:x2, y1:y2]
 
 
+# Least amount of segments for which casting on the pyramid is faster than on the grid, by grid factor, measured with
+# benchmarks/bench_pyramid.py on the numpy kernels. With numba the grid is always faster, and so it is for coarser grids.
+_PYRAMID_MIN_BATCH = {1: 100, 2: 300}
+
+# Level grids derived by level_grids, shared by every GridView in the process.
+_level_cache: Dict[Tuple[bytes, Tuple[int, ...], int, int], Tuple[NDArray, NDArray]] = {}
+# Cache used to share what is derived from levels with other processes. Created from the environment variable
+# TOWERFALL_LEVEL_CACHE the first time it is needed, unless use_shared_level_cache was called before.
+_shared_cache: Optional[SharedLevelCache] = None
+_shared_cache_set = False
+
+
+def use_shared_level_cache(cache: Optional[SharedLevelCache]):
+  '''Shares the grids of the levels seen from now on with other processes through cache. None stops sharing.'''
+  global _shared_cache, _shared_cache_set
+  _shared_cache = cache
+  _shared_cache_set = True
+
+
+def shared_level_cache() -> Optional[SharedLevelCache]:
+  '''
+  Cache used to share what is derived from levels with other processes, if any. Env workers inherit the environment
+  variable TOWERFALL_LEVEL_CACHE, so setting it to a prefix before creating them is enough for all of them to use the
+  same blocks.
+  '''
+  global _shared_cache, _shared_cache_set
+  if not _shared_cache_set:
+    prefix = os.environ.get('TOWERFALL_LEVEL_CACHE')
+    _shared_cache = SharedLevelCache(prefix) if prefix else None
+    _shared_cache_set = True
+  return _shared_cache
+
+
+def upsample_grid(grid10: NDArray, csize: int, grid_factor: int) -> NDArray:
+  '''
+  Expands a level grid of cells of size csize into a grid with cells of size grid_factor covering the arena.
+  Each level cell i covers the cells [csize*i // grid_factor, csize*(i+1) // grid_factor) of the new grid.
+  '''
+  grid = np.zeros((WIDTH // grid_factor, HEIGHT // grid_factor), dtype=np.int8)
+  bounds = [csize * np.arange(k + 1) // grid_factor for k in grid10.shape]
+  # Level cell that covers each cell of the new grid.
+  ix = np.repeat(np.arange(grid10.shape[0]), np.diff(bounds[0]))
+  iy = np.repeat(np.arange(grid10.shape[1]), np.diff(bounds[1]))
+  grid[:len(ix), :len(iy)] = grid10[ix[:, None], iy[None, :]] == 1
+  return grid
+
+
+def level_grids(grid10: NDArray, csize: int, grid_factor: int) -> Tuple[NDArray, NDArray]:
+  '''
+  Gets the level grid and its upsampled version, computing them only the first time a level is seen in the process, or
+  in any process when a shared level cache is in use. The returned arrays are shared, so they are read-only.
+  '''
+  key = (grid10.tobytes(), grid10.shape, csize, grid_factor)
+  grids = _level_cache.get(key)
+  if grids is None:
+    cache = shared_level_cache()
+    if cache:
+      name = level_key(grid10, csize, grid_factor)
+      level = grid10
+      grid10 = cache.get_or_create(f'{name}_level', lambda: level)
+      grid = cache.get_or_create(f'{name}_grid', lambda: upsample_grid(level, csize, grid_factor))
+    else:
+      grid10 = grid10.copy()
+      grid = upsample_grid(grid10, csize, grid_factor)
+      grid10.flags.writeable = False
+      grid.flags.writeable = False
+    grids = _level_cache[key] = (grid10, grid)
+  return grids
+
+
 class GridView():
   '''This is a representation of the scenario to show what parts of the screen are empty or occupied.
   It is capable of adjusting the resolution of the occupation matrix and recentering at different positions.'''
@@ -113,52 +191,54 @@ class GridView():
 
   def set_scenario(self, game_state: Dict[str, Any]):
     # logging.info(f'Setting scenario in GridView {game_state["grid"]}')
-    self.fixed_grid10 = np.array(game_state['grid'])
     self.csize: int = int(game_state['cellSize'])
-    self.fixed_grid: NDArray = np.zeros((WIDTH // self.gf, HEIGHT // self.gf), dtype=np.int8)
-    for i in range(self.fixed_grid10.shape[0]):
-      for j in range(self.fixed_grid10.shape[1]):
-        if self.fixed_grid10[i][j] == 1:
-          self.fixed_grid[
-            self.csize*i // self.gf:self.csize*(i+1) // self.gf,
-            self.csize*j // self.gf:self.csize*(j+1) // self.gf] = 1
-
+    self.fixed_grid10, self.fixed_grid = level_grids(np.array(game_state['grid'], dtype=np.int8), self.csize, self.gf)
+    # The grid is kept tiled 2x2 so that recentering at any position is a slice of it instead of a roll.
+    # self.grid is the bottom left tile. Cells changed by entities are tracked to restore them in the next update.
+    W, H = self.fixed_grid.shape
+    self.tiled_grid: NDArray = np.tile(self.fixed_grid, (2, 2))
+    self.grid: NDArray = self.tiled_grid[:W, :H]
+    self.shifted_grid: NDArray = self.grid
+    self._dirty: List[Tuple[slice, slice]] = []
+    self._sat: Optional[NDArray] = None
+    self._pyramid: Optional[OccupancyPyramid] = None
+    # Cells that shifted_grid is rolled by, so that other arrays with the shape of the grid can be centered the same.
+    self.offset: Tuple[int, int] = (0, 0)
 
   def update(self, entities: List[Entity], me: Entity):
-    '''To be called every frame to fill the empty spaces with the entities.'''
-    self.grid = self.fixed_grid.copy()
+    '''
+    To be called every frame to fill the empty spaces with the entities.
+    self.grid and self.shifted_grid are views that are overwritten by the next update.
+    '''
+    W, H = self.grid.shape
+    dirty: List[Tuple[slice, slice]] = []
     for e in entities:
       # TODO Add more entities to this
       if e.type == 'crackedWall':
-        fill_grid(e, self.grid)
-    # self._plot_grid(a, 'a')
-    self.shifted_grid = np.roll(self.grid, -int(me.p.x - HW) // self.gf, axis=0)
-    self.shifted_grid = np.roll(self.shifted_grid, -int(me.p.y - HH) // self.gf, axis=1)
-    # logging.info('obs_grid: {}'.format(self.obs_grid.shape))
-    # self._plot_grid(self.obs_grid, 'obs_grid')
-    # print(self.obs_grid)
+        dirty.extend(grid_rects(e, self.grid.shape))
+    # Cracked walls rarely change, so usually there is nothing to write.
+    if dirty != self._dirty:
+      for rect in self._dirty:
+        self.grid[rect] = self.fixed_grid[rect]
+      for rect in dirty:
+        self.grid[rect] = 1
+      for xs, ys in self._dirty + dirty:
+        block = self.grid[xs, ys]
+        self.tiled_grid[xs.start + W:xs.stop + W, ys] = block
+        self.tiled_grid[xs, ys.start + H:ys.stop + H] = block
+        self.tiled_grid[xs.start + W:xs.stop + W, ys.start + H:ys.stop + H] = block
+      self._dirty = dirty
+      self._sat = None
+      self._pyramid = None
+    # Same as np.roll(self.grid, -int(me.p.x - HW) // self.gf, axis=0) and likewise for y.
+    x0 = -(-int(me.p.x - HW) // self.gf) % W
+    y0 = -(-int(me.p.y - HH) // self.gf) % H
+    self.shifted_grid = self.tiled_grid[x0:x0 + W, y0:y0 + H]
+    self.offset = (x0, y0)
 
   def ray(self, pos: Vec2, step: Vec2, max: float) -> float:
-    # This is not tested
-    p = pos.copy()
-    dist = float('-inf')
-    for i in range(int(max) // self.csize + 1):
-      p.add(step)
-      i, j = grid_pos(p, self.csize)
-      if self.fixed_grid10[i, j]:
-        if step.x > 0:
-          dist = (int(p.x) // self.csize) * self.csize - pos.x
-          break
-        if step.x < 0:
-          dist = pos.x + (int(p.x) // self.csize + 1) * self.csize
-          break
-        if step.y > 0:
-          dist = (int(p.y) // self.csize) * self.csize - pos.y
-          break
-        if step.y < 0:
-          dist = pos.y + (int(p.y) // self.csize + 1) * self.csize
-          break
-    return min(max, dist)
+    '''Distance from pos to the first wall of the level in the direction of step, or max if there is none closer.'''
+    return float(cast_rays(self.fixed_grid10, self.csize, (pos.x, pos.y), (step.x, step.y), max)[0])
 
 
   def view_sight_length(self, sight: Optional[Union[int, Tuple[int, int]]]) -> Tuple[int, int]:
@@ -183,6 +263,19 @@ class GridView():
         W // 2 - m: W // 2 + m,
         H // 2 - n: H // 2 + n]
 
+  def view_of(self, array: NDArray, sight: Optional[Union[int, Tuple[int, int]]]) -> NDArray:
+    '''
+    Same as view for other arrays with the shape of the grid in their last two axes, like distance fields, centered at
+    the player of the last update.
+    '''
+    W, H = self.fixed_grid.shape
+    x0, y0 = self.offset
+    shifted = np.roll(array, (-x0, -y0), axis=(-2, -1))
+    if not sight:
+      return shifted
+    m, n = self.view_sight_length(sight)
+    return shifted[..., W // 2 - m: W // 2 + m, H // 2 - n: H // 2 + n]
+
   def is_cell_blocked(self, i: int, j: int) -> bool:
     '''Checks whether a cell is blocked by walls'''
     m, n = self.fixed_grid10.shape
@@ -190,25 +283,77 @@ class GridView():
     j %= n
     return self.fixed_grid10[i, j]
 
-  def is_region_collision(self, bot_left: Vec2, top_right: Vec2):
-    # TODO make crop do the wrap around the edges so we dont end up with empty crops
-    crop = crop_grid(bot_left, top_right, self.grid)
-    if crop.shape[1] == 0:
+  def is_region_collision(self, bot_left: Vec2, top_right: Vec2) -> bool:
+    '''
+    Checks whether any cell of self.grid in the region is occupied. The region wraps around the edges.
+    Regions that are empty in y count as collisions.
+    '''
+    x1 = int(bot_left.x // self.gf)
+    y1 = int(bot_left.y // self.gf)
+    w = int(top_right.x // self.gf) - x1
+    h = int(top_right.y // self.gf) - y1
+    if h <= 0:
       return True
-    try:
-      return crop.max() != 0
-    except:
-      print(f'crop: {crop} {len(crop)} {crop.shape} {bot_left} {top_right}')
-      raise Exception()
+    if w <= 0:
+      raise Exception(f'Empty region {bot_left} {top_right}')
+    W, H = self.grid.shape
+    sat = self._get_sat()
+    x1 %= W
+    y1 %= H
+    x2 = x1 + min(w, W)
+    y2 = y1 + min(h, H)
+    return sat[x2, y2] - sat[x1, y2] - sat[x2, y1] + sat[x1, y1] != 0
+
+  def is_region_collision_batch(self, bot_left: NDArray, top_right: NDArray) -> NDArray[np.bool_]:
+    '''
+    Same as is_region_collision for many regions at once.
+
+    :param bot_left: Bottom left corners with shape (N, 2).
+    :param top_right: Top right corners with shape (N, 2).
+    returns: Whether each region collides, with shape (N,). Empty regions count as collisions.
+    '''
+    W, H = self.grid.shape
+    c1 = np.floor_divide(bot_left, self.gf).astype(np.int64)
+    size = np.floor_divide(top_right, self.gf).astype(np.int64) - c1
+    x1 = c1[:, 0] % W
+    y1 = c1[:, 1] % H
+    x2 = x1 + np.clip(size[:, 0], 0, W)
+    y2 = y1 + np.clip(size[:, 1], 0, H)
+    sat = self._get_sat()
+    count = sat[x2, y2] - sat[x1, y2] - sat[x2, y1] + sat[x1, y1]
+    return (count != 0) | (size[:, 0] <= 0) | (size[:, 1] <= 0)
+
+  def _get_sat(self) -> NDArray:
+    '''
+    Summed-area table of the tiled grid, where sat[i, j] is the amount of occupied cells in tiled_grid[:i, :j].
+    Since the grid is tiled, any region that wraps around the edges is a single rectangle of it.
+    It is computed the first time it is needed after the grid changes.
+    '''
+    if self._sat is None:
+      W, H = self.tiled_grid.shape
+      self._sat = np.zeros((W + 1, H + 1), dtype=np.int32)
+      np.cumsum(self.tiled_grid, axis=0, dtype=np.int32, out=self._sat[1:, 1:])
+      np.cumsum(self._sat[1:, 1:], axis=1, out=self._sat[1:, 1:])
+    return self._sat
+
+  def get_pyramid(self) -> OccupancyPyramid:
+    '''Coarser levels of self.grid, rebuilt after the entities that change it do.'''
+    if self._pyramid is None:
+      self._pyramid = OccupancyPyramid(self.grid, self.gf)
+    return self._pyramid
 
   def is_clean_path(self, p1: Vec2, p2: Vec2) -> bool:
-    dp = p2 - p1
-    dmax = int(dp.length() / self.gf)
-    dp.set_length(self.gf)
-    p = p1.copy()
-    for i in range(dmax):
-      pgrid = grid_pos(p, self.gf)
-      if self.grid[pgrid] > 0:
-        return False
-      p.add(dp)
-    return True
+    '''Checks whether the segment from p1 to p2 only goes through free cells of self.grid, around the edges if shorter.'''
+    return line_of_sight(self.grid, self.gf, (p1.x, p1.y), (p2.x, p2.y))
+
+  def is_clean_path_batch(self, p1: NDArray, p2: NDArray) -> NDArray[np.bool_]:
+    '''
+    Same as is_clean_path for many segments at once.
+
+    :param p1: Start of the segments with shape (N, 2), or (2,) to share one start.
+    :param p2: End of the segments with shape (N, 2).
+    '''
+    min_batch = _PYRAMID_MIN_BATCH.get(self.gf)
+    if min_batch is not None and len(p2) >= min_batch and kernels.get_backend() == kernels.NUMPY:
+      return self.get_pyramid().line_of_sight(p1, p2)
+    return line_of_sight(self.grid, self.gf, p1, p2)
@@ -0,0 +1,235 @@
+import logging
+import os
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+# numba is an optional dependency, installed with pip install numba. Without it every kernel runs its numpy or plain
+# python implementation, which give the same results.
+try:
+  import numba
+except ImportError:
+  numba = None
+
+NUMPY = 'numpy'
+NUMBA = 'numba'
+BACKENDS = (NUMPY, NUMBA)
+
+# Backend set with set_backend. When None it is taken from the environment variable, or numba if it can be imported.
+_backend: Optional[str] = None
+_compiled: Dict[Callable, Callable] = {}
+
+# Order in which BFS visits the neighbours of a cell.
+_DI = (0, 0, 1, -1)
+_DJ = (1, -1, 0, 0)
+
+
+def available_backends() -> Tuple[str, ...]:
+  return BACKENDS if numba is not None else (NUMPY,)
+
+
+def set_backend(name: Optional[str]):
+  '''
+  Selects the implementation of the kernels in this process.
+
+  :param name: One of BACKENDS, or None to select it automatically.
+  '''
+  if name is not None and name not in available_backends():
+    raise Exception(f'Kernel backend {name} is not available. Available: {available_backends()}')
+  global _backend
+  _backend = name
+
+
+def get_backend() -> str:
+  '''
+  Backend used by the kernels: the one set with set_backend, else the one in the environment variable
+  TOWERFALL_KERNELS, else numba if it can be imported.
+  '''
+  if _backend is not None:
+    return _backend
+  name = os.environ.get('TOWERFALL_KERNELS')
+  if name:
+    if name not in available_backends():
+      raise Exception(f'TOWERFALL_KERNELS={name} is not available. Available: {available_backends()}')
+    return name
+  return NUMBA if numba is not None else NUMPY
+
+
+def compiled(kernel: Callable) -> Optional[Callable]:
+  '''
+  Compiled version of a scalar kernel when the numba backend is selected, or None when the numpy implementation has to
+  be used. Kernels are compiled the first time they are asked for.
+  '''
+  if get_backend() != NUMBA:
+    return None
+  jitted = _compiled.get(kernel)
+  if jitted is None:
+    logging.info(f'Compiling {kernel.__name__}')
+    jitted = numba.njit(cache=True, nogil=True)(kernel)
+    _compiled[kernel] = jitted
+  return jitted
+
+
+def bfs(
+    blocked: NDArray,
+    start: Tuple[int, int],
+    goal: NDArray[np.bool_],
+    stamp: NDArray[np.int32],
+    mark: int,
+    parent: NDArray[np.int32],
+    dist: NDArray[np.int32],
+    queue: NDArray[np.int32]) -> int:
+  '''
+  Breadth first search over the free cells of a grid that wraps around the arena, visiting the neighbours of each cell
+  in the order up, down, right, left. The start cell is visited even if it is blocked.
+
+  The buffers are reused across searches instead of being cleared: a cell was reached by this search if its stamp is
+  mark, and only then its parent and dist are set.
+
+  :param blocked: Grid indexed [i, j]. Non zero cells are blocked.
+  :param start: Cell (i, j) where the search starts.
+  :param goal: Cells where the search stops, with the shape of the grid.
+  :param stamp: Marks of the cells reached, with the shape of the grid.
+  :param mark: Mark of this search. It must differ from all values in stamp.
+  :param parent: Flat index of the cell each cell was reached from, or -1 for the start.
+  :param dist: Steps from the start to each cell.
+  :param queue: Buffer with at least one element per cell.
+  returns: Flat index of the first goal cell found, which is one of the closest to start, or -1 if none can be reached.
+  '''
+  kernel = compiled(bfs_kernel)
+  if kernel is not None:
+    return int(kernel(blocked, start[0], start[1], goal, stamp, mark, parent, dist, queue))
+  return _bfs_deque(blocked, start, goal, stamp, mark, parent, dist)
+
+
+def bfs_kernel(blocked, si, sj, goal, stamp, mark, parent, dist, queue):
+  '''Scalar implementation of bfs, with a ring buffer as the queue.'''
+  W, H = blocked.shape
+  s = si * H + sj
+  stamp[si, sj] = mark
+  parent[si, sj] = -1
+  dist[si, sj] = 0
+  queue[0] = s
+  head = 0
+  tail = 1
+  while head < tail:
+    c = queue[head]
+    head += 1
+    ci = c // H
+    cj = c % H
+    if goal[ci, cj]:
+      return c
+    for k in range(4):
+      ni = (ci + _DI[k]) % W
+      nj = (cj + _DJ[k]) % H
+      if stamp[ni, nj] != mark and blocked[ni, nj] == 0:
+        stamp[ni, nj] = mark
+        parent[ni, nj] = c
+        dist[ni, nj] = dist[ci, cj] + 1
+        queue[tail] = ni * H + nj
+        tail += 1
+  return -1
+
+
+def _bfs_deque(blocked, start, goal, stamp, mark, parent, dist) -> int:
+  '''
+  Same as bfs_kernel in plain python, with a deque as the queue. The grid is read from lists and the cells reached are
+  written to the buffers at once at the end, since reading and writing numpy arrays one cell at a time is slow.
+  '''
+  W, H = blocked.shape
+  free = (blocked.reshape(-1) == 0).tolist()
+  is_goal = goal.reshape(-1).tolist()
+  s = start[0] * H + start[1]
+  prev = {s: -1}
+  depth = {s: 0}
+  queue = deque([s])
+  found = -1
+  while queue:
+    c = queue.popleft()
+    if is_goal[c]:
+      found = c
+      break
+    ci, cj = divmod(c, H)
+    d = depth[c] + 1
+    for n in (ci * H + (cj + 1) % H, ci * H + (cj - 1) % H, (ci + 1) % W * H + cj, (ci - 1) % W * H + cj):
+      if n not in prev and free[n]:
+        prev[n] = c
+        depth[n] = d
+        queue.append(n)
+  cells = np.fromiter(prev.keys(), dtype=np.int64, count=len(prev))
+  stamp.reshape(-1)[cells] = mark
+  parent.reshape(-1)[cells] = np.fromiter(prev.values(), dtype=np.int64, count=len(prev))
+  dist.reshape(-1)[cells] = np.fromiter(depth.values(), dtype=np.int64, count=len(depth))
+  return found
+
+
+def cast_rays_kernel(grid, cell_size, o, d, max_dist, eps, out):
+  '''
+  Scalar implementation of raycast.cast_rays, stepping through the crossings of each ray one at a time.
+  Directions must be normalized. Distances are computed with the same operations, so they are equal to the last bit.
+  '''
+  m, n = grid.shape
+  for r in range(o.shape[0]):
+    ox = o[r, 0]
+    oy = o[r, 1]
+    dx = d[r, 0]
+    dy = d[r, 1]
+    i = int(ox // cell_size)
+    j = int(oy // cell_size)
+    if grid[i % m, j % n] != 0:
+      out[r] = 0
+      continue
+    sx = 1 if dx > 0 else (-1 if dx < 0 else 0)
+    sy = 1 if dy > 0 else (-1 if dy < 0 else 0)
+    tx0 = np.inf
+    ty0 = np.inf
+    tdx = 0.0
+    tdy = 0.0
+    if sx != 0:
+      tdx = cell_size / abs(dx)
+      tx0 = (((i + 1) * cell_size - ox) if sx > 0 else (ox - i * cell_size)) * (1 / abs(dx))
+    if sy != 0:
+      tdy = cell_size / abs(dy)
+      ty0 = (((j + 1) * cell_size - oy) if sy > 0 else (oy - j * cell_size)) * (1 / abs(dy))
+    out[r] = max_dist[r]
+    kx = 0
+    ky = 0
+    prev_t = 0.0
+    prev_x = False
+    while True:
+      tx = tx0 + kx * tdx
+      ty = ty0 + ky * tdy
+      is_x = tx <= ty
+      if is_x:
+        t = tx
+        i += sx
+        kx += 1
+      else:
+        t = ty
+        j += sy
+        ky += 1
+      if not t < max_dist[r]:
+        break
+      hit = grid[i % m, j % n] != 0
+      # On a corner the cell that was skipped is the one only stepped in y.
+      if not is_x and prev_x and t - prev_t < eps * cell_size:
+        hit = hit or grid[(i - sx) % m, j % n] != 0
+      if hit:
+        out[r] = t
+        break
+      prev_t = t
+      prev_x = is_x
+
+
+def fill_rects_kernel(out, channel, x1, y1, w, h):
+  '''Scalar implementation of filling rectangles of cells in a grid per channel that wraps around the arena.'''
+  W = out.shape[1]
+  H = out.shape[2]
+  for r in range(channel.shape[0]):
+    c = channel[r]
+    for a in range(w[r]):
+      i = (x1[r] + a) % W
+      for b in range(h[r]):
+        out[c, i, (y1[r] + b) % H] = 1
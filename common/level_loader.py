@@ -0,0 +1,53 @@
+import os
+import xml.etree.ElementTree as ET
+from typing import Any, Dict
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+def parse_bitstring(text: str) -> NDArray[np.int8]:
+  '''
+  Parses a layer exported as a bitstring, one line per row of cells from the top of the screen and one character per
+  cell. The result is indexed [i, j] for the cell at (x, y) with y pointing up, like the grid of a scenario message.
+  '''
+  rows = [row.strip() for row in text.strip().splitlines() if row.strip()]
+  if len(set(len(row) for row in rows)) != 1:
+    raise Exception(f'Rows of the bitstring have different lengths: {set(len(row) for row in rows)}')
+  bits = np.array([[c == '1' for c in row] for row in rows], dtype=np.int8)
+  return np.ascontiguousarray(bits[::-1].T)
+
+
+def load_level(path: str) -> Dict[str, Any]:
+  '''
+  Reads a level file of the game into a scenario message like the one sent by the game, so GridView.set_scenario and
+  everything derived from the level can be used without launching it.
+
+  The level geometry comes from the Solids layer. The BG layer is only the background and does not collide.
+  Besides type, grid and cellSize it has the name of the level and playerSpawns, the positions of the player spawns
+  with y pointing up.
+  '''
+  root = ET.parse(path).getroot()
+  solids = root.find('Solids')
+  if solids is None or solids.get('exportMode') != 'Bitstring':
+    raise Exception(f'Level has no Solids layer exported as bitstring: {path}')
+  grid = parse_bitstring(solids.text or '')
+  width = int(root.get('width', grid.shape[0]))
+  height = int(root.get('height', grid.shape[1]))
+  cell_size = width // grid.shape[0]
+  if grid.shape[0] * cell_size != width or grid.shape[1] * cell_size != height:
+    raise Exception(f'Solids of shape {grid.shape} do not match level size {width}x{height}')
+  # Entities of the level file have y pointing down.
+  spawns = [dict(x=float(e.get('x', 0)), y=height - float(e.get('y', 0))) for e in root.iter('PlayerSpawn')]
+  return dict(
+    type='scenario',
+    name=os.path.splitext(os.path.basename(path))[0],
+    grid=grid.tolist(),
+    cellSize=cell_size,
+    playerSpawns=spawns)
+
+
+def load_level_artifacts(level_dir: str) -> Dict[str, NDArray]:
+  '''Loads the arrays precomputed for a level by precompute_levels.py.'''
+  with np.load(os.path.join(level_dir, 'arrays.npz')) as arrays:
+    return {name: arrays[name] for name in arrays.files}
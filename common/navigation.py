@@ -0,0 +1,294 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from . import geometry
+from .grid import shared_level_cache
+from .kernels import _DI, _DJ
+from .shared_cache import level_key
+
+
+def all_pairs_distances(wall: NDArray) -> NDArray[np.int16]:
+  '''
+  Steps between every pair of cells of a grid that wraps around the arena, moving up, down, right or left through free
+  cells. The searches from all cells advance together, one step at a time.
+
+  Like PathGrid, a search can start in a blocked cell but never goes through one. So the distance from a blocked cell
+  goes through its free neighbours, and blocked cells can't be reached.
+
+  :param wall: Grid indexed [i, j]. Non zero cells are blocked.
+  returns: Distances with shape (N, N) where N is the amount of cells, indexed [target, source] by flat cell index,
+    or -1 where the target can't be reached.
+  '''
+  W, H = wall.shape
+  N = W * H
+  free = np.asarray(wall) == 0
+  t = np.arange(N)
+  seeds = np.zeros((N, W, H), dtype=np.bool_)
+  seeds[t, t // H, t % H] = True
+  # Blocked targets can't be reached from anywhere else.
+  return _multi_source_distances(free, seeds, seeds & free).reshape(N, N)
+
+
+def distance_fields(wall: NDArray, sources: NDArray[np.bool_], max_steps: Optional[int] = None) -> NDArray[np.int16]:
+  '''
+  Steps from every cell to the nearest source of each channel, moving like in all_pairs_distances. All channels are
+  searched together, one step at a time.
+
+  Sources in blocked cells, like arrows stuck in walls, can be entered from their neighbours.
+
+  :param wall: Grid indexed [i, j]. Non zero cells are blocked.
+  :param sources: Source cells of each channel with shape (C, W, H).
+  :param max_steps: Cells further than this are left as unreachable.
+  returns: Distances with shape (C, W, H), or -1 where no source can be reached.
+  '''
+  sources = np.asarray(sources, dtype=np.bool_)
+  return _multi_source_distances(np.asarray(wall) == 0, sources, sources.copy(), max_steps)
+
+
+def entity_distance_fields(
+    wall: NDArray,
+    cell_size: int,
+    positions: Mapping[str, ArrayLike],
+    max_steps: Optional[int] = None) -> Dict[str, NDArray[np.int16]]:
+  '''
+  Same as distance_fields with the sources given as positions of entities.
+
+  :param cell_size: Size in pixels of the cells of wall.
+  :param positions: Positions with shape (N, 2) of the entities of each category.
+  returns: Distance field of each category.
+  '''
+  W, H = wall.shape
+  names = list(positions)
+  sources = np.zeros((len(names), W, H), dtype=np.bool_)
+  for k, name in enumerate(names):
+    p = np.asarray(positions[name], dtype=np.float64).reshape(-1, 2)
+    i = np.floor_divide(p[:, 0], cell_size).astype(np.int64) % W
+    j = np.floor_divide(p[:, 1], cell_size).astype(np.int64) % H
+    sources[k, i, j] = True
+  fields = distance_fields(wall, sources, max_steps)
+  return {name: fields[k] for k, name in enumerate(names)}
+
+
+def _multi_source_distances(
+    free: NDArray[np.bool_],
+    seeds: NDArray[np.bool_],
+    frontier: NDArray[np.bool_],
+    max_steps: Optional[int] = None) -> NDArray[np.int16]:
+  '''
+  Wavefront search of each channel from its seeds, which have distance 0, spreading from the cells in frontier.
+  Blocked cells that are not seeds get one step more than their nearest neighbour that can be entered, which is a free
+  cell or a seed in frontier.
+  '''
+  W, H = free.shape
+  # Seeds in the frontier can be entered even when they are blocked.
+  enter = frontier | free
+  open_cells = free & ~seeds
+  # Steps each cell was still open for, which is one less than its distance. It is cheaper to add it up than to write
+  # the distance of the cells of each step.
+  count = np.zeros(seeds.shape, dtype=np.int16)
+  grown = np.empty_like(frontier)
+  tmp = np.empty_like(frontier)
+  step = 0
+  while frontier.any() and (max_steps is None or step < max_steps):
+    step += 1
+    _spread(frontier, grown, tmp)
+    np.logical_and(grown, open_cells, out=frontier)
+    open_cells ^= frontier
+    np.add(count, open_cells.view(np.int8), out=count)
+  dist = count + 1
+  dist[open_cells] = -1
+  dist[seeds] = 0
+
+  i, j = np.nonzero(~free)
+  if len(i):
+    unreached = np.iinfo(np.int16).max
+    best = np.full((len(dist), len(i)), unreached, dtype=np.int16)
+    for di, dj in zip(_DI, _DJ):
+      ni = (i + di) % W
+      nj = (j + dj) % H
+      d = dist[:, ni, nj]
+      np.minimum(best, np.where((d >= 0) & enter[:, ni, nj], d, unreached), out=best)
+    via = np.where(best < unreached, best + 1, -1).astype(np.int16)
+    if max_steps is not None:
+      via[via > max_steps] = -1
+    dist[:, i, j] = np.where(seeds[:, i, j], 0, via)
+  return dist
+
+
+def _spread(cells: NDArray[np.bool_], out: NDArray[np.bool_], tmp: NDArray[np.bool_]):
+  '''
+  Writes to out the neighbours of cells in the last two axes, around the edges, like ORing np.roll each way.
+  Shifts are done over the flattened arrays so that they copy whole rows, and only the cells that wrap are fixed.
+  '''
+  C, W, H = cells.shape
+  flat = cells.reshape(-1)
+  out.reshape(-1)[1:] = flat[:-1]
+  out[:, :, 0] = cells[:, :, -1]
+  tmp.reshape(-1)[:-1] = flat[1:]
+  tmp[:, :, -1] = cells[:, :, 0]
+  out |= tmp
+  rows = cells.reshape(C, W * H)
+  out_rows = out.reshape(C, W * H)
+  out_rows[:, H:] |= rows[:, :-H]
+  out_rows[:, :H] |= rows[:, -H:]
+  out_rows[:, :-H] |= rows[:, H:]
+  out_rows[:, -H:] |= rows[:, :H]
+
+
+def next_steps(wall: NDArray, dist: NDArray) -> NDArray[np.int16]:
+  '''
+  First cell of a shortest path from every cell to every other cell. Among neighbours that are equally close to the
+  target, the first in the order up, down, right, left is taken, as in PathGrid.
+
+  :param dist: Distances returned by all_pairs_distances for the same wall.
+  returns: Flat index of the next cell with shape (N, N), indexed [target, source], or -1 if the source is the target
+    or it can't be reached.
+  '''
+  W, H = wall.shape
+  N = W * H
+  free = np.asarray(wall) == 0
+  dist = dist.reshape(N, W, H)
+  i, j = np.meshgrid(np.arange(W), np.arange(H), indexing='ij')
+  step = np.full((N, W, H), -1, dtype=np.int16)
+  # Later directions are written first so that earlier ones overwrite them.
+  for di, dj in reversed(list(zip(_DI, _DJ))):
+    ni = (i + di) % W
+    nj = (j + dj) % H
+    closer = (dist[:, ni, nj] == dist - 1) & (dist > 0) & free[ni, nj]
+    step[closer] = np.broadcast_to(ni * H + nj, closer.shape)[closer]
+  return step.reshape(N, N)
+
+
+class NavigationTable:
+  '''
+  Distances and next steps between all pairs of cells of a level, so that "how far is X" and "where to go to reach X"
+  are lookups instead of a search. Cells are (i, j) tuples of the level grid.
+
+  :param wall: Level grid, usually GridView.fixed_grid10.
+  :param dist: Precomputed all_pairs_distances, computed if None.
+  :param next_step: Precomputed next_steps, computed if None.
+  '''
+  def __init__(self, wall: NDArray, dist: Optional[NDArray] = None, next_step: Optional[NDArray] = None):
+    self.wall = np.asarray(wall)
+    self.shape: Tuple[int, int] = self.wall.shape
+    self.dist = all_pairs_distances(self.wall) if dist is None else dist
+    self.next_step = next_steps(self.wall, self.dist) if next_step is None else next_step
+
+  def index(self, cell: Tuple[int, int]) -> int:
+    W, H = self.shape
+    return (cell[0] % W) * H + cell[1] % H
+
+  def cell(self, index: int) -> Tuple[int, int]:
+    return int(index) // self.shape[1], int(index) % self.shape[1]
+
+  def distance(self, source: Tuple[int, int], target: Tuple[int, int]) -> int:
+    '''Steps from source to target, or -1 if it can't be reached.'''
+    return int(self.dist[self.index(target), self.index(source)])
+
+  def distances_to(self, target: Tuple[int, int]) -> NDArray[np.int16]:
+    '''Steps from every cell to target with the shape of the grid, -1 where it can't be reached.'''
+    return self.dist[self.index(target)].reshape(self.shape)
+
+  def next_cell(self, source: Tuple[int, int], target: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    '''Cell to move to from source to get closer to target, or None if source is target or it can't be reached.'''
+    k = self.next_step[self.index(target), self.index(source)]
+    return None if k < 0 else self.cell(k)
+
+  def path(self, source: Tuple[int, int], target: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+    '''Cells of a shortest path from source to target, both included, or None if it can't be reached.'''
+    t = self.index(target)
+    k = self.index(source)
+    if self.dist[t, k] < 0:
+      return None
+    cells = [self.cell(k)]
+    while k != t:
+      k = self.next_step[t, k]
+      cells.append(self.cell(k))
+    return cells
+
+  def query(self, sources: ArrayLike, targets: ArrayLike) -> Tuple[NDArray[np.int8], NDArray[np.int16]]:
+    '''
+    Next step and distance of many pairs of cells at once, like many agents on the same level.
+
+    :param sources: Cells (i, j) with shape (N, 2).
+    :param targets: Cells (i, j) with shape (N, 2).
+    returns: Directions (di, dj) of the next step with shape (N, 2), each -1, 0 or 1 going around the edges, and
+      distances with shape (N,). Directions are 0 where the source is the target or it can't be reached, and distances
+      are -1 where it can't be reached.
+    '''
+    W, H = self.shape
+    s = np.asarray(sources, dtype=np.int64).reshape(-1, 2) % (W, H)
+    t = np.asarray(targets, dtype=np.int64).reshape(-1, 2) % (W, H)
+    si = s[:, 0] * H + s[:, 1]
+    ti = t[:, 0] * H + t[:, 1]
+    dist = self.dist[ti, si]
+    k = self.next_step[ti, si].astype(np.int64)
+    moves = k >= 0
+    directions = np.zeros((len(s), 2), dtype=np.int8)
+    directions[moves, 0] = (k[moves] // H - s[moves, 0] + 1) % W - 1
+    directions[moves, 1] = (k[moves] % H - s[moves, 1] + 1) % H - 1
+    return directions, dist
+
+  def closest(self, source: Tuple[int, int], targets: List[Tuple[int, int]]) -> int:
+    '''Position in targets of the reachable one with the shortest path from source, or -1 if none can be reached.'''
+    if not targets:
+      return -1
+    d = self.dist[[self.index(t) for t in targets], self.index(source)].astype(np.int32)
+    d[d < 0] = np.iinfo(np.int32).max
+    k = int(np.argmin(d))
+    return -1 if d[k] == np.iinfo(np.int32).max else k
+
+
+# Tables created by level_navigation, shared by everything in the process that navigates the same level.
+_navigation_cache: Dict[Tuple[bytes, Tuple[int, ...]], NavigationTable] = {}
+
+
+def level_navigation(wall: NDArray, precomputed: Optional[Mapping[str, NDArray]] = None) -> NavigationTable:
+  '''
+  Gets the navigation table of a level, computing it only the first time the level is seen in the process, or in any
+  process when a shared level cache is in use.
+
+  :param wall: Level grid.
+  :param precomputed: Arrays of the level loaded with load_level_artifacts. Their nav_dist and nav_next are used
+    instead of computing the tables.
+  '''
+  wall = np.asarray(wall, dtype=np.int8)
+  key = (wall.tobytes(), wall.shape)
+  table = _navigation_cache.get(key)
+  if table is None:
+    dist = next_step = None
+    if precomputed is not None and 'nav_dist' in precomputed:
+      if not np.array_equal(precomputed['grid10'], wall):
+        raise Exception('Precomputed navigation tables are from another level')
+      dist = precomputed['nav_dist']
+      next_step = precomputed['nav_next']
+    cache = shared_level_cache()
+    if cache:
+      name = level_key(wall)
+      dist = cache.get_or_create(f'{name}_nav_dist', lambda: all_pairs_distances(wall) if dist is None else dist)
+      next_step = cache.get_or_create(f'{name}_nav_next', lambda: next_steps(wall, dist) if next_step is None else next_step)
+    table = _navigation_cache[key] = NavigationTable(wall, dist, next_step)
+  return table
+
+
+def path_queries(
+    wall: NDArray,
+    cell_size: int,
+    starts: ArrayLike,
+    goals: ArrayLike,
+    precomputed: Optional[Mapping[str, NDArray]] = None) -> Tuple[NDArray[np.int8], NDArray[np.int16]]:
+  '''
+  Same as NavigationTable.query for positions in pixels, on the navigation table of the level from level_navigation.
+
+  :param wall: Level grid.
+  :param cell_size: Size in pixels of the cells of wall.
+  :param starts: Positions with shape (N, 2).
+  :param goals: Positions with shape (N, 2).
+  :param precomputed: Same as in level_navigation.
+  '''
+  table = level_navigation(wall, precomputed)
+  si, sj = geometry.grid_cells(np.asarray(starts, dtype=np.float64).reshape(-1, 2), cell_size)
+  ti, tj = geometry.grid_cells(np.asarray(goals, dtype=np.float64).reshape(-1, 2), cell_size)
+  return table.query(np.stack([si, sj], axis=1), np.stack([ti, tj], axis=1))
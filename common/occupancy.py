@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from . import kernels
+from .grid import GridView
+
+WALLS = 'walls'
+ENEMIES = 'enemies'
+FLYING_ARROWS = 'flying_arrows'
+STUCK_ARROWS = 'stuck_arrows'
+ITEMS = 'items'
+ARCHERS = 'archers'
+CHANNELS = (WALLS, ENEMIES, FLYING_ARROWS, STUCK_ARROWS, ITEMS, ARCHERS)
+
+
+class OccupancyRasterizer:
+  '''
+  Rasterizes the entities of an update into a grid per channel, all channels at once.
+  A cell is occupied if any entity of the channel overlaps it. Entities over the edges of the arena wrap around.
+
+  The fields read from the entities are copied into arrays in a single pass. Then the cells covered by all entities are
+  enumerated at once and written with a single scatter into a preallocated buffer, so the cost grows with the area the
+  entities cover instead of with the size of the grid.
+
+  :param grid_view: Provides the resolution and the level walls. Its scenario must be set before rasterizing.
+  :param channels: Channels to rasterize, in the order of the output.
+  :param exclude_player: Player index of the archer that is not included in the archers channel, usually the agent.
+  '''
+  def __init__(self,
+      grid_view: GridView,
+      channels: Sequence[str] = CHANNELS,
+      exclude_player: Optional[int] = None):
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+      raise Exception(f'Unknown occupancy channels: {sorted(unknown)}')
+    self.gv = grid_view
+    self.channels = list(channels)
+    self.index: Dict[str, int] = {c: k for k, c in enumerate(self.channels)}
+    self.exclude_player = exclude_player
+    self.out: Optional[NDArray[np.int8]] = None
+
+  def channel(self, name: str) -> NDArray[np.int8]:
+    '''Occupancy of a channel in the last rasterization, indexed [i, j] like GridView.grid.'''
+    assert self.out is not None
+    return self.out[self.index[name]]
+
+  def rasterize(self, entities: Sequence[Mapping[str, Any]]) -> NDArray[np.int8]:
+    '''
+    Rasterizes the entities.
+
+    :param entities: Entities of the update, as the dicts sent by the game.
+    returns: Occupancy with shape (channels, W, H) in a buffer that is overwritten by the next call.
+    '''
+    W, H = self.gv.fixed_grid.shape
+    if self.out is None or self.out.shape[1:] != (W, H):
+      self.out = np.zeros((len(self.channels), W, H), dtype=np.int8)
+
+    entity, channel = self._memberships(entities)
+    rects = np.array([(e['pos']['x'], e['pos']['y'], e['size']['x'], e['size']['y'])
+                      for e in (entities[k] for k in entity.tolist())], dtype=np.float64).reshape(-1, 4)
+    pos = rects[:, :2]
+    half = rects[:, 2:] / 2
+    gf = self.gv.gf
+    # Cells overlapped by [pos - half, pos + half), with the start wrapped inside the arena and at most the arena wide.
+    c1 = np.floor((pos - half) / gf).astype(np.int64)
+    c2 = np.ceil((pos + half) / gf).astype(np.int64)
+    x1 = c1[:, 0] % W
+    y1 = c1[:, 1] % H
+    w = np.clip(c2[:, 0] - c1[:, 0], 0, W)
+    h = np.clip(c2[:, 1] - c1[:, 1], 0, H)
+
+    self.out.fill(0)
+    kernel = kernels.compiled(kernels.fill_rects_kernel)
+    if kernel is not None:
+      kernel(self.out, channel, x1, y1, w, h)
+    else:
+      # Enumerates every cell of every rectangle: cell k of a rectangle with height h is at (k // h, k % h) in it.
+      n_cells = w * h
+      rect = np.repeat(np.arange(len(n_cells)), n_cells)
+      k = np.arange(len(rect)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+      i = (x1[rect] + k // h[rect]) % W
+      j = (y1[rect] + k % h[rect]) % H
+      self.out.reshape(-1)[(channel[rect] * W + i) * H + j] = 1
+
+    if WALLS in self.index:
+      np.bitwise_or(self.out[self.index[WALLS]], self.gv.fixed_grid, out=self.out[self.index[WALLS]])
+    return self.out
+
+  def _memberships(self, entities: Sequence[Mapping[str, Any]]) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    '''Pairs of entity and output channel for every channel each entity belongs to, as two arrays.'''
+    members: Dict[str, List[int]] = {name: [] for name in CHANNELS}
+    exclude = self.exclude_player
+    for k, e in enumerate(entities):
+      entity_type = e['type']
+      if e.get('isEnemy'):
+        members[ENEMIES].append(k)
+      if entity_type == 'arrow':
+        state = e.get('state')
+        if state == 'flying':
+          members[FLYING_ARROWS].append(k)
+        elif state == 'stuck':
+          members[STUCK_ARROWS].append(k)
+      elif entity_type == 'archer':
+        if exclude is None or e.get('playerIndex') != exclude:
+          members[ARCHERS].append(k)
+      elif entity_type == 'item':
+        members[ITEMS].append(k)
+      elif entity_type == 'crackedWall':
+        members[WALLS].append(k)
+    entity = [np.array(members[name], dtype=np.int64) for name in self.channels]
+    channel = [np.full(len(e), k, dtype=np.int64) for k, e in enumerate(entity)]
+    return np.concatenate(entity), np.concatenate(channel)
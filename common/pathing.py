@@ -1,4 +1,10 @@
+import numpy as np
+from numpy.typing import NDArray
+
 from .common import *
+from . import kernels
+from .raycast import line_of_sight
+from .visibility import VisibilityTable
 
 from typing import Optional, Tuple, List
 
@@ -15,95 +21,118 @@ class PathCell:
 
 
 class GPath:
-  def __init__(self, start: PathCell, end: PathCell, checkpoint: PathCell):
+  def __init__(self, start: PathCell, end: PathCell, checkpoint: PathCell, waypoints: Optional[List[PathCell]] = None):
     self.start = start
     self.end = end
     self.checkpoint = checkpoint
+    # Cells of the path pulled tight, from start to end, when a visibility table was available.
+    self.waypoints = waypoints
 
 
   def dir(self):
     return Vec2(self.checkpoint.i - self.start.i, self.checkpoint.j - self.start.j)
 
 
-class PathGrid:
-  def __init__(self, cell_size: int):
-    self.grid = [[PathCell(i, j, 0, cell_size) for j in range(24)] for i in range(32)]
-    self.csize = cell_size
-
-
-  def cell(self, i, j) -> PathCell:
-    return self.grid[i % 32][j % 24]
-
-
-  def add_to_visit(self, fro: PathCell, to: PathCell, to_visit: List[PathCell]):
-    # if fro.next:
-    #   raise Exception('({}, {}) already linked to ({}, {})'.format(fro.i, fro.j, fro.next.i, fro.next.j))
-    # fro.next = to
-    if to.prev:
-      raise Exception('({}, {}) already linked to ({}, {})'.format(to.i, to.j, to.prev.i, to.prev.j))
-    to.prev = fro
-    to_visit.append(to)
-    to.visited = True
+def path_from_cells(
+    cells: List[Tuple[int, int]],
+    cell_size: int,
+    wall: NDArray,
+    visibility: Optional[VisibilityTable] = None) -> GPath:
+  '''
+  Links the cells of a path, from start to end, into a GPath. The depth of each cell is its position in the path.
+
+  :param visibility: Visibility table of wall. When given, lines of sight are read from it instead of cast, and the
+    path gets its waypoints.
+  '''
+  path = [PathCell(i, j, depth, cell_size) for depth, (i, j) in enumerate(cells)]
+  for prev, next in zip(path[:-1], path[1:]):
+    prev.next = next
+    next.prev = prev
+    next.visited = True
+  start = path[0]
+  end = path[-1]
+  if visibility is not None and not visibility.matches(wall, cell_size):
+    visibility = None
+  waypoints = None if visibility is None else [path[k] for k in visibility.smooth(cells)]
+  if start == end:
+    return GPath(start, end, start, waypoints)
+
+  # The checkpoint is the furthest cell of the path that can be reached in a straight line.
+  if visibility is not None:
+    return GPath(start, end, path[visibility.furthest_visible(cells)], waypoints)
+  clean = line_of_sight(wall, cell_size, (start.pos.x, start.pos.y), [(c.pos.x, c.pos.y) for c in path[1:]])
+  if clean.all():
+    return GPath(start, end, end)
+  return GPath(start, end, path[int(clean.argmin())])
 
 
-  def is_blocked(self, cell, wall):
-    return wall[cell.i][cell.j] != 0
-
-
-  def create_path(self, start: PathCell, end: PathCell, wall) -> GPath:
-    if start == end:
-      return GPath(start, end, start)
-
-    next = end
-    cell = end.prev
-    while cell:
-      cell.next = next
-      # logging.info('link ({}, {}) to ({}, {})'.format(cell.i, cell.j, cell.next.i, cell.next.j))
-      if cell == start:
-        break
-      next = cell
-      cell = next.prev
-
-    if cell != start:
-      raise Exception('A contiguous path between start and end is expected')
+class PathGrid:
+  '''
+  Finds paths in a grid with breadth first search. Searches run on arrays that are allocated once and reused by every
+  search, so keep one PathGrid around instead of creating one per frame. PathCell objects are only created for the cells
+  of the path that is returned.
 
-    prev = start
-    cell = start.next
-    while cell:
-      # logging.info('create_path: {} {}'.format(cell.i, cell.j))
-      if not is_clean_path(start.pos, cell.pos, wall, self.csize):
-        return GPath(start, end, prev)
-      if cell == end:
-        return GPath(start, end, end)
-      prev = cell
-      cell = cell.next
-    #logging.info("{} {}".format(start.i, start.j))
-    #logging.info("{} {}".format(end.i, end.j))
-    #logging.info("{} {}".format(prev.i, prev.j))
-    raise Exception('A contiguous path between start and end is expected')
+  :param cell_size: Size in pixels of the cells of the grids searched.
+  '''
+  def __init__(self, cell_size: int):
+    self.csize = cell_size
+    self.shape: Tuple[int, int] = (0, 0)
+    self.mark = 0
+    # Visibility table of the level, used by create_path when it is the one of the grid searched.
+    self.visibility: Optional[VisibilityTable] = None
+
+
+  def search(self, start: Tuple[int, int], goal: NDArray[np.bool_], wall: NDArray) -> int:
+    '''
+    Searches from the start cell until one of the goal cells is found, through the cells that are free in wall.
+
+    returns: Flat index of the closest goal cell, or -1 if none can be reached. The parent and dist of the cells reached
+      stay available until the next search.
+    '''
+    wall = np.asarray(wall)
+    if wall.shape != self.shape:
+      self._alloc(wall.shape)
+    if self.mark == np.iinfo(np.int32).max:
+      self.stamp.fill(0)
+      self.mark = 0
+    self.mark += 1
+    return kernels.bfs(wall, start, goal, self.stamp, self.mark, self.parent, self.dist, self.queue)
+
+
+  def create_path(self, end: int, wall) -> GPath:
+    '''Builds the path from the start of the last search to the given flat index of a cell reached by it.'''
+    H = self.shape[1]
+    indices = [end]
+    while self.parent.flat[indices[-1]] != -1:
+      indices.append(int(self.parent.flat[indices[-1]]))
+    return path_from_cells([(k // H, k % H) for k in reversed(indices)], self.csize, wall, self.visibility)
 
 
   def get_closest_entity(self, startPos: Vec2, entities: List[Entity], wall: NDArray) -> Tuple[Optional[Entity], Optional[GPath]]:
-    for e in entities:
-      p = grid_pos(e.p, self.csize)
-      self.cell(p[0], p[1]).entities.append(e)
-
-    p = grid_pos(startPos, self.csize)
-    startCell = self.cell(p[0], p[1])
-    to_visit: List[PathCell] = [startCell]
-    while to_visit:
-      cell = to_visit.pop(0)
-      for e in cell.entities:
-        return e, self.create_path(startCell, cell, wall)
-
-      def visit_next(i, j):
-        next = self.cell(cell.i + i, cell.j + j)
-        if not next.visited and not self.is_blocked(next, wall):
-          self.add_to_visit(cell, next, to_visit)
-
-      visit_next(0, 1)
-      visit_next(0, -1)
-      visit_next(1, 0)
-      visit_next(-1, 0)
-
-    return None, None
\ No newline at end of file
+    wall = np.asarray(wall)
+    if wall.shape != self.shape:
+      self._alloc(wall.shape)
+    W, H = self.shape
+    cells = [grid_pos(e.p, self.csize) for e in entities]
+    for i, j in cells:
+      self.goal[i % W, j % H] = True
+    i, j = grid_pos(startPos, self.csize)
+    found = self.search((i % W, j % H), self.goal, wall)
+    self.goal.fill(False)
+    if found == -1:
+      return None, None
+    for e, (i, j) in zip(entities, cells):
+      if (i % W) * H + j % H == found:
+        return e, self.create_path(found, wall)
+    raise Exception(f'No entity in the cell found {found}')
+
+
+  def _alloc(self, shape: Tuple[int, int]):
+    self.shape = shape
+    self.stamp = np.zeros(shape, dtype=np.int32)
+    self.parent = np.zeros(shape, dtype=np.int32)
+    self.dist = np.zeros(shape, dtype=np.int32)
+    self.goal = np.zeros(shape, dtype=np.bool_)
+    self.queue = np.zeros(shape[0] * shape[1], dtype=np.int32)
+    self.mark = 0
+
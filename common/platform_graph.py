@@ -0,0 +1,454 @@
+import heapq
+import math
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from . import geometry
+
+# Moves of the edges of a PlatformGraph.
+MOVES = ('walk', 'fall', 'jump')
+
+# Frames an arc is followed before giving up on it landing anywhere.
+_MAX_ARC_FRAMES = 150
+
+
+class ArcherMotion:
+  '''
+  How the archer moves, in pixels and frames, with y pointing up.
+
+  The repo has no replays or move data to measure them from, so the defaults are estimates picked by hand. body_size is
+  the hitbox the game sends for archers. run_speed, gravity and max_fall are rough values for the archer of the game,
+  and jump_height and wall_jump_height are about two level cells, the highest step the archer climbs. The dash values
+  are rough guesses. measure_archer_motion estimates the first ones from recorded updates, such as the ones saved by
+  GameReplay, for routes that are tight.
+
+  :param body_size: Width and height of the hitbox.
+  :param run_speed: Horizontal speed running and in the air.
+  :param gravity: Downward acceleration in the air.
+  :param max_fall: Maximum downward speed.
+  :param jump_height: Height of the feet at the top of a jump from the floor.
+  :param wall_jump_height: Height gained by a jump from a wall.
+  :param dash_distance: Distance covered by a dash. 0 to leave dashes out.
+  :param dash_speed: Speed during a dash, which ignores gravity.
+  '''
+  def __init__(self,
+      body_size: Tuple[float, float] = (8, 14),
+      run_speed: float = 1.5,
+      gravity: float = 0.3,
+      max_fall: float = 2.8,
+      jump_height: float = 20,
+      wall_jump_height: float = 17,
+      dash_distance: float = 30,
+      dash_speed: float = 3):
+    self.body_size = body_size
+    self.run_speed = run_speed
+    self.gravity = gravity
+    self.max_fall = max_fall
+    self.jump_height = jump_height
+    self.wall_jump_height = wall_jump_height
+    self.dash_distance = dash_distance
+    self.dash_speed = dash_speed
+
+  @property
+  def jump_speed(self) -> float:
+    return float(np.sqrt(2 * self.gravity * self.jump_height))
+
+  @property
+  def wall_jump_speed(self) -> float:
+    return float(np.sqrt(2 * self.gravity * self.wall_jump_height))
+
+  @property
+  def dash_frames(self) -> int:
+    return int(round(self.dash_distance / self.dash_speed))
+
+  @property
+  def max_speed(self) -> float:
+    '''Upper bound of the distance moved in a frame.'''
+    return max(float(np.hypot(self.run_speed, max(self.jump_speed, self.wall_jump_speed, self.max_fall))),
+               self.dash_speed)
+
+  def key(self) -> Tuple[float, ...]:
+    return (*self.body_size, self.run_speed, self.gravity, self.max_fall, self.jump_height, self.wall_jump_height,
+            self.dash_distance, self.dash_speed)
+
+
+class PlatformGraph:
+  '''
+  Places where the archer can stand and how it gets from one to another, so that routes don't require flying like the
+  4-connected search of PathGrid.
+
+  Nodes are the cells of the level where the archer stands, with its feet at the bottom of the cell and centered in it.
+  Edges are walks to the next cell on the same floor, and arcs in the air until the first landing: falls from a ledge
+  and jumps, both with a few horizontal speeds, optionally with a jump from the first wall hit and a dash at the top of
+  the arc. The arcs of all nodes are followed frame by frame together. Each edge keeps the fastest move between the two
+  nodes, and its cost is the amount of frames it takes.
+
+  :param wall: Level grid indexed [i, j]. Non zero cells are blocked.
+  :param cell_size: Size in pixels of the cells of wall.
+  :param motion: How the archer moves.
+  '''
+  def __init__(self, wall: NDArray, cell_size: int = 10, motion: Optional[ArcherMotion] = None):
+    self.wall = np.asarray(wall) != 0
+    self.shape: Tuple[int, int] = self.wall.shape
+    self.cell_size = cell_size
+    self.motion = motion or ArcherMotion()
+    self.size = np.array(self.shape, dtype=np.float64) * cell_size
+    W, H = self.shape
+    i, j = np.meshgrid(np.arange(W), np.arange(H), indexing='ij')
+    feet = np.stack([(i.ravel() + 0.5) * cell_size, j.ravel() * cell_size], axis=1).astype(np.float64)
+    # Nodes are where the body fits and would collide one pixel lower.
+    self.standable: NDArray[np.bool_] = (~self._collides(feet) & self._collides(feet - [0, 1])).reshape(W, H)
+    self.nodes = np.flatnonzero(self.standable)
+    self._build_edges()
+    self._routes: Dict[Tuple[int, int], Optional[List[Tuple[Tuple[int, int], str]]]] = {}
+    self._reached: Dict[int, NDArray[np.bool_]] = {}
+    self._lists: Optional[Tuple[List[int], List[float], List[int]]] = None
+
+  def index(self, cell: Tuple[int, int]) -> int:
+    W, H = self.shape
+    return (cell[0] % W) * H + cell[1] % H
+
+  def cell(self, index: int) -> Tuple[int, int]:
+    return int(index) // self.shape[1], int(index) % self.shape[1]
+
+  def node_at(self, pos: ArrayLike) -> Optional[Tuple[int, int]]:
+    '''
+    Node where an archer at pos stands, or lands if it falls straight down. pos is the center of the body.
+
+    returns: Cell of the node, or None if it falls forever.
+    '''
+    W, H = self.shape
+    i = int(np.floor(pos[0] / self.cell_size)) % W
+    j = int(np.floor((pos[1] - self.motion.body_size[1] / 2) / self.cell_size + 0.5)) % H
+    for k in range(H):
+      if self.standable[i, (j - k) % H]:
+        return i, (j - k) % H
+      if k > 0 and self.wall[i, (j - k) % H]:
+        return None
+    return None
+
+  def neighbours(self, cell: Tuple[int, int]) -> List[Tuple[Tuple[int, int], float, str]]:
+    '''Nodes reached by one move from a node, with the frames and the move it takes.'''
+    k = self.index(cell)
+    a, b = self.indptr[k], self.indptr[k + 1]
+    return [(self.cell(t), float(c), MOVES[m]) for t, c, m in zip(self.targets[a:b], self.costs[a:b], self.moves[a:b])]
+
+  def route(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[Tuple[int, int], str]]]:
+    '''
+    Fastest sequence of moves from a node to another, found with A* and kept for later calls with the same nodes.
+
+    returns: Nodes of the route, starting at start, each with the move that reaches it ('' for start), or None if goal
+      can't be reached.
+    '''
+    s = self.index(start)
+    g = self.index(goal)
+    key = (s, g)
+    if key not in self._routes:
+      self._routes[key] = self._search(s, g)
+    return self._routes[key]
+
+  def route_cost(self, route: List[Tuple[Tuple[int, int], str]]) -> float:
+    '''Frames a route returned by route takes.'''
+    cost = 0.0
+    for (prev, _), (cell, move) in zip(route[:-1], route[1:]):
+      cost += min(c for n, c, m in self.neighbours(prev) if n == cell and m == move)
+    return cost
+
+  def reachable(self, start: Tuple[int, int]) -> NDArray[np.bool_]:
+    '''Nodes that can be reached from a node, with the shape of the grid. Kept for later calls with the same node.'''
+    k = self.index(start)
+    if k not in self._reached:
+      self._reached[k] = self._flood(k)
+    return self._reached[k]
+
+  def _flood(self, k: int) -> NDArray[np.bool_]:
+    reached = np.zeros(self.wall.size, dtype=np.bool_)
+    if not self.standable.flat[k]:
+      return reached.reshape(self.shape)
+    targets = self._edge_lists()[0]
+    indptr = self.indptr.tolist()
+    seen = {k}
+    stack = [k]
+    while stack:
+      k = stack.pop()
+      for t in targets[indptr[k]:indptr[k + 1]]:
+        if t not in seen:
+          seen.add(t)
+          stack.append(t)
+    reached[list(seen)] = True
+    return reached.reshape(self.shape)
+
+  def can_reach(self, start: ArrayLike, pos: ArrayLike) -> bool:
+    '''
+    Whether an archer with the body centered at start can get it centered at pos: the node under pos can be reached
+    from the node under start, and pos is within a jump from it.
+    '''
+    s = self.node_at(start)
+    g = self.node_at(pos)
+    if s is None or g is None or not self.reachable(s)[g]:
+      return False
+    feet = pos[1] - self.motion.body_size[1] / 2
+    return (feet - g[1] * self.cell_size) % self.size[1] <= self.motion.jump_height
+
+  def _search(self, s: int, g: int) -> Optional[List[Tuple[Tuple[int, int], str]]]:
+    if not (self.standable.flat[s] and self.standable.flat[g]):
+      return None
+    H = self.shape[1]
+    c = self.cell_size
+    W_px, H_px = float(self.size[0]), float(self.size[1])
+    gx, gy = (g // H + 0.5) * c, (g % H) * c
+    inv_speed = 1 / self.motion.max_speed
+
+    def heuristic(k: int) -> float:
+      dx = abs((k // H + 0.5) * c - gx) % W_px
+      dy = abs((k % H) * c - gy) % H_px
+      return math.hypot(min(dx, W_px - dx), min(dy, H_px - dy)) * inv_speed
+
+    # Python lists are faster to go through one at a time than arrays.
+    targets, costs, moves = self._edge_lists()
+    best = {s: 0.0}
+    came: Dict[int, Tuple[int, int]] = {}
+    heap = [(heuristic(s), 0.0, s)]
+    while heap:
+      _, cost, k = heapq.heappop(heap)
+      if k == g:
+        route = [(self.cell(k), '')]
+        while k != s:
+          k, m = came[k]
+          route[-1] = (route[-1][0], MOVES[m])
+          route.append((self.cell(k), ''))
+        return route[::-1]
+      if cost > best[k]:
+        continue
+      a, b = self.indptr[k], self.indptr[k + 1]
+      for t, e, m in zip(targets[a:b], costs[a:b], moves[a:b]):
+        new = cost + e
+        if new < best.get(t, np.inf):
+          best[t] = new
+          came[t] = (k, m)
+          heapq.heappush(heap, (new + heuristic(t), new, t))
+    return None
+
+  def _edge_lists(self) -> Tuple[List[int], List[float], List[int]]:
+    if self._lists is None:
+      self._lists = (self.targets.tolist(), self.costs.tolist(), self.moves.tolist())
+    return self._lists
+
+  def _build_edges(self):
+    '''Finds the edges of all nodes and stores them sorted by source, like a CSR matrix.'''
+    c = self.cell_size
+    H = self.shape[1]
+    nodes = self.nodes
+    feet = np.stack([(nodes // H + 0.5) * c, (nodes % H) * c], axis=1).astype(np.float64)
+    src, dst, cost, move = [], [], [], []
+
+    # Walks to the next cell on the same floor.
+    for di in (-1, 1):
+      to = ((nodes // H + di) % self.shape[0]) * H + nodes % H
+      ok = self.standable.flat[to] & ~self._collides(feet + [di * c / 2, 0])
+      src.append(nodes[ok])
+      dst.append(to[ok])
+      cost.append(np.full(ok.sum(), c / self.motion.run_speed))
+      move.append(np.full(ok.sum(), MOVES.index('walk')))
+
+    # Arcs: jumps from the node and falls from the edge of the floor next to it.
+    run = self.motion.run_speed
+    arcs = []
+    for vx in (-run, -run / 2, 0, run / 2, run):
+      arcs.append((0, vx, self.motion.jump_speed, 'jump'))
+      if vx != 0:
+        arcs.append((np.sign(vx), vx, 0, 'fall'))
+    starts, v0, kinds, wall_jump, dash, walked = [], [], [], [], [], []
+    for side, vx, vy, kind in arcs:
+      dirs = [(0, 1)] if vx == 0 else [(0, 1), (np.sign(vx), 0), (np.sign(vx), 1)]
+      for d in [(0, 0)] + (dirs if self.motion.dash_distance > 0 else []):
+        for wj in ([False, True] if vx != 0 else [False]):
+          p = feet + [side * c, 0]
+          ok = np.ones(len(nodes), dtype=np.bool_)
+          if kind == 'fall':
+            # Only off the edge of the floor, into free air.
+            ok = ~self._collides(p) & ~self._collides(p - [0, 1]) & ~self._collides(feet + [side * c / 2, 0])
+          starts.append(np.flatnonzero(ok))
+          v0.append((vx, vy))
+          kinds.append(MOVES.index(kind))
+          wall_jump.append(wj)
+          dash.append(d)
+          walked.append(c / run if kind == 'fall' else 0)
+    count = [len(s) for s in starts]
+    rows = np.concatenate(starts)
+    side = np.repeat([float(np.sign(v[0])) if k == MOVES.index('fall') else 0 for v, k in zip(v0, kinds)], count)
+    landed, frames = self._follow_arcs(
+      feet[rows] + np.stack([side * c, np.zeros(len(rows))], axis=1),
+      np.repeat(np.array(v0, dtype=np.float64), count, axis=0),
+      np.repeat(wall_jump, count),
+      np.repeat(np.array(dash, dtype=np.float64), count, axis=0))
+    ok = (landed >= 0) & (landed != nodes[rows])
+    src.append(nodes[rows][ok])
+    dst.append(landed[ok])
+    cost.append((frames + np.repeat(walked, count))[ok])
+    move.append(np.repeat(kinds, count)[ok])
+
+    src, dst, cost, move = (np.concatenate(a) for a in (src, dst, cost, move))
+    # Keeps the cheapest edge between each pair of nodes.
+    order = np.lexsort((cost, dst, src))
+    src, dst, cost, move = src[order], dst[order], cost[order], move[order]
+    first = np.ones(len(src), dtype=np.bool_)
+    first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    self.targets = dst[first]
+    self.costs = cost[first].astype(np.float32)
+    self.moves = move[first].astype(np.int8)
+    self.indptr = np.searchsorted(src[first], np.arange(self.wall.size + 1))
+
+  def _follow_arcs(self, p: NDArray, v0: NDArray, wall_jump: NDArray, dash: NDArray) -> Tuple[NDArray, NDArray]:
+    '''
+    Moves many archers in the air frame by frame until they land. Horizontal and vertical moves are done one after the
+    other, so hitting a wall stops only the horizontal speed, or turns it into a jump away from the wall once if
+    wall_jump is set. Archers with a dash direction dash once the arc starts going down.
+
+    returns: Node where each one lands or -1, and the frames it took.
+    '''
+    m = self.motion
+    c = self.cell_size
+    H = self.shape[1]
+    n = len(p)
+    p = p.copy()
+    v = v0.copy()
+    wall_jump = wall_jump.copy()
+    dash_dir = dash / np.maximum(np.hypot(dash[:, 0], dash[:, 1]), 1e-9)[:, None]
+    can_dash = dash.any(axis=1)
+    dash_left = np.zeros(n, dtype=np.int64)
+    landed = np.full(n, -1, dtype=np.int64)
+    frames = np.zeros(n)
+    active = np.arange(n)
+    for frame in range(1, _MAX_ARC_FRAMES + 1):
+      if len(active) == 0:
+        break
+      start = can_dash[active] & (v[active, 1] <= 0)
+      dash_left[active[start]] = m.dash_frames
+      can_dash[active[start]] = False
+      dashing = dash_left[active] > 0
+      a = active[dashing]
+      v[a] = dash_dir[a] * m.dash_speed
+      dash_left[a] -= 1
+      # After a dash the arc goes on with the speeds of before, from the top.
+      done = a[dash_left[a] == 0]
+      v[done] = np.stack([v0[done, 0], np.zeros(len(done))], axis=1)
+      a = active[~dashing]
+      v[a, 1] = np.maximum(v[a, 1] - m.gravity, -m.max_fall)
+
+      x = p[active] + np.stack([v[active, 0], np.zeros(len(active))], axis=1)
+      hit = self._collides(x)
+      p[active[~hit]] = x[~hit]
+      h = active[hit]
+      jumps = h[wall_jump[h]]
+      v[jumps] = np.stack([-np.sign(v[jumps, 0]) * m.run_speed, np.full(len(jumps), m.wall_jump_speed)], axis=1)
+      v0[jumps, 0] = v[jumps, 0]
+      wall_jump[jumps] = False
+      v[h[~wall_jump[h] & ~np.isin(h, jumps)], 0] = 0
+
+      y = p[active] + np.stack([np.zeros(len(active)), v[active, 1]], axis=1)
+      hit = self._collides(y)
+      p[active[~hit]] = y[~hit]
+      down = hit & (v[active, 1] < 0)
+      v[active[hit & ~down], 1] = 0
+      # Landing puts the feet on top of the cell hit.
+      land = active[down]
+      p[land, 1] = (np.floor(y[down, 1] / c) + 1) * c
+      i = np.floor(p[land, 0] / c).astype(np.int64) % self.shape[0]
+      j = np.round(p[land, 1] / c).astype(np.int64) % H
+      node = i * H + j
+      landed[land] = np.where(self.standable.flat[node], node, -1)
+      frames[land] = frame
+      active = active[~down]
+      p[active] %= self.size
+    return landed, frames
+
+  def _collides(self, feet: NDArray) -> NDArray[np.bool_]:
+    '''Whether the body with the feet at the center of its bottom edge overlaps a blocked cell.'''
+    c = self.cell_size
+    W, H = self.shape
+    w, h = self.motion.body_size
+    eps = 1e-6
+    i0 = np.floor((feet[:, 0] - w / 2) / c).astype(np.int64) % W
+    i1 = np.floor((feet[:, 0] + w / 2 - eps) / c).astype(np.int64) % W
+    j0 = np.floor(feet[:, 1] / c).astype(np.int64)
+    j1 = np.floor((feet[:, 1] + h - eps) / c).astype(np.int64)
+    hit = np.zeros(len(feet), dtype=np.bool_)
+    for j in (j0, (j0 + j1) // 2, j1):
+      hit |= self.wall[i0, j % H] | self.wall[i1, j % H]
+    return hit
+
+
+def measure_archer_motion(
+    updates: Sequence[Mapping[str, Any]],
+    player_index: int = 0,
+    base: Optional[ArcherMotion] = None) -> ArcherMotion:
+  '''
+  Estimates how the archer moves from its positions in consecutive update messages, like the ones saved by GameReplay.
+  Speeds are taken from the displacement between frames, in the same order the arcs of PlatformGraph are followed:
+  gravity is applied before moving, so a jump moves jump_speed - gravity in its first frame.
+
+  body_size, run_speed, gravity, max_fall and jump_height are measured. The rest, and any value the updates don't show,
+  like jump_height without jumps, are kept from base.
+
+  :param updates: Update messages of consecutive frames.
+  :param player_index: Player index of the archer measured.
+  :param base: Motion the values not measured are taken from. Defaults to the default ArcherMotion.
+  '''
+  base = base or ArcherMotion()
+  states: List[Optional[Mapping[str, Any]]] = []
+  for update in updates:
+    archers = [e for e in update.get('entities', [])
+               if e.get('type') == 'archer' and e.get('playerIndex') == player_index]
+    states.append(archers[0] if archers else None)
+
+  steps = []
+  for a, b in zip(states[:-1], states[1:]):
+    if a is None or b is None or 'dodging' in (a.get('state'), b.get('state')):
+      steps.append(None)
+      continue
+    d = geometry.displacement((a['pos']['x'], a['pos']['y']), (b['pos']['x'], b['pos']['y']))
+    steps.append((float(d[0]), float(d[1]), bool(a.get('onGround')), bool(b.get('onGround')),
+                  bool(a.get('onWall') or b.get('onWall'))))
+
+  run = [abs(s[0]) for s in steps if s and s[2] and s[3]]
+  falls = [-s[1] for s in steps if s and not s[3] and not s[4]]
+  pull = [s[1] - t[1] for s, t in zip(steps[:-1], steps[1:])
+          if s and t and not s[3] and not t[3] and not s[4] and not t[4]]
+  # Frames where the fall is already at its maximum speed don't show gravity.
+  pull = [a for a in pull if a > 1e-3]
+  takeoffs = [s[1] for s in steps if s and s[2] and not s[3] and not s[4] and s[1] > 0]
+
+  gravity = float(np.median(pull)) if pull else base.gravity
+  jump_height = base.jump_height
+  if takeoffs:
+    jump_speed = max(takeoffs) + gravity
+    jump_height = jump_speed**2 / (2 * gravity)
+  size = next((s['size'] for s in states if s is not None and 'size' in s), None)
+  return ArcherMotion(
+    body_size=(float(size['x']), float(size['y'])) if size else base.body_size,
+    run_speed=max(run) if run else base.run_speed,
+    gravity=gravity,
+    max_fall=max(falls) if falls else base.max_fall,
+    jump_height=jump_height,
+    wall_jump_height=base.wall_jump_height,
+    dash_distance=base.dash_distance,
+    dash_speed=base.dash_speed)
+
+
+# Graphs created by level_platform_graph, shared by everything in the process that navigates the same level.
+_graph_cache: Dict[Tuple, PlatformGraph] = {}
+
+
+def level_platform_graph(wall: NDArray, cell_size: int = 10, motion: Optional[ArcherMotion] = None) -> PlatformGraph:
+  '''Gets the platform graph of a level, building it only the first time the level is seen in the process.'''
+  wall = np.asarray(wall, dtype=np.int8)
+  motion = motion or ArcherMotion()
+  key = (wall.tobytes(), wall.shape, cell_size, motion.key())
+  graph = _graph_cache.get(key)
+  if graph is None:
+    graph = _graph_cache[key] = PlatformGraph(wall, cell_size, motion)
+  return graph
@@ -0,0 +1,132 @@
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from . import geometry
+from .raycast import cast_rays
+
+
+def pool_grid(grid: NDArray, full: bool = False) -> NDArray[np.int8]:
+  '''
+  Pools blocks of 2x2 cells into one cell. The grid must have even sizes.
+
+  :param full: When False a block is occupied if any of its cells is, otherwise only if all of them are.
+  '''
+  W, H = grid.shape
+  blocks = grid.reshape(W // 2, 2, H // 2, 2) != 0
+  pooled = blocks.all(axis=(1, 3)) if full else blocks.any(axis=(1, 3))
+  return pooled.astype(np.int8)
+
+
+class OccupancyPyramid:
+  '''
+  Coarser versions of an occupancy grid, where each level halves the resolution of the previous one. For every level
+  there is a grid where a block is occupied if any of its cells is, and one where it is only if all of them are.
+  Queries over large areas are answered on the coarse levels where the blocks are all empty or all full, and only the
+  rest go down to finer levels.
+
+  Levels stop when a size of the grid is odd, so that every level still wraps around the arena exactly.
+
+  There is no region query: GridView.is_region_collision already answers it in constant time from a summed area table
+  of the grid, which going down the levels can't beat.
+
+  :param grid: Occupancy grid indexed [i, j] for the cell at (x, y). It is level 0 and is not copied.
+  :param cell_size: Size in pixels of the cells of grid.
+  :param max_levels: Maximum amount of levels, including level 0.
+  '''
+  def __init__(self, grid: NDArray, cell_size: int, max_levels: int = 5):
+    self.cell_size = cell_size
+    self.any_levels: List[NDArray] = [grid]
+    self.full_levels: List[NDArray] = [grid]
+    while len(self.any_levels) < max_levels and all(s % 2 == 0 and s >= 2 for s in self.any_levels[-1].shape):
+      self.any_levels.append(pool_grid(self.any_levels[-1]))
+      self.full_levels.append(pool_grid(self.full_levels[-1], full=True))
+
+  def __len__(self):
+    return len(self.any_levels)
+
+  def level_cell_size(self, level: int) -> int:
+    return self.cell_size * 2**level
+
+  def line_of_sight(
+      self,
+      p1: ArrayLike,
+      p2: ArrayLike,
+      wrap_around: bool = True,
+      level: Optional[int] = None) -> Union[bool, NDArray[np.bool_]]:
+    '''
+    Same as raycast.line_of_sight over level 0, answered first on a coarse level. Segments that only cross empty blocks
+    are clear and the ones that cross a full block are not. The others are only cast on level 0 from just before the
+    first block that is not empty, which is usually a small part of a long segment.
+
+    :param level: Coarse level used. Defaults to the coarsest one.
+    '''
+    level = len(self) - 1 if level is None else level
+    p1, p2 = np.broadcast_arrays(np.asarray(p1, dtype=np.float64), np.asarray(p2, dtype=np.float64))
+    grid = self.any_levels[0]
+    c = self.cell_size
+    size: Tuple[int, int] = (grid.shape[0] * c, grid.shape[1] * c)
+    o = p1.reshape(-1, 2)
+    d = geometry.displacement(p1, p2, wrap_around, size).reshape(-1, 2)
+    length = np.sqrt((d**2).sum(axis=1))
+    # Segments of length 0 are only their start cell.
+    start_free = grid[np.floor_divide(o[:, 0], c).astype(np.int64) % grid.shape[0],
+                      np.floor_divide(o[:, 1], c).astype(np.int64) % grid.shape[1]] == 0
+    clear = start_free & (length == 0)
+    todo = np.flatnonzero(length > 0)
+    if level > 0 and len(todo):
+      coarse = self.level_cell_size(level)
+      t_any = cast_rays(self.any_levels[level], coarse, o[todo], d[todo], length[todo])
+      clear[todo[t_any >= length[todo]]] = True
+      t_full = cast_rays(self.full_levels[level], coarse, o[todo], d[todo], length[todo])
+      keep = (t_any < length[todo]) & (t_full >= length[todo])
+      todo, t_any = todo[keep], t_any[keep]
+      # Every cell before t_any is free, so the fine cast can start a cell before it.
+      t0 = np.maximum(t_any - c, 0)
+    else:
+      t0 = np.zeros(len(todo))
+    if len(todo):
+      u = d[todo] / length[todo, None]
+      rest = length[todo] - t0
+      clear[todo] = (cast_rays(grid, c, o[todo] + u * t0[:, None], u, rest) >= rest) & start_free[todo]
+    if p2.ndim == 1:
+      return bool(clear[0])
+    return clear.reshape(p2.shape[:-1])
+
+  def nearest_free_cell(self, pos: ArrayLike) -> Optional[Tuple[int, int]]:
+    '''
+    Finds the free cell of level 0 with the center nearest to pos, measured around the edges of the arena.
+    Only the blocks of the coarsest level that can hold a nearer free cell than the farthest point of some block with a
+    free cell are searched cell by cell.
+
+    returns: Indices (i, j) of the cell, or None if all cells are occupied.
+    '''
+    level = len(self) - 1
+    bi, bj = np.nonzero(self.full_levels[level] == 0)
+    if len(bi) == 0:
+      return None
+    c = self.cell_size
+    block = self.level_cell_size(level)
+    size = np.multiply(self.any_levels[0].shape, c)
+    p = np.asarray(pos, dtype=np.float64)
+    # Per axis distance from pos to the block center, and how far from it the cell centers of the block go.
+    d = np.abs(self._wrap(np.stack([bi, bj], axis=1) * block + block / 2 - p, size))
+    extent = (block - c) / 2
+    lower = np.hypot(*np.maximum(d - extent, 0).T)
+    upper = np.hypot(*np.minimum(d + extent, size / 2).T)
+    near = lower <= upper.min()
+
+    f = 2**level
+    k = np.arange(f * f)
+    i = (bi[near, None] * f + k // f).ravel()
+    j = (bj[near, None] * f + k % f).ravel()
+    free = self.any_levels[0][i, j] == 0
+    i, j = i[free], j[free]
+    dist = np.hypot(*self._wrap(np.stack([i, j], axis=1) * c + c / 2 - p, size).T)
+    best = np.argmin(dist)
+    return int(i[best]), int(j[best])
+
+  @staticmethod
+  def _wrap(d: NDArray, size: NDArray) -> NDArray:
+    return (d + size / 2) % size - size / 2
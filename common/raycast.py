@@ -0,0 +1,108 @@
+from typing import Tuple, Union
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from . import geometry, kernels
+
+# Crossings closer than this fraction of a cell are the ray going through a corner.
+_CORNER_EPS = 1e-9
+
+
+def cast_rays(grid: NDArray, cell_size: float, origins: ArrayLike, directions: ArrayLike, max_dist: ArrayLike) -> NDArray:
+  '''
+  Casts rays against the occupied cells of a grid that wraps around the arena, visiting every cell each ray goes
+  through like a DDA (Amanatides-Woo) traversal, for all rays at once. When a ray goes exactly through a corner both
+  cells beside it are checked too (supercover), so it can't slip between two diagonal walls.
+
+  Instead of stepping cell by cell, the crossings of each ray with the vertical and horizontal cell boundaries up to
+  max_dist are computed in closed form and merged by sorting, which gives the sequence of cells it visits.
+
+  :param grid: Occupancy grid indexed [i, j] for the cell at (x, y). Non zero cells block rays.
+  :param cell_size: Size in pixels of each cell.
+  :param origins: Origins of the rays with shape (N, 2), or (2,) to share one origin.
+  :param directions: Directions of the rays with shape (N, 2). They don't need to be normalized.
+  :param max_dist: Rays stop at this distance. Either one for all rays or one per ray with shape (N,).
+  returns: Distance from the origin to the first occupied cell of each ray with shape (N,), or max_dist if there is
+    none in range. Rays starting in an occupied cell have distance 0.
+  '''
+  d = np.asarray(directions, dtype=np.float64).reshape(-1, 2)
+  o = np.broadcast_to(np.asarray(origins, dtype=np.float64), d.shape)
+  max_dist = np.broadcast_to(np.asarray(max_dist, dtype=np.float64), len(d))
+  n_rays = len(d)
+  m, n = grid.shape
+  blocked = grid.ravel() != 0
+  length = np.sqrt((d**2).sum(axis=1, keepdims=True))
+  d = d / np.where(length == 0, 1, length)
+  kernel = kernels.compiled(kernels.cast_rays_kernel)
+  if kernel is not None:
+    dist = np.empty(n_rays)
+    kernel(grid, cell_size, np.ascontiguousarray(o), d, np.ascontiguousarray(max_dist), _CORNER_EPS, dist)
+    return dist
+
+  cell = np.floor_divide(o, cell_size).astype(np.int64)
+  step = np.sign(d).astype(np.int64)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    # Distance along the ray between consecutive boundaries, and to the first one.
+    t_delta = cell_size / np.abs(d)
+    t_first = np.where(step > 0, (cell + 1) * cell_size - o, o - cell * cell_size) * (1 / np.abs(d))
+  t_first[step == 0] = np.inf
+  t_delta[step == 0] = 0
+
+  # Crossings are at least cell_size apart, so k crossings per axis reach further than max_dist.
+  k = int(max_dist.max(initial=0) // cell_size) + 2
+  t = np.concatenate([
+    t_first[:, 0:1] + np.arange(k) * t_delta[:, 0:1],
+    t_first[:, 1:2] + np.arange(k) * t_delta[:, 1:2]], axis=1)
+  order = np.argsort(t, axis=1, kind='stable')
+  t = np.take_along_axis(t, order, axis=1)
+  crosses_x = order < k
+  i = cell[:, 0:1] + np.cumsum(crosses_x * step[:, 0:1], axis=1)
+  j = cell[:, 1:2] + np.cumsum(~crosses_x * step[:, 1:2], axis=1)
+  hit = blocked[(i % m) * n + j % n]
+  # On a corner the x crossing is sorted first, so the cell that is skipped is the one only stepped in y.
+  with np.errstate(invalid='ignore'):
+    corner = (t[:, 1:] - t[:, :-1] < _CORNER_EPS * cell_size) & crosses_x[:, :-1] & ~crosses_x[:, 1:]
+  hit[:, 1:] |= corner & blocked[((i[:, 1:] - step[:, 0:1]) % m) * n + j[:, 1:] % n]
+  hit &= t < max_dist[:, None]
+
+  first = np.argmax(hit, axis=1)
+  rows = np.arange(n_rays)
+  dist = np.where(hit[rows, first], t[rows, first], max_dist)
+  dist[blocked[(cell[:, 0] % m) * n + cell[:, 1] % n]] = 0
+  return dist
+
+
+def ray_directions(n_rays: int, offset: float = 0) -> NDArray:
+  '''Unit vectors for n_rays evenly spaced angles starting at offset radians, with shape (n_rays, 2).'''
+  angles = offset + np.arange(n_rays) * (2 * np.pi / n_rays)
+  return np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+
+def line_of_sight(
+    grid: NDArray,
+    cell_size: float,
+    p1: ArrayLike,
+    p2: ArrayLike,
+    wrap_around: bool = True) -> Union[bool, NDArray[np.bool_]]:
+  '''
+  Checks whether the segments from p1 to p2 go only through free cells of the grid, including the cells of both ends.
+
+  :param p1: Start of the segments with shape (N, 2), or (2,) for a single one.
+  :param p2: End of the segments, with the same shape as p1 or broadcastable to it.
+  :param wrap_around: When True the segments take the shortest way around the edges of the arena.
+  returns: Whether each segment is clear with shape (N,), or a bool for a single segment.
+  '''
+  p1, p2 = np.broadcast_arrays(np.asarray(p1, dtype=np.float64), np.asarray(p2, dtype=np.float64))
+  size: Tuple[int, int] = (grid.shape[0] * cell_size, grid.shape[1] * cell_size)
+  d = geometry.displacement(p1, p2, wrap_around, size).reshape(-1, 2)
+  length = np.sqrt((d**2).sum(axis=1))
+  p1 = p1.reshape(-1, 2)
+  clear = cast_rays(grid, cell_size, p1, d, length) >= length
+  # Segments of length 0 are only their start cell, which cast_rays can't tell apart from a hit at distance 0.
+  i = np.floor_divide(p1[:, 0], cell_size).astype(np.int64) % grid.shape[0]
+  j = np.floor_divide(p1[:, 1], cell_size).astype(np.int64) % grid.shape[1]
+  clear &= grid[i, j] == 0
+  if p2.ndim == 1:
+    return bool(clear[0])
+  return clear.reshape(p2.shape[:-1])
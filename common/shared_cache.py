@@ -0,0 +1,179 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Every block starts with a header holding the dtype and shape of the array, written after the data. The first byte is
+# set last, so a block that is still being filled is never read.
+_HEADER_SIZE = 128
+_READY = 1
+# Seconds that publish waits for a block that another process created first to be filled, and between checks.
+_WAIT_TIMEOUT = 1.0
+_WAIT_STEP = 0.001
+# Before python 3.13 attaching also registers the block with the resource tracker, which unlinks it when the processes
+# sharing the tracker exit. Workers created with multiprocessing share the tracker of their parent, so that is only an
+# issue for unrelated processes.
+_ATTACH_KWARGS = dict(track=False) if 'track' in inspect.signature(shared_memory.SharedMemory).parameters else {}
+
+
+class _Block(shared_memory.SharedMemory):
+  '''
+  Shared memory block that can be closed while arrays point to it. Then only its file descriptor is closed, and the
+  mapping is released by the arrays when they are gone, instead of failing to close.
+  '''
+  def close(self):
+    try:
+      super().close()
+    except BufferError:
+      fd = getattr(self, '_fd', -1)
+      if fd >= 0:
+        os.close(fd)
+        self._fd = -1
+
+  def __del__(self):
+    self.close()
+
+
+def level_key(grid10: NDArray, *params) -> str:
+  '''Short name for a level and the parameters used to derive arrays from it.'''
+  h = hashlib.sha1(grid10.tobytes())
+  h.update(repr((grid10.shape, str(grid10.dtype)) + params).encode())
+  return h.hexdigest()[:12]
+
+
+class SharedLevelCache:
+  '''
+  Publishes arrays derived from a level into shared memory blocks, so env worker processes compute them once and every
+  other process attaches to them by name instead of holding its own copy. Arrays obtained from the cache are read-only.
+
+  The process that creates a block owns it and unlinks it in unlink(). Blocks stay usable by the processes that
+  attached to them, but new ones won't find them and compute the arrays again. To share across a whole training run,
+  publish from the main process before starting the workers.
+
+  Blocks that another process is still filling are not read: get returns None for them, and publish waits for them to
+  be filled.
+
+  :param prefix: Prefix of the names of the blocks, to tell apart caches of different runs.
+  '''
+  def __init__(self, prefix: str = 'towerfall'):
+    self.prefix = prefix
+    self._blocks: Dict[str, _Block] = {}
+    self._owned: Dict[str, _Block] = {}
+
+  def block_name(self, name: str) -> str:
+    return f'{self.prefix}_{name}'
+
+  def get(self, name: str) -> Optional[NDArray]:
+    '''Attaches to the array published with the given name, or returns None if there is none yet or it is being filled.'''
+    block = self._blocks.get(name)
+    if block is None:
+      block = self._attach(name)
+      if block is None:
+        return None
+      self._blocks[name] = block
+    return self._as_array(block)
+
+  def publish(self, name: str, array: NDArray) -> NDArray:
+    '''
+    Copies the array into a new block with the given name.
+
+    returns: The read-only array in shared memory. If another process published the name first, its array.
+    '''
+    array = np.ascontiguousarray(array)
+    header = json.dumps(dict(dtype=array.dtype.str, shape=array.shape)).encode()
+    # The header goes after the ready flag and needs a trailing \0 to be found by _as_array.
+    if len(header) >= _HEADER_SIZE - 1:
+      raise Exception(f'Array shape too long to share: {array.shape}')
+    try:
+      block = _Block(name=self.block_name(name), create=True, size=_HEADER_SIZE + max(array.nbytes, 1))
+    except FileExistsError:
+      # Another process is publishing it. Its array is used once filled, or this one if that takes too long.
+      deadline = time.monotonic() + _WAIT_TIMEOUT
+      shared = self.get(name)
+      while shared is None and time.monotonic() < deadline:
+        time.sleep(_WAIT_STEP)
+        shared = self.get(name)
+      if shared is None:
+        logging.warning(f'Block {self.block_name(name)} was not filled in time, using a copy')
+        return self._read_only(array)
+      return shared
+    block.buf[1:1 + len(header)] = header
+    np.frombuffer(block.buf, array.dtype, array.size, _HEADER_SIZE).reshape(array.shape)[...] = array
+    block.buf[0] = _READY
+    self._blocks[name] = block
+    self._owned[name] = block
+    return self._as_array(block)
+
+  def get_or_create(self, name: str, create: Callable[[], NDArray]) -> NDArray:
+    '''Gets the array with the given name, computing and publishing it if no process did yet.'''
+    array = self.get(name)
+    if array is None:
+      logging.info(f'Publishing {self.block_name(name)}')
+      array = self.publish(name, create())
+    return array
+
+  def close(self):
+    '''Detaches from all blocks. Blocks with arrays still in use stay mapped until the arrays are gone.'''
+    for block in self._blocks.values():
+      block.close()
+    self._blocks.clear()
+
+  def unlink(self):
+    '''Detaches and destroys the blocks created by this process.'''
+    owned = list(self._owned.values())
+    self.close()
+    for block in owned:
+      block.unlink()
+    self._owned.clear()
+
+  def _attach(self, name: str) -> Optional[_Block]:
+    '''Attaches to a block, or returns None if there is none or it is not filled yet.'''
+    try:
+      block = _Block(name=self.block_name(name), **_ATTACH_KWARGS)
+    except FileNotFoundError:
+      return None
+    except ValueError:
+      # Created but not sized yet, so there is nothing to map.
+      return None
+    if block.size < _HEADER_SIZE or block.buf[0] != _READY or self._header(block) is None:
+      block.close()
+      return None
+    return block
+
+  @staticmethod
+  def _header(block: _Block) -> Optional[Tuple[np.dtype, Tuple[int, ...]]]:
+    '''Type and shape of the array of a block, or None if the header is not valid or doesn't fit the block.'''
+    raw = bytes(block.buf[1:_HEADER_SIZE])
+    end = raw.find(b'\0')
+    if end < 0:
+      return None
+    try:
+      header = json.loads(raw[:end])
+      dtype = np.dtype(header['dtype'])
+      shape = tuple(int(k) for k in header['shape'])
+    except (ValueError, KeyError, TypeError):
+      return None
+    if _HEADER_SIZE + dtype.itemsize * int(np.prod(shape, dtype=np.int64)) > block.size:
+      return None
+    return dtype, shape
+
+  def _as_array(self, block: _Block) -> NDArray:
+    header = self._header(block)
+    assert header is not None
+    dtype, shape = header
+    # frombuffer keeps the buffer exported while the array lives, so the block can't be unmapped under it.
+    array = np.frombuffer(block.buf, dtype, int(np.prod(shape, dtype=np.int64)), _HEADER_SIZE).reshape(shape)
+    return self._read_only(array)
+
+  @staticmethod
+  def _read_only(array: NDArray) -> NDArray:
+    array = array.view()
+    array.flags.writeable = False
+    return array
@@ -0,0 +1,135 @@
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from . import geometry
+from .constants import HEIGHT, WIDTH
+
+# Below this amount of points a query just checks all of them, which is cheaper than gathering buckets.
+_BRUTE_FORCE_MAX = 256
+
+
+class SpatialHash:
+  '''
+  Uniform grid over the arena that buckets points by cell to answer neighbour queries without scanning every point.
+  The arena wraps in both axes, so cells, boxes and distances all wrap around the edges.
+  Points are stored sorted by cell, so rebuilding it every frame is a single sort over the position array.
+
+  :param cell_size: Size in pixels of each bucket. Must divide the arena size.
+  :param width: Width of the arena.
+  :param height: Height of the arena.
+  '''
+  def __init__(self, cell_size: int = 20, width: int = WIDTH, height: int = HEIGHT):
+    if width % cell_size != 0 or height % cell_size != 0:
+      raise Exception(f'cell_size {cell_size} must divide the arena size {width}x{height}')
+    self.cs = cell_size
+    self.width = width
+    self.height = height
+    self.m = width // cell_size
+    self.n = height // cell_size
+    self.build(np.zeros((0, 2), dtype=np.float32))
+
+  def build(self, positions: NDArray):
+    '''
+    Rebuilds the buckets from an array of positions with shape (N, 2). Query results index into this array.
+    '''
+    self.positions = geometry.wrap_positions(np.asarray(positions, dtype=np.float64).reshape(-1, 2), (self.width, self.height))
+    i = (self.positions[:, 0] // self.cs).astype(np.int64) % self.m
+    j = (self.positions[:, 1] // self.cs).astype(np.int64) % self.n
+    cells = i * self.n + j
+    self.order = np.argsort(cells, kind='stable')
+    self.starts = np.searchsorted(cells[self.order], np.arange(self.m * self.n + 1))
+
+  def __len__(self):
+    return len(self.positions)
+
+  def displacement(self, p: Tuple[float, float], idx: NDArray) -> NDArray:
+    '''Shortest wrap-aware displacement from p to the points in idx.'''
+    return geometry.displacement(p, self.positions[idx], size=(self.width, self.height))
+
+  def distance(self, p: Tuple[float, float], idx: NDArray) -> NDArray:
+    '''Shortest wrap-aware distance from p to the points in idx.'''
+    return geometry.distance(p, self.positions[idx], size=(self.width, self.height))
+
+  def query_box(self, bot_left: Tuple[float, float], top_right: Tuple[float, float]) -> NDArray:
+    '''
+    Indices of the points inside the box [bot_left, top_right). The box can go over the edges of the arena.
+    '''
+    x1, y1 = bot_left
+    x2, y2 = top_right
+    idx = self._candidates(
+      int(x1 // self.cs), int(x2 // self.cs),
+      int(y1 // self.cs), int(y2 // self.cs))
+    if len(idx) == 0:
+      return idx
+    p = self.positions[idx]
+    mask = np.ones(len(idx), dtype=bool)
+    if x2 - x1 < self.width:
+      mask &= (p[:, 0] - x1) % self.width < x2 - x1
+    if y2 - y1 < self.height:
+      mask &= (p[:, 1] - y1) % self.height < y2 - y1
+    return idx[mask]
+
+  def query_radius(self, p: Tuple[float, float], radius: float) -> Tuple[NDArray, NDArray]:
+    '''
+    Points within the wrap-aware radius of p.
+
+    returns: Indices and distances of the points, sorted by distance.
+    '''
+    x, y = p
+    idx = self._candidates(
+      int((x - radius) // self.cs), int((x + radius) // self.cs),
+      int((y - radius) // self.cs), int((y + radius) // self.cs))
+    dist = self.distance(p, idx)
+    mask = dist <= radius
+    idx, dist = idx[mask], dist[mask]
+    order = np.argsort(dist, kind='stable')
+    return idx[order], dist[order]
+
+  def knn(self, p: Tuple[float, float], k: int) -> Tuple[NDArray, NDArray]:
+    '''
+    The k points closest to p using wrap-aware distances. Fewer are returned if there are not enough points.
+
+    returns: Indices and distances of the points, sorted by distance.
+    '''
+    k = min(k, len(self))
+    if k <= 0:
+      return np.zeros(0, dtype=np.int64), np.zeros(0)
+    if len(self) <= _BRUTE_FORCE_MAX:
+      idx = np.arange(len(self))
+      dist = self.distance(p, idx)
+      order = np.argsort(dist, kind='stable')[:k]
+      return idx[order], dist[order]
+    i0 = int(p[0] // self.cs)
+    j0 = int(p[1] // self.cs)
+    # Starts from the ring that holds k points on average.
+    ring = max(0, int(np.ceil((np.sqrt(k * self.m * self.n / len(self)) - 1) / 2)))
+    while True:
+      idx = self._candidates(i0 - ring, i0 + ring, j0 - ring, j0 + ring)
+      covers_all = 2*ring + 1 >= self.m and 2*ring + 1 >= self.n
+      if len(idx) >= k:
+        dist = self.distance(p, idx)
+        # Every point closer than ring * cs is guaranteed to be among the candidates.
+        if covers_all or np.count_nonzero(dist <= ring * self.cs) >= k:
+          order = np.argsort(dist, kind='stable')[:k]
+          return idx[order], dist[order]
+      ring += 1
+
+  def _candidates(self, i1: int, i2: int, j1: int, j2: int) -> NDArray:
+    '''Indices of the points in the inclusive range of cells, wrapping around the edges.'''
+    if len(self) <= _BRUTE_FORCE_MAX:
+      return np.arange(len(self))
+    if i2 - i1 + 1 >= self.m:
+      i1, i2 = 0, self.m - 1
+    if j2 - j1 + 1 >= self.n:
+      j1, j2 = 0, self.n - 1
+    cells = ((np.arange(i1, i2 + 1) % self.m)[:, None] * self.n + (np.arange(j1, j2 + 1) % self.n)[None, :]).ravel()
+    s = self.starts[cells]
+    lens = self.starts[cells + 1] - s
+    total = int(lens.sum())
+    if total == 0:
+      return np.zeros(0, dtype=np.int64)
+    # Gathers the ranges order[s:s+len] of every cell into a single array.
+    offsets = np.repeat(s - (np.cumsum(lens) - lens), lens)
+    return self.order[offsets + np.arange(total)]
@@ -0,0 +1,112 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from . import geometry
+from .entity import Entity, to_positions
+from .grid import GridView
+
+# Acceleration applied to arrows every frame, in pixels per frame squared. Y points up, so it pulls y down.
+ARROW_GRAVITY = 0.2
+
+
+def to_velocities(entities: List[Entity]) -> NDArray[np.float64]:
+  '''Velocities of the entities as an array with shape (N, 2).'''
+  velocities = np.empty((len(entities), 2), dtype=np.float64)
+  for k, e in enumerate(entities):
+    velocities[k, 0] = e.v.x
+    velocities[k, 1] = e.v.y
+  return velocities
+
+
+class ArrowPredictor:
+  '''
+  Predicts where flying arrows will be in the next frames by integrating them under gravity, all arrows at once.
+  An arrow stops at the first wall of the level grid it enters.
+
+  :param grid_view: Provides the level grid. Its scenario must be set before predicting.
+  :param frames: How many frames ahead to predict.
+  :param gravity: Downward acceleration of the arrows.
+  '''
+  def __init__(self, grid_view: GridView, frames: int = 30, gravity: float = ARROW_GRAVITY):
+    self.gv = grid_view
+    self.frames = frames
+    self.gravity = gravity
+
+  def predict(self, positions: NDArray, velocities: NDArray) -> Tuple[NDArray, NDArray]:
+    '''
+    Integrates the arrows frames ahead.
+
+    :param positions: Positions of the arrows with shape (N, 2).
+    :param velocities: Velocities of the arrows with shape (N, 2), in pixels per frame.
+    returns: Predicted positions with shape (frames + 1, N, 2), where index 0 is the current frame, and the frame in
+      which each arrow hits a wall with shape (N,), or frames + 1 if it does not hit any.
+    '''
+    csize = self.gv.csize
+    m, n_rows = self.gv.fixed_grid10.shape
+    blocked = self.gv.fixed_grid10.ravel() != 0
+    n = len(positions)
+    traj = np.empty((self.frames + 1, n, 2), dtype=np.float64)
+    traj[0] = positions
+    impact = np.full(n, self.frames + 1, dtype=np.int64)
+
+    # Only the arrows still flying are integrated. active maps them back to their index in the input.
+    active = np.arange(n)
+    p = np.array(positions, dtype=np.float64)
+    v = np.array(velocities, dtype=np.float64)
+    for t in range(1, self.frames + 1):
+      traj[t] = traj[t - 1]
+      if len(active) == 0:
+        continue
+      v[:, 1] -= self.gravity
+      # Arrows faster than a cell per frame are checked at intermediate points so they don't go through walls.
+      substeps = max(1, int(np.ceil(np.abs(v).max() / csize)))
+      for s in range(1, substeps + 1):
+        q = p + v * (s / substeps) if s < substeps else p + v
+        cells = ((q[:, 0] // csize) % m).astype(np.int64) * n_rows + ((q[:, 1] // csize) % n_rows).astype(np.int64)
+        hit = blocked[cells]
+        if hit.any():
+          impact[active[hit]] = t
+          keep = ~hit
+          active, p, v = active[keep], p[keep], v[keep]
+      p += v
+      traj[t, active] = p
+    return traj, impact
+
+  def predict_entities(self, arrows: List[Entity]) -> Tuple[NDArray, NDArray]:
+    '''Same as predict, taking the arrows from the entities of an update.'''
+    return self.predict(to_positions(arrows), to_velocities(arrows))
+
+  def danger_map(self,
+      center: Tuple[float, float],
+      traj: NDArray,
+      impact: NDArray,
+      shape: Tuple[int, int],
+      cell_size: int,
+      out: Optional[NDArray] = None) -> NDArray:
+    '''
+    Rasterizes predicted trajectories into a grid centered at a point, usually the player. Each cell holds the first
+    frame in which any arrow goes through it, or infinity if none does. The grid wraps around the arena like the level.
+
+    :param center: Center of the map.
+    :param traj: Predicted positions as returned by predict.
+    :param impact: Impact frames as returned by predict.
+    :param shape: Amount of cells of the map (2m, 2n).
+    :param cell_size: Size in pixels of each cell.
+    :param out: Optional array with the given shape to write the map into.
+    '''
+    if out is None:
+      out = np.empty(shape, dtype=np.float32)
+    out.fill(np.inf)
+    if traj.shape[1] == 0:
+      return out
+    t = np.arange(traj.shape[0])[:, None].repeat(traj.shape[1], axis=1)
+    # Arrows are only dangerous until they get stuck.
+    moving = t < impact[None, :]
+    d = geometry.displacement(center, traj[moving])
+    i = np.floor_divide(d[:, 0], cell_size).astype(np.int64) + shape[0] // 2
+    j = np.floor_divide(d[:, 1], cell_size).astype(np.int64) + shape[1] // 2
+    inside = (i >= 0) & (i < shape[0]) & (j >= 0) & (j < shape[1])
+    np.minimum.at(out, (i[inside], j[inside]), t[moving][inside])
+    return out
@@ -0,0 +1,148 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .grid import shared_level_cache
+from .raycast import line_of_sight
+from .shared_cache import level_key
+
+# Sources whose lines of sight are cast together by visibility_bits, to bound the memory used.
+_SOURCES_PER_BATCH = 64
+
+
+def visibility_bits(wall: NDArray, cell_size: int) -> NDArray[np.uint8]:
+  '''
+  Which cells can be seen from which, going around the edges when shorter, as raycast.line_of_sight from the center of
+  one cell to the center of the other. Lines of sight are not always symmetric, since the cells touched by a segment
+  depend on the end it is cast from.
+
+  :param wall: Grid indexed [i, j]. Non zero cells are blocked.
+  :param cell_size: Size in pixels of the cells of wall.
+  returns: Bits with shape (N, ceil(N / 8)) where N is the amount of cells, one row per source cell packed with
+    np.packbits, so the bit of the target t is in byte t // 8 counting from the most significant.
+  '''
+  wall = np.asarray(wall)
+  W, H = wall.shape
+  N = W * H
+  # Same as PathCell.pos, so that paths get the same checkpoints as with line_of_sight.
+  i, j = np.meshgrid(np.arange(W), np.arange(H), indexing='ij')
+  centers = (np.stack([i.ravel(), j.ravel()], axis=1) + 0.5) * cell_size
+  free = np.flatnonzero(wall.ravel() == 0)
+  visible = np.zeros((N, N), dtype=np.bool_)
+  # Nothing can be seen from blocked cells or through to them, so only free pairs are cast.
+  for k in range(0, len(free), _SOURCES_PER_BATCH):
+    sources = free[k:k + _SOURCES_PER_BATCH]
+    p1 = np.repeat(centers[sources], len(free), axis=0)
+    p2 = np.tile(centers[free], (len(sources), 1))
+    visible[np.ix_(sources, free)] = line_of_sight(wall, cell_size, p1, p2).reshape(len(sources), len(free))
+  return np.packbits(visible, axis=1)
+
+
+class VisibilityTable:
+  '''
+  Lines of sight between all pairs of cells of a level, so that checking one is reading a bit. Cells are (i, j) tuples
+  of the level grid.
+
+  :param wall: Level grid, usually GridView.fixed_grid10.
+  :param cell_size: Size in pixels of the cells of wall.
+  :param bits: Precomputed visibility_bits, computed if None.
+  '''
+  def __init__(self, wall: NDArray, cell_size: int, bits: Optional[NDArray] = None):
+    self.wall = np.asarray(wall)
+    self.shape: Tuple[int, int] = self.wall.shape
+    self.cell_size = cell_size
+    self.bits = visibility_bits(self.wall, cell_size) if bits is None else bits
+
+  def index(self, cell: Tuple[int, int]) -> int:
+    W, H = self.shape
+    return (cell[0] % W) * H + cell[1] % H
+
+  def matches(self, wall: NDArray, cell_size: int) -> bool:
+    '''Whether the table is the one of a grid.'''
+    return cell_size == self.cell_size and np.array_equal(self.wall, wall)
+
+  def visible(self, source: Tuple[int, int], target: Tuple[int, int]) -> bool:
+    '''Whether the center of target can be seen from the center of source.'''
+    t = self.index(target)
+    return bool(self.bits[self.index(source), t >> 3] >> (7 - (t & 7)) & 1)
+
+  def visible_from(self, source: Tuple[int, int]) -> NDArray[np.bool_]:
+    '''Cells that can be seen from source, with the shape of the grid.'''
+    W, H = self.shape
+    return np.unpackbits(self.bits[self.index(source)], count=W * H).astype(np.bool_).reshape(self.shape)
+
+  def visible_cells(self, source: Tuple[int, int], cells: List[Tuple[int, int]]) -> NDArray[np.bool_]:
+    '''Which of cells can be seen from source.'''
+    W, H = self.shape
+    c = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+    t = (c[:, 0] % W) * H + c[:, 1] % H
+    return (self.bits[self.index(source), t >> 3] >> (7 - (t & 7)) & 1).astype(np.bool_)
+
+  def can_see(self, p1: ArrayLike, p2: ArrayLike) -> NDArray[np.bool_]:
+    '''
+    Whether the cell of p2 can be seen from the cell of p1, for positions in pixels. This is a cell level
+    approximation of line_of_sight between the positions themselves.
+
+    :param p1: Positions with shape (N, 2), or (2,) to share one.
+    :param p2: Positions with shape (N, 2).
+    '''
+    W, H = self.shape
+    p1, p2 = np.broadcast_arrays(np.asarray(p1, dtype=np.float64), np.asarray(p2, dtype=np.float64))
+    c1 = np.floor_divide(p1.reshape(-1, 2), self.cell_size).astype(np.int64) % (W, H)
+    c2 = np.floor_divide(p2.reshape(-1, 2), self.cell_size).astype(np.int64) % (W, H)
+    s = c1[:, 0] * H + c1[:, 1]
+    t = c2[:, 0] * H + c2[:, 1]
+    return (self.bits[s, t >> 3] >> (7 - (t & 7)) & 1).astype(np.bool_)
+
+  def furthest_visible(self, cells: List[Tuple[int, int]]) -> int:
+    '''Position in cells of the last one before the first that can't be seen from cells[0].'''
+    hidden = np.flatnonzero(~self.visible_cells(cells[0], cells[1:]))
+    return len(cells) - 1 if len(hidden) == 0 else int(hidden[0])
+
+  def smooth(self, cells: List[Tuple[int, int]]) -> List[int]:
+    '''
+    Pulls a path tight: from its start, jumps to the furthest cell that can be seen until the end is reached.
+
+    returns: Positions in cells of the waypoints, starting with 0 and ending with the last one.
+    '''
+    waypoints = [0]
+    while waypoints[-1] < len(cells) - 1:
+      k = waypoints[-1]
+      # A cell can always reach the next one of the path, even if the line of sight between them is blocked.
+      waypoints.append(k + max(self.furthest_visible(cells[k:]), 1))
+    return waypoints
+
+
+# Tables created by level_visibility, shared by everything in the process that looks at the same level.
+_visibility_cache: Dict[Tuple[bytes, Tuple[int, ...], int], VisibilityTable] = {}
+
+
+def level_visibility(
+    wall: NDArray,
+    cell_size: int,
+    precomputed: Optional[Mapping[str, NDArray]] = None) -> VisibilityTable:
+  '''
+  Gets the visibility table of a level, computing it only the first time the level is seen in the process, or in any
+  process when a shared level cache is in use.
+
+  :param wall: Level grid.
+  :param cell_size: Size in pixels of the cells of wall.
+  :param precomputed: Arrays of the level loaded with load_level_artifacts. Its visibility is used instead of computing
+    the table.
+  '''
+  wall = np.asarray(wall, dtype=np.int8)
+  key = (wall.tobytes(), wall.shape, cell_size)
+  table = _visibility_cache.get(key)
+  if table is None:
+    bits = None
+    if precomputed is not None and 'visibility' in precomputed:
+      if not np.array_equal(precomputed['grid10'], wall):
+        raise Exception('Precomputed visibility table is from another level')
+      bits = precomputed['visibility']
+    cache = shared_level_cache()
+    if cache:
+      name = level_key(wall, cell_size)
+      bits = cache.get_or_create(f'{name}_visibility', lambda: visibility_bits(wall, cell_size) if bits is None else bits)
+    table = _visibility_cache[key] = VisibilityTable(wall, cell_size, bits)
+  return table
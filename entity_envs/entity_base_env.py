@@ -6,7 +6,8 @@ from entity_gym.env import GlobalCategoricalAction, Environment, Observation, Ac
 from entity_gym.env import Entity as EntityGym
 
 from common.constants import DASH, DOWN, JUMP, LEFT, RIGHT, SHOOT, UP
-from common.entity import Entity, to_entities
+from common.entity import Entity, EntityIndex, to_entities
+from common.entity_tracker import EntityTracker
 
 from towerfall import Towerfall
 
@@ -29,6 +30,7 @@ class TowerfallEntityEnv(Environment):
     self.connection.record_path = record_path
     self._draw_elems = []
     self.is_init_sent = False
+    self.tracker = EntityTracker()
 
     logging.info('Initialized TowerfallEnv')
 
@@ -91,7 +93,10 @@ class TowerfallEntityEnv(Environment):
       self.state_update = self.connection.read_json()
       assert self.state_update['type'] == 'update', self.state_update['type']
       self.entities = to_entities(self.state_update['entities'])
-      self.me = self._get_own_archer(self.entities)
+      self.entity_index = EntityIndex(self.entities)
+      self.me = self._get_own_archer(self.entity_index)
+      self.tracker.reset()
+      self.tracker.update(self.entity_index)
       if self._is_reset_valid():
         break
 
@@ -130,7 +135,9 @@ class TowerfallEntityEnv(Environment):
     self.state_update = self.connection.read_json()
     assert self.state_update['type'] == 'update'
     self.entities = to_entities(self.state_update['entities'])
-    self.me = self._get_own_archer(self.entities)
+    self.entity_index = EntityIndex(self.entities)
+    self.me = self._get_own_archer(self.entity_index)
+    self.tracker.update(self.entity_index)
     obs = self._post_observe()
     # logging.info(f'Observation: {obs.__dict__}')
     return obs
@@ -182,9 +189,5 @@ class TowerfallEntityEnv(Environment):
 
     return self.observe()
 
-  def _get_own_archer(self, entities: List[Entity]) -> Optional[Entity]:
-    for e in entities:
-      if e.type == 'archer':
-        if e['playerIndex'] == self.index:
-          return e
-    return None
\ No newline at end of file
+  def _get_own_archer(self, entity_index: EntityIndex) -> Optional[Entity]:
+    return entity_index.archer(self.index)
\ No newline at end of file
@@ -5,8 +5,10 @@ from entity_gym.env import Observation, GlobalCategoricalActionMask
 from typing import Any, Dict, List, Optional
 
 import numpy as np
-from common.constants import HH, HW
-from common.entity import Entity, Vec2
+from common import geometry
+from common.constants import HH
+from common.entity import Entity, Vec2, to_positions
+from common.entity_tracker import ArrowsChangedEvent, DespawnedEvent
 from entity_envs.entity_base_env import TowerfallEntityEnv
 
 
@@ -37,8 +39,7 @@ class TowerfallEntityEnvImpl(TowerfallEntityEnv):
 
   def _post_reset(self) -> Observation:
     assert self.me, 'No player found after reset'
-    targets = list(e for e in self.entities if e['isEnemy'])
-    self.prev_enemy_ids = set(t['id'] for t in targets)
+    targets = self.entity_index.enemies
 
     self.done = False
     self.episode_len = 0
@@ -47,10 +48,10 @@ class TowerfallEntityEnvImpl(TowerfallEntityEnv):
     return self._get_obs(targets, [])
 
   def _post_observe(self) -> Observation:
-    targets = list(e for e in self.entities if e['isEnemy'])
+    targets = self.entity_index.enemies
     self._update_reward(targets)
     self.episode_len += 1
-    arrows = list(e for e in self.entities if e['type'] == 'arrow')
+    arrows = self.entity_index.of_type('arrow')
     return self._get_obs(targets, arrows)
 
   def _get_reset_entities(self) -> Optional[List[Dict[str, Any]]]:
@@ -77,29 +78,26 @@ class TowerfallEntityEnvImpl(TowerfallEntityEnv):
       self.reward -= 1
 
     # Positive reward for killing an enemy
-    enemy_ids = set(t['id'] for t in enemies)
-    for id in self.prev_enemy_ids - enemy_ids:
-      self.reward += 1
+    for event in self.tracker.of_type(DespawnedEvent):
+      if event.entity.isEnemy:
+        self.reward += 1
 
     if self.me:
-      arrow_count = len(self.me['arrows'])
-      delta_arrow = arrow_count - self.prev_arrow_count
-      if delta_arrow > 0:
-        self.reward += delta_arrow * 0.2
-      else:
-        self.reward += delta_arrow * 0.1
-      self.prev_arrow_count = arrow_count
+      for event in self.tracker.of_type(ArrowsChangedEvent):
+        if event.id != self.me['id']:
+          continue
+        if event.delta > 0:
+          self.reward += event.delta * 0.2
+        else:
+          self.reward += event.delta * 0.1
+      self.prev_arrow_count = len(self.me['arrows'])
 
     # if self.reward != 0:
     #   logging.info(f'Reward: {self.reward}')
 
-    self.prev_enemy_ids = enemy_ids
-    if len(self.prev_enemy_ids) == 0:
+    if len(enemies) == 0:
       self.done = True
 
-  def limit(self, x: float, a: float, b: float) -> float:
-    return x+b-a if x < a else x-b+a if x > b else x
-
   def _get_obs(self, enemies: List[Entity], arrows: List[Entity]) -> Observation:
     if not self.me:
       return Observation(
@@ -113,27 +111,14 @@ class TowerfallEntityEnvImpl(TowerfallEntityEnv):
         }
       )
 
-    enemie_states = []
-    for enemy in enemies:
-      enemie_states.append(np.array(
-        [
-          self.limit((enemy.p.x - self.me.p.x) / HW, -1, 1),
-          self.limit((enemy.p.y - self.me.p.y) / HH, -1, 1),
-          enemy['facing']
-        ],
-        dtype=np.float32
-      ))
-
-    arrow_states = []
-    for arrow in arrows:
-      arrow_states.append(np.array(
-        [
-          self.limit((arrow.p.x - self.me.p.x) / HW, -1, 1),
-          self.limit((arrow.p.y - self.me.p.y) / HH, -1, 1),
-          1 if arrow['state'] == 'stuck' else 0
-        ],
-        dtype=np.float32
-      ))
+    me = (self.me.p.x, self.me.p.y)
+    enemy_states = np.empty((len(enemies), 3), dtype=np.float32)
+    enemy_states[:, :2] = geometry.normalized_displacement(me, to_positions(enemies))
+    enemy_states[:, 2] = [enemy['facing'] for enemy in enemies]
+
+    arrow_states = np.empty((len(arrows), 3), dtype=np.float32)
+    arrow_states[:, :2] = geometry.normalized_displacement(me, to_positions(arrows))
+    arrow_states[:, 2] = [1 if arrow['state'] == 'stuck' else 0 for arrow in arrows]
 
     return Observation(
       done=self.done,
@@ -144,7 +129,7 @@ class TowerfallEntityEnvImpl(TowerfallEntityEnv):
           self.prev_arrow_count,
         ], dtype=np.float32),
       entities={
-        'enemies': enemie_states,
+        'enemies': enemy_states,
         'arrows': arrow_states
       }
     )
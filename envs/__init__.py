@@ -3,5 +3,6 @@ from .base_env import *
 from .blank_env import *
 from .curriculums import *
 from .objectives import *
+from .observation_buffer import *
 from .observations import *
 from .predefined_envs import *
\ No newline at end of file
@@ -5,7 +5,7 @@ from typing import Any, List, Optional, Tuple
 from gym import Env
 from numpy.typing import NDArray
 
-from common import Entity, to_entities
+from common import Entity, EntityIndex, EntityTracker, to_entities
 from towerfall.towerfall import Towerfall
 
 from .actions import TowerfallActions
@@ -36,6 +36,7 @@ class TowerfallEnv(Env, ABC):
     self.action_space = self.actions.action_space
     self._draw_elems = []
     self.is_init_sent = False
+    self.tracker = EntityTracker()
     logging.info('Initialized TowerfallEnv')
 
   def _is_reset_valid(self) -> bool:
@@ -104,10 +105,12 @@ class TowerfallEnv(Env, ABC):
         self.connection.write_json(dict(type='commands', command="", id=self.state_update['id']))
 
       self.frame = 0
-      self.state_update = self.connection.read_json()
-      assert self.state_update['type'] == 'update', self.state_update['type']
+      self._read_update()
       self.entities = to_entities(self.state_update['entities'])
-      self.me = self._get_own_archer(self.entities)
+      self.entity_index = EntityIndex(self.entities)
+      self.me = self._get_own_archer(self.entity_index)
+      self.tracker.reset()
+      self.tracker.update(self.entity_index)
       if self._is_reset_valid():
         break
 
@@ -128,26 +131,30 @@ class TowerfallEnv(Env, ABC):
       resp['draws'] = self._draw_elems
     self.connection.write_json(resp)
     self._draw_elems.clear()
-    self.state_update = self.connection.read_json()
+    self._read_update()
     self.command = command
-    assert self.state_update['type'] == 'update'
     self.entities = to_entities(self.state_update['entities'])
-    self.me = self._get_own_archer(self.entities)
+    self.entity_index = EntityIndex(self.entities)
+    self.me = self._get_own_archer(self.entity_index)
+    self.tracker.update(self.entity_index)
     # assert self.me is not None, 'Could not find own archer'
     # obs, done, rew, info = self._post_step()
     # logging.info(obs)
     # return obs, done, rew, info
     return self._post_step()
 
-  def _get_own_archer(self, entities: List[Entity]) -> Optional[Entity]:
+  def _read_update(self):
+    '''
+    Reads the next update from the game.
+    '''
+    self.state_update = self.connection.read_json()
+    assert self.state_update['type'] == 'update', self.state_update['type']
+
+  def _get_own_archer(self, entity_index: EntityIndex) -> Optional[Entity]:
     '''
-    Iterates over all entities to find the archer that matches the index specified in init.
+    Finds the archer that matches the index specified in init.
     '''
-    for e in entities:
-      if e.type == 'archer':
-        if e['playerIndex'] == self.index:
-          return e
-    return None
+    return entity_index.archer(self.index)
 
   # def _read_game_state(self):
   #   # logging.info('Reading game state')
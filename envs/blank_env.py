@@ -8,18 +8,27 @@ from towerfall.towerfall import Towerfall
 from .actions import TowerfallActions
 from .base_env import TowerfallEnv
 from .objectives import TowerfallObjective
+from .observation_buffer import ObservationBuffer
 from .observations import TowerfallObservation
 
 
 class TowerfallBlankEnv(TowerfallEnv):
-  '''A blank environment that can be customized with the addition of observations and an objective.'''
+  '''
+  A blank environment that can be customized with the addition of observations and an objective.
+
+  Observations are written into a preallocated ObservationBuffer by the components, and each reset and step returns a
+  copy of it, so returned observations are never changed by later steps.
+
+  :param flat_obs: Whether observations are the flat view of the buffer, with a Box space, instead of a dict.
+  '''
   def __init__(self,
       towerfall: Towerfall,
       observations: List[TowerfallObservation],
       objective: TowerfallObjective,
       actions: Optional[TowerfallActions]=None,
       record_path: Optional[str]=None,
-      verbose: int = 0):
+      verbose: int = 0,
+      flat_obs: bool = False):
     super(TowerfallBlankEnv, self).__init__(towerfall, actions, record_path, verbose)
     logging.info('Initializing TowerfallBlankEnv')
     obs_space = {}
@@ -29,7 +38,9 @@ class TowerfallBlankEnv(TowerfallEnv):
     self.objective.env = self
     for obs in self.components:
       obs.extend_obs_space(obs_space)
-    self.observation_space = spaces.Dict(obs_space)
+    self.obs_buffer = ObservationBuffer(spaces.Dict(obs_space))
+    self.flat_obs = flat_obs
+    self.observation_space = self.obs_buffer.flat_space if flat_obs else self.obs_buffer.obs_space
     logging.info('Action space: %s', str(self.action_space))
     logging.info('Observation space: %s', str(self.observation_space))
 
@@ -40,17 +51,21 @@ class TowerfallBlankEnv(TowerfallEnv):
     reset_entities = self.objective.get_reset_entities()
     self.towerfall.send_reset(reset_entities)
 
-  def _post_reset(self) -> dict:
-    obs_dict = {}
+  def _post_reset(self) -> object:
+    self.obs_buffer.clear()
+    obs_dict = self.obs_buffer.obs_dict
     for obs in self.components:
       obs.post_reset(self.state_scenario, self.me, self.entities, obs_dict)
     # logging.info(f"reset: {str(obs_dict)}")
-    return obs_dict
+    return self._get_obs()
 
   def _post_step(self) -> Tuple[object, float, bool, object]:
-    obs_dict = {}
+    obs_dict = self.obs_buffer.obs_dict
     for obs in self.components:
       obs.post_step(self.me, self.entities, self.command, obs_dict)
     # logging.info(f"step: {str(obs_dict)}")
     # logging.info(f'reward: {self.objective.rew}')
-    return obs_dict, self.objective.rew, self.objective.done, {}
+    return self._get_obs(), self.objective.rew, self.objective.done, {}
+
+  def _get_obs(self) -> object:
+    return self.obs_buffer.snapshot_flat() if self.flat_obs else self.obs_buffer.snapshot()
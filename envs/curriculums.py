@@ -7,12 +7,26 @@ import numpy as np
 
 from gym import Space
 
-from common import GridView, Entity, Vec2, WIDTH, HEIGHT
+from common import (FreeSpaceIndex, GridView, Entity, Vec2, WIDTH, HEIGHT, level_key, level_platform_graph,
+                    shared_level_cache)
 
 from .objectives import FollowTargetObjective
 from .objectives import TowerfallObjective
 
 from typing import Any, Dict, List, Tuple, Iterable, Optional
+from numpy.typing import NDArray
+
+
+def _to_array(points: List[Vec2]) -> NDArray:
+  return np.array([[p.x, p.y] for p in points], dtype=np.float64).reshape(-1, 2)
+
+
+def _tasks_to_array(start_ends: List[Tuple[Vec2, Vec2]]) -> NDArray:
+  return np.array([[s.x, s.y, e.x, e.y] for s, e in start_ends], dtype=np.float64).reshape(-1, 4)
+
+
+def _tasks_from_array(tasks: NDArray) -> List[Tuple[Vec2, Vec2]]:
+  return [(Vec2(sx, sy), Vec2(ex, ey)) for sx, sy, ex, ey in tasks.tolist()]
 
 
 class TaskEncoder(json.JSONEncoder):
@@ -38,7 +52,8 @@ class TaskDecoder(json.JSONDecoder):
 class FollowCloseTargetCurriculum(TowerfallObjective):
   '''
   Creates a series of episodes where the agent needs to get to a near target.
-  The starting positions are uniformly distributed around the empty spaces of the scenario.
+  The starting positions are the player spawns of the level, if the scenario has them, and one position on the floor
+  per cell of the level, so they are uniformly distributed around the empty spaces of the scenario.
 
   :param grid_view: Used to detect collisions when resetting the task.
   :param distance: Original distance from the target.
@@ -46,15 +61,20 @@ class FollowCloseTargetCurriculum(TowerfallObjective):
   :param bounty: Reward received when reaching the location.
   :param episode_max_len: Amount of frames after which the episode ends.
   :param rew_dc: Agent loses this amount of reward per frame, in order to force it to get the target faster.
+  :param filename: File the tasks are loaded from, or saved to once created. Defaults to one per distance.
+  :param feasible_only: Only keep tasks where the platform graph of the level has a route to the target, instead of
+    only requiring a clean straight path.
   '''
-  def __init__(self, grid_view: Optional[GridView], distance=8, max_distance=16, bounty=10, episode_max_len=90, rew_dc=2):
+  def __init__(self, grid_view: Optional[GridView], distance=8, max_distance=16, bounty=10, episode_max_len=90, rew_dc=2,
+      filename: Optional[str] = None, feasible_only: bool = False):
     print('FollowCloseTargetCurriculum')
     self.gv = grid_view
     self.distance = distance
     self.max_distance = max_distance
     self.objective = FollowTargetObjective(grid_view, distance, max_distance, bounty, episode_max_len, rew_dc)
     self.task_idx = -1
-    self.filename = f'FollowCloseTargetCurriculum_episodes_{distance}.json'
+    self.feasible_only = feasible_only
+    self.filename = filename or f'FollowCloseTargetCurriculum_episodes_{distance}.json'
     self.initialized = False
     if os.path.exists(self.filename):
       with open(self.filename, 'r') as file:
@@ -77,38 +97,69 @@ class FollowCloseTargetCurriculum(TowerfallObjective):
 
     assert player, 'player is required to create curriculum'
 
+    cache = shared_level_cache()
+    if cache:
+      # Env workers share the tasks, so only the first one to get here creates them.
+      assert self.gv, 'grid_view is required to create curriculum'
+      name = level_key(np.array(state_scenario['grid'], dtype=np.int8), type(self).__name__, self.gv.gf, self.distance,
+                       self.feasible_only, player.s.x, player.s.y)
+      tasks = cache.get_or_create(name, lambda: _tasks_to_array(self.create_tasks(state_scenario, player, entities)))
+      self.start_ends = _tasks_from_array(tasks)
+    else:
+      self.start_ends = self.create_tasks(state_scenario, player, entities)
+    self.save_tasks(self.filename)
+
+    random.shuffle(self.start_ends)
+    self.initialized = True
+    return False
+
+  def create_tasks(self, state_scenario: Dict[str, Any], player: Entity, entities: List[Entity]) -> List[Tuple[Vec2, Vec2]]:
+    '''Finds all pairs of start and end positions that the player can use in the scenario.'''
     assert self.gv, 'grid_view is required to create curriculum'
     # if self.gv is None:
     #   self.gv = GridView(5)
     self.gv.set_scenario(state_scenario)
     self.gv.update(entities, player)
-    self.start_ends: List[Tuple[Vec2, Vec2]] = []
-    hsize = player.s / 2
-    for start in self._pick_all_starts():
-      if self.gv.is_region_collision(start - hsize, start + hsize):
+    start_ends: List[Tuple[Vec2, Vec2]] = []
+    size = (player.s.x, player.s.y)
+    standing = FreeSpaceIndex(self.gv, size, on_floor=True, floor_depth=10)
+    flying = FreeSpaceIndex(self.gv, size)
+    graph = level_platform_graph(state_scenario['grid'], int(state_scenario['cellSize'])) if self.feasible_only else None
+    starts = self._pick_all_starts(state_scenario, standing)
+    for start, fits, stands in zip(starts, flying.is_valid(_to_array(starts)), standing.is_valid(_to_array(starts))):
+      if not fits:
         logging.info(f'Start collides. {start}')
         continue
-      if not self.gv.is_region_collision(start - hsize - Vec2(0, 10), start - hsize + Vec2(player.s.x, 0)):
+      if not stands:
         logging.info(f'No floor for start at {start}')
         continue
-      for end in self._pick_all_ends(start):
+      ends: List[Vec2] = []
+      candidates = list(self._pick_all_ends(start))
+      for end, fits in zip(candidates, flying.is_valid(_to_array(candidates))):
         if end.x < 0 or end.x > WIDTH or end.y < 0 or end.y > HEIGHT:
           logging.info(f'End out of bounds. {end}')
-        if self.gv.is_region_collision(end - hsize, end + hsize):
+        if not fits:
           logging.info(f'End collides. {end}')
           continue
-        if not self.gv.is_clean_path(start, end):
+        ends.append(end)
+      if not ends:
+        continue
+      clean = self.gv.is_clean_path_batch(np.array([start.x, start.y]), _to_array(ends))
+      for end, is_clean in zip(ends, clean):
+        if not is_clean:
           logging.info(f'No clean path between {start} and {end}')
           continue
-        self.start_ends.append((start, end))
+        if graph and not graph.can_reach((start.x, start.y), (end.x, end.y)):
+          logging.info(f'No route between {start} and {end}')
+          continue
+        start_ends.append((start, end))
 
-    logging.info(f'Saving tasks to {self.filename}')
-    with open(self.filename, 'w') as file:
-      file.write(json.dumps(self.start_ends, cls=TaskEncoder))
+    return start_ends
 
-    random.shuffle(self.start_ends)
-    self.initialized = True
-    return False
+  def save_tasks(self, filename: str):
+    logging.info(f'Saving tasks to {filename}')
+    with open(filename, 'w') as file:
+      file.write(json.dumps(self.start_ends, cls=TaskEncoder))
 
   def extend_obs_space(self, obs_space_dict: Dict[str, Space]):
     self.objective.extend_obs_space(obs_space_dict)
@@ -134,12 +185,15 @@ class FollowCloseTargetCurriculum(TowerfallObjective):
     self.rew = self.objective.rew
     self.done = self.objective.done
 
-  def _pick_all_starts(self) -> Iterable[Vec2]:
-    return [Vec2(160, 110)]
-    # margin = 15
-    # for x in range(margin, WIDTH - margin, 10):
-    #   for y in range(margin, HEIGHT - margin, 10):
-    #     yield Vec2(x, y)
+  def _pick_all_starts(self, state_scenario: Dict[str, Any], standing: FreeSpaceIndex) -> List[Vec2]:
+    starts = [Vec2(float(p['x']), float(p['y'])) for p in state_scenario.get('playerSpawns', [])]
+    # One standing position per cell of the level, at most.
+    step = max(1, int(state_scenario['cellSize']) // self.gv.gf)
+    H = self.gv.grid.shape[1]
+    i, j = np.divmod(standing.cells, H)
+    per_cell = (i % step == 0) & (j % step == 0)
+    starts.extend(Vec2(float(x), float(y)) for x, y in standing.positions[per_cell])
+    return starts
 
   def _pick_all_ends(self, start: Vec2) -> Iterable[Vec2]:
     v = Vec2(-self.distance, 20)
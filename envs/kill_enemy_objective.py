@@ -1,17 +1,28 @@
 import random
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import numpy as np
 from gym import Space, spaces
 
-from common.constants import HH, HW
-from common.entity import Entity, Vec2
+from common import geometry
+from common.entity import Entity, Vec2, to_positions
+from common.entity_tracker import DespawnedEvent
+from common.free_space import FreeSpaceIndex, level_free_space
+from common.spatial_hash import SpatialHash
 from envs.objectives import TowerfallObjective
 
+ARCHER_START = Vec2(160, 110)
+
 
 class KillEnemyObjective(TowerfallObjective):
   '''
   Specifies observation and rewards associated with killing one slime.
+  Enemies are placed on the floor, reachable from the archer and between min_distance and max_distance from it, once the
+  level is known, each one at a different position. Until then, or without a grid factor, they are placed at that
+  distance to the sides of the archer.
+
+  :param grid_factor: Spacing in pixels of the positions where enemies are placed. If None they are always placed to the
+    sides of the archer.
   '''
   def __init__(self,
                enemy_type:str = 'slime',
@@ -19,16 +30,22 @@ class KillEnemyObjective(TowerfallObjective):
                min_distance: float = 50,
                max_distance: float = 100,
                bounty = 5,
-               episode_max_len: int=60*2):
+               episode_max_len: int=60*2,
+               enemy_size: Tuple[float, float] = (10, 10),
+               grid_factor: Optional[int] = None):
     super().__init__()
     self.enemy_type = enemy_type
     self.enemy_count = enemy_count
-    self.target_ids = []
+    self.enemy_size = enemy_size
+    self.grid_factor = grid_factor
+    self.free_space: Optional[FreeSpaceIndex] = None
+    self.target_ids: Set[int] = set()
     self.min_distance = min_distance
     self.max_distance = max_distance
     self.bounty = bounty
     self.episode_max_len = episode_max_len
     self.episode_len = 0
+    self.spatial_hash = SpatialHash()
     self.obs_space = spaces.Box(low=-1, high = 1, shape=(3*self.enemy_count,), dtype=np.float32)
 
   def extend_obs_space(self, obs_space_dict: Dict[str, Space]):
@@ -38,8 +55,18 @@ class KillEnemyObjective(TowerfallObjective):
     obs_space_dict['targets'] = self.obs_space
 
   def get_reset_entities(self) -> Optional[List[Dict[str, Any]]]:
-    p = Vec2(160, 110)
+    p = ARCHER_START
     entities: List[Dict[str, Any]] = [dict(type='archer', pos=p.dict())]
+    if self.free_space is not None:
+      positions = self.free_space.sample_near((p.x, p.y), self.min_distance, self.max_distance, n=self.enemy_count,
+                                              replace=False)
+      if positions is not None:
+        for x, y in positions:
+          entities.append(dict(
+            type=self.enemy_type,
+            pos=Vec2(float(x), float(y)).dict(),
+            facing=1 if x < p.x else -1))
+        return entities
     for i in range(self.enemy_count):
       sign = random.randint(0, 1)*2 - 1
       d = random.uniform(self.min_distance, self.max_distance) * sign
@@ -52,10 +79,13 @@ class KillEnemyObjective(TowerfallObjective):
 
   def post_reset(self, state_scenario: Dict[str, Any], player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
     assert player
-    targets = list(e for e in entities if e['type'] == self.enemy_type)
+    if self.grid_factor:
+      # Cached per level, so this only builds the index the first time a level is seen. Used by the next reset.
+      self.free_space = level_free_space(
+        state_scenario, self.grid_factor, self.enemy_size, on_floor=True, reachable_from=(ARCHER_START.x, ARCHER_START.y))
+    targets = self.env.entity_index.of_type(self.enemy_type)
     assert len(targets) > 0, 'No targets found'
-    self.target_ids = [t['id'] for t in targets]
-    self.n_targets_prev = len(self.target_ids)
+    self.target_ids = set(t['id'] for t in targets)
 
     self.done = False
     self.episode_len = 0
@@ -63,12 +93,13 @@ class KillEnemyObjective(TowerfallObjective):
 
 
   def post_step(self, player: Optional[Entity], entities: List[Entity], command: str, obs_dict: Dict[str, Any]):
-    targets = list(e for e in entities if e['id'] in self.target_ids)
-    self._update_reward(player, targets)
+    entity_index = self.env.entity_index
+    targets = [e for e in (entity_index.get(target_id) for target_id in self.target_ids) if e]
+    self._update_reward(player)
     self.episode_len += 1
     self._update_obs(player, targets, obs_dict)
 
-  def _update_reward(self, player: Optional[Entity], targets: List[Entity]):
+  def _update_reward(self, player: Optional[Entity]):
     '''
     Updates the reward and checks if the episode is done.
     '''
@@ -77,29 +108,32 @@ class KillEnemyObjective(TowerfallObjective):
       self.done = True
       self.rew -= self.bounty / 5
 
-    if len(targets) < self.n_targets_prev:
-      self.rew = self.bounty * (self.n_targets_prev - len(targets))
+    kills = 0
+    for event in self.env.tracker.of_type(DespawnedEvent):
+      if event.id in self.target_ids:
+        self.target_ids.remove(event.id)
+        kills += 1
+    # Killing replaces the penalty of dying or running out of time in the same frame.
+    if kills:
+      self.rew = self.bounty * kills
 
-    self.n_targets_prev = len(targets)
-    if self.n_targets_prev == 0:
+    if len(self.target_ids) == 0:
       self.done = True
 
-  def limit(self, x: float, a: float, b: float) -> float:
-    return x+b-a if x < a else x-b+a if x > b else x
-
   def _update_obs(self, player: Optional[Entity], targets: List[Entity], obs_dict: Dict[str, Any]):
-    obs_target = np.zeros((3*self.enemy_count,), dtype=np.float32)
+    obs_target = obs_dict.get('targets')
+    if obs_target is None:
+      obs_target = np.zeros((3*self.enemy_count,), dtype=np.float32)
+    else:
+      obs_target.fill(0)
     if not player:
       obs_dict['targets'] = obs_target
       return
 
-    target_by_dist = []
-    for i, target in enumerate(targets):
-      target_by_dist.append(((target.p - player.p).length(), target))
-
-    target_by_dist.sort(key=lambda x: x[0])
-    for i, (_, target) in enumerate(target_by_dist):
-      obs_target[i*3] = 1
-      obs_target[i*3 + 1] = self.limit(target.p.x - player.p.x / HW, -1, 1)
-      obs_target[i*3 + 2] = self.limit(target.p.y - player.p.y / HH, -1, 1)
+    positions = to_positions(targets)
+    self.spatial_hash.build(positions)
+    closest, _ = self.spatial_hash.knn((player.p.x, player.p.y), self.enemy_count)
+    obs = obs_target.reshape(self.enemy_count, 3)
+    obs[:len(closest), 0] = 1
+    obs[:len(closest), 1:] = geometry.normalized_displacement((player.p.x, player.p.y), positions[closest])
     obs_dict['targets'] = obs_target
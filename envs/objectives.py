@@ -1,12 +1,11 @@
 import logging
-import random
 import numpy as np
 
 from abc import abstractmethod
 
 from gym import spaces, Space
 
-from common import Entity, GridView, WIDTH, HEIGHT, HW, HH, Vec2, grid_pos
+from common import Entity, GridView, HW, HH, geometry, level_free_space, path_queries
 
 from .base_env import TowerfallEnv
 from .observations import TowerfallObservation
@@ -14,6 +13,8 @@ from .observations import TowerfallObservation
 from typing import Any, Dict, List, Mapping, Optional, Tuple
 from numpy.typing import NDArray
 
+TARGET_SIZE = (5, 5)
+
 
 class TowerfallObjective(TowerfallObservation):
   def __init__(self):
@@ -39,8 +40,12 @@ class FollowTargetObjective(TowerfallObjective):
   :param bounty: Reward received when reaching the location
   :param episode_max_len: Amount of frames after which the episode ends
   :param rew_dc: Agent loses this amount of reward per frame, in order to force it to get the target faster
+  :param path_reward: Rewards getting closer to the target along the shortest path through the level instead of in a
+    straight line, so that walls between them don't make the agent run into them. Uses the cached navigation table of
+    the level.
   '''
-  def __init__(self, grid_view: Optional[GridView], distance: float=8, max_distance:float=16, bounty: float=50, episode_max_len: int=60*2, rew_dc=1):
+  def __init__(self, grid_view: Optional[GridView], distance: float=8, max_distance:float=16, bounty: float=50, episode_max_len: int=60*2, rew_dc=1,
+      path_reward: bool = False):
     super(FollowTargetObjective, self).__init__()
     self.gv = grid_view
     self.distance = distance
@@ -49,6 +54,7 @@ class FollowTargetObjective(TowerfallObjective):
     self.episode_max_len = episode_max_len
     self.episode_len = 0
     self.rew_dc = rew_dc
+    self.path_reward = path_reward
     self.obs_space = spaces.Box(low=-2, high = 2, shape=(2,), dtype=np.float32)
 
   def extend_obs_space(self, obs_space_dict: Dict[str, Space]):
@@ -90,9 +96,10 @@ class FollowTargetObjective(TowerfallObjective):
       return
 
     displ = self._get_target_displ(player)
-    self.obs_target = np.array([displ.x / HW, displ.y / HH], dtype=np.float32)
-    disp_len = displ.length()
-    self.rew = self.prev_disp_len - disp_len
+    self.obs_target = (displ / (HW, HH)).astype(np.float32)
+    disp_len = float(np.linalg.norm(displ))
+    rew_len = self._get_reward_distance(player, disp_len)
+    self.rew = self.prev_rew_len - rew_len
     if disp_len < player.s.y / 2:
       # Reached target. Gets big reward
       self.rew += self.bounty
@@ -105,39 +112,58 @@ class FollowTargetObjective(TowerfallObjective):
       self.done = True
       # logging.info(f'Done. Too far from target. {disp_len} > {self.max_distance}')
     self.prev_disp_len = disp_len
+    self.prev_rew_len = rew_len
 
   def set_target(self, player: Entity, x, y):
     self.target = Entity(e = {
       'pos': {'x': x, 'y': y},
       'vel': {'x': 0, 'y': 0},
-      'size':{'x': 5, 'y': 5},
+      'size':{'x': TARGET_SIZE[0], 'y': TARGET_SIZE[1]},
       'isEnemy': False,
       'type': 'fake'
     })
     displ = self._get_target_displ(player)
     # logging.info('Target displ: {}'.format(displ))
-    self.obs_target = np.array([displ.x / HW, displ.y / HH], dtype=np.float32)
-    self.prev_disp_len = displ.length()
+    self.obs_target = (displ / (HW, HH)).astype(np.float32)
+    self.prev_disp_len = float(np.linalg.norm(displ))
+    self.prev_rew_len = self._get_reward_distance(player, self.prev_disp_len)
     self.done = False
     self.episode_len = 0
 
   def _set_random_target(self, player: Entity):
     assert self.gv, 'GridView required by _set_random_target.'
+    free_space = level_free_space(dict(grid=self.gv.fixed_grid10, cellSize=self.gv.csize), self.gv.gf, TARGET_SIZE)
+    # Anywhere in the level, like the random free pixels it replaces.
+    target = free_space.sample()
+    # logging.info('New target: (x, y): ({} {})'.format(*target))
+    self.set_target(player, float(target[0]), float(target[1]))
 
-    while True:
-      x = random.randint(0, WIDTH)
-      y = random.randint(0, HEIGHT)
-      i, j = grid_pos(Vec2(x, y), self.gv.csize)
-      # logging.info('(i, j): ({} {})'.format(i, j))
-      if not self.gv.fixed_grid10[i][j]:
-        break
-    # logging.info('New target: (x, y): ({} {})'.format(x, y))
-    self.set_target(player, x, y)
-
-  def _get_target_displ(self, player: Entity):
+  def _get_target_displ(self, player: Entity) -> NDArray:
+    '''
+    Gets the displacement of the target from the player, going around the edges when that is shorter.
+    This is a type of normalization where the player is at the origin.
     '''
-    Gets the displacement of the target from the player. This is a type of normalization where the player is at the origin.
+    return geometry.displacement((player.p.x, player.p.y), (self.target.p.x, self.target.p.y))
+
+  def _get_reward_distance(self, player: Entity, disp_len: float) -> float:
+    '''
+    Distance to the target used for the reward. disp_len is used when there is no path through the level, or the
+    player is in the cell of the target.
+
+    Along a path it is the distance from the player to the center of the next cell, then cell to cell, then from the
+    center of the cell of the target to the target, so it changes smoothly inside cells and when crossing them.
     '''
-    displ = self.target.p.copy()
-    displ.sub(player.p)
-    return displ
\ No newline at end of file
+    if not self.path_reward:
+      return disp_len
+    assert self.gv, 'GridView required by path_reward.'
+    p = (player.p.x, player.p.y)
+    target = (self.target.p.x, self.target.p.y)
+    csize = self.gv.csize
+    directions, steps = path_queries(self.gv.fixed_grid10, csize, p, target)
+    if steps[0] <= 0:
+      return disp_len
+    next_center = (np.array(geometry.grid_cells(p, csize)) + directions[0] + 0.5) * csize
+    target_center = (np.array(geometry.grid_cells(target, csize)) + 0.5) * csize
+    return float(np.linalg.norm(geometry.displacement(p, next_center))
+                 + (steps[0] - 1) * csize
+                 + np.linalg.norm(geometry.displacement(target_center, target)))
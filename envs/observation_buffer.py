@@ -0,0 +1,93 @@
+import numpy as np
+
+from gym import spaces, Space
+
+from numpy.typing import NDArray
+from typing import Any, Dict, Tuple
+
+
+class ObservationDict(dict):
+  '''
+  Observations of an ObservationBuffer by key, each a view of its slice of the buffer. Setting a key copies the value
+  into the view instead of replacing it, so components that assign new arrays still fill the buffer, and components can
+  also write into obs_dict[key] directly, like with np ufuncs out=obs_dict.get(key).
+  '''
+  def __setitem__(self, key: str, value: Any):
+    view = self.get(key)
+    if view is None:
+      raise Exception(f'Observation buffer has no {key}')
+    if value is not view:
+      view[...] = value
+
+  def copy(self) -> Dict[str, NDArray]:
+    '''Plain dict with copies of the observations, which later steps don't change.'''
+    return {key: np.array(view) for key, view in self.items()}
+
+  def __copy__(self) -> Dict[str, NDArray]:
+    return self.copy()
+
+  def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[str, NDArray]:
+    return self.copy()
+
+  def __reduce__(self):
+    # Unpickled as a plain dict, since the views can't be shared with another process.
+    return dict, (self.copy(),)
+
+
+def _space_bounds(key: str, space: Space) -> Tuple[Tuple[int, ...], NDArray, NDArray]:
+  '''Shape of the observations of space in the buffer, and their bounds with that shape.'''
+  if isinstance(space, spaces.Box):
+    return space.shape, space.low, space.high
+  if isinstance(space, spaces.Discrete):
+    return (), np.array(space.start), np.array(space.start + space.n - 1)
+  if isinstance(space, spaces.MultiBinary):
+    shape = tuple(np.atleast_1d(space.n))
+    return shape, np.zeros(shape), np.ones(shape)
+  raise Exception(f'Observation {key} with space {space} can\'t be put in a buffer')
+
+
+class ObservationBuffer:
+  '''
+  Preallocated storage for the observations of a Dict space, so that steps don't allocate them again. Each key gets a
+  fixed slice of one contiguous buffer, in the order of the keys of the space, and obs_dict and flat are views of the
+  same memory: filling obs_dict fills flat.
+
+  Observations are stored as dtype whatever their space, so discrete and binary ones read back as floats. The buffer is
+  overwritten by every step, so observations that have to be kept are taken with snapshot or snapshot_flat.
+
+  :param obs_space: Observation space with the keys of all components, as built by their extend_obs_space.
+  :param dtype: Type of the buffer.
+  '''
+  def __init__(self, obs_space: spaces.Dict, dtype: Any = np.float32):
+    self.obs_space = obs_space
+    self.slices: Dict[str, slice] = {}
+    shapes = {}
+    lows = []
+    highs = []
+    size = 0
+    for key, space in obs_space.spaces.items():
+      shape, low, high = _space_bounds(key, space)
+      n = int(np.prod(shape, dtype=np.int64))
+      self.slices[key] = slice(size, size + n)
+      shapes[key] = shape
+      lows.append(np.broadcast_to(low, shape).ravel())
+      highs.append(np.broadcast_to(high, shape).ravel())
+      size += n
+    self.flat = np.zeros(size, dtype=dtype)
+    self.obs_dict = ObservationDict((key, self.flat[s].reshape(shapes[key])) for key, s in self.slices.items())
+    low = np.concatenate(lows) if lows else np.zeros(0)
+    high = np.concatenate(highs) if highs else np.zeros(0)
+    self.flat_space = spaces.Box(low=low.astype(dtype), high=high.astype(dtype), dtype=dtype)
+
+  def snapshot(self) -> Dict[str, NDArray]:
+    '''Copy of the observations by key, as views of a single copy of the buffer.'''
+    flat = self.flat.copy()
+    return {key: flat[s].reshape(view.shape) for (key, s), view in zip(self.slices.items(), self.obs_dict.values())}
+
+  def snapshot_flat(self) -> NDArray:
+    '''Copy of the buffer.'''
+    return self.flat.copy()
+
+  def clear(self):
+    '''Sets all observations to zero, so that the ones not written by any component don't keep old values.'''
+    self.flat.fill(0)
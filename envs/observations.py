@@ -4,9 +4,10 @@ from abc import ABC, abstractmethod
 
 from gym import spaces, Space
 
-from common import Entity, GridView, JUMP, DASH, SHOOT
+from common import ArrowPredictor, CHANNELS, Entity, GridView, JUMP, DASH, OccupancyRasterizer, SHOOT, cast_rays, \
+  entity_distance_fields, is_arrow_pickup, is_flying_arrow, is_stuck_arrow, ray_directions
 
-from typing import Any, Dict, List, Mapping, Sequence, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Optional, Tuple, Union
 
 
 class TowerfallObservation(ABC):
@@ -82,7 +83,7 @@ class PlayerObservation(TowerfallObservation):
     try_add_obs('facing', (player['facing'] + 1) // 2) # -1,1 -> 0,1
     try_add_obs('onGround', int(player['onGround']))
     try_add_obs('onWall', int(player['onWall']))
-    try_add_obs('vel', np.clip(player.v.numpy() / 5, -2, 2))
+    try_add_obs('vel', np.clip(player.v.numpy() / 5, -2, 2, out=obs_dict.get('vel')))
 
 
 class GridObservation(TowerfallObservation):
@@ -129,3 +130,193 @@ class GridObservation(TowerfallObservation):
   def _extend_obs(self, obs_dict: Dict[str, Any]):
     if self.add_grid:
       obs_dict['grid'] = self.gv.view(self.sight)
+
+
+class ArrowDangerObservation(TowerfallObservation):
+  '''
+  Shows where the flying arrows will pass in the next frames, in a grid centered at the player.
+  Each cell is 1 if an arrow goes through it in the current frame, decreasing to 0 for arrows that only get there
+  after the prediction horizon.
+
+  :param grid_view: Provides the level grid used to stop arrows at walls.
+  :param sight: Half size in pixels of the map around the player.
+  :param cell_size: Size in pixels of each cell of the map.
+  :param frames: How many frames ahead to predict.
+  '''
+  def __init__(self, grid_view: GridView, sight: Union[Tuple[int, int], int] = 60, cell_size: int = 10, frames: int = 30):
+    if isinstance(sight, int):
+      sight = (sight, sight)
+    self.shape = (2*(sight[0] // cell_size), 2*(sight[1] // cell_size))
+    self.cell_size = cell_size
+    self.gv = grid_view
+    self.predictor = ArrowPredictor(grid_view, frames)
+    self.obs_space = spaces.Box(low=0, high=1, shape=self.shape, dtype=np.float32)
+    self.danger = np.empty(self.shape, dtype=np.float32)
+
+  def extend_obs_space(self, obs_space_dict: Dict[str, Space]):
+    if 'arrow_danger' in obs_space_dict:
+      raise Exception('Observation space already has \'arrow_danger\'')
+    obs_space_dict['arrow_danger'] = self.obs_space
+
+  def post_reset(self, state_scenario: Mapping[str, Any], player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    self.gv.set_scenario(state_scenario)
+    self._extend_obs(player, entities, obs_dict)
+
+  def post_step(self, player: Optional[Entity], entities: List[Entity], command: str, obs_dict: Dict[str, Any]):
+    self._extend_obs(player, entities, obs_dict)
+
+  def _extend_obs(self, player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    if not player:
+      obs_dict['arrow_danger'] = np.zeros(self.shape, dtype=np.float32)
+      return
+    traj, impact = self.predictor.predict_entities([e for e in entities if is_flying_arrow(e)])
+    self.predictor.danger_map((player.p.x, player.p.y), traj, impact, self.shape, self.cell_size, out=self.danger)
+    frames = self.predictor.frames + 1
+    danger = np.divide(self.danger, -frames, out=obs_dict.get('arrow_danger'), dtype=np.float32)
+    danger += 1
+    obs_dict['arrow_danger'] = np.clip(danger, 0, 1, out=danger)
+
+
+class LidarObservation(TowerfallObservation):
+  '''
+  Distances from the player to the closest occupied cell of the grid in evenly spaced directions, including cracked
+  walls. Each value is the distance divided by the range, so 1 means nothing was hit.
+
+  :param grid_view: Provides the grid the rays are cast against.
+  :param n_rays: Amount of rays. The first one points right and they go counterclockwise.
+  :param max_dist: Range of the rays in pixels.
+  '''
+  def __init__(self, grid_view: GridView, n_rays: int = 32, max_dist: float = 120):
+    self.gv = grid_view
+    self.max_dist = max_dist
+    self.directions = ray_directions(n_rays)
+    self.obs_space = spaces.Box(low=0, high=1, shape=(n_rays,), dtype=np.float32)
+
+  def extend_obs_space(self, obs_space_dict: Dict[str, Space]):
+    if 'lidar' in obs_space_dict:
+      raise Exception('Observation space already has \'lidar\'')
+    obs_space_dict['lidar'] = self.obs_space
+
+  def post_reset(self, state_scenario: Mapping[str, Any], player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    self.gv.set_scenario(state_scenario)
+    self.prev_player = None
+    self._extend_obs(player, entities, obs_dict)
+
+  def post_step(self, player: Optional[Entity], entities: List[Entity], command: str, obs_dict: Dict[str, Any]):
+    self._extend_obs(player, entities, obs_dict)
+
+  def _extend_obs(self, player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    player = player or self.prev_player
+    self.prev_player = player
+    if not player:
+      obs_dict['lidar'] = np.ones(len(self.directions), dtype=np.float32)
+      return
+    self.gv.update(entities, player)
+    dist = cast_rays(self.gv.grid, self.gv.gf, (player.p.x, player.p.y), self.directions, self.max_dist)
+    obs_dict['lidar'] = np.divide(dist, self.max_dist, out=obs_dict.get('lidar'), dtype=np.float32)
+
+
+class DistanceFieldObservation(TowerfallObservation):
+  '''
+  Steps through free cells of the grid from each cell to the nearest entity of each category, in a map centered at the
+  player like GridObservation. All categories are searched together in one pass over the grid. Each value is the
+  amount of steps times the cell size divided by the range, so 1 means there is none in range.
+
+  :param grid_view: Provides the grid, including cracked walls, and the cell size.
+  :param sight: Same as in GridObservation.
+  :param categories: Tells for each category whether an entity belongs to it. Defaults to enemies, stuck arrows and
+    arrow pickups.
+  :param max_dist: Range in pixels.
+  '''
+  def __init__(self,
+      grid_view: GridView,
+      sight: Optional[Union[Tuple[int, int], int]] = None,
+      categories: Optional[Mapping[str, Callable[[Entity], bool]]] = None,
+      max_dist: float = 120):
+    self.gv = grid_view
+    if isinstance(sight, int):
+      sight = (sight, sight)
+    self.sight = sight
+    self.categories = categories or {
+      'enemies': lambda e: e.isEnemy,
+      'stuck_arrows': is_stuck_arrow,
+      'arrow_pickups': is_arrow_pickup,
+    }
+    self.max_steps = max(1, int(max_dist // self.gv.gf))
+    m, n = self.gv.view_sight_length(sight)
+    self.shape = (len(self.categories), 2*m, 2*n)
+    self.obs_space = spaces.Box(low=0, high=1, shape=self.shape, dtype=np.float32)
+
+  def extend_obs_space(self, obs_space_dict: Dict[str, Space]):
+    if 'distance_fields' in obs_space_dict:
+      raise Exception('Observation space already has \'distance_fields\'')
+    obs_space_dict['distance_fields'] = self.obs_space
+
+  def post_reset(self, state_scenario: Mapping[str, Any], player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    self.gv.set_scenario(state_scenario)
+    self.prev_player = None
+    self._extend_obs(player, entities, obs_dict)
+
+  def post_step(self, player: Optional[Entity], entities: List[Entity], command: str, obs_dict: Dict[str, Any]):
+    self._extend_obs(player, entities, obs_dict)
+
+  def _extend_obs(self, player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    player = player or self.prev_player
+    self.prev_player = player
+    if not player:
+      obs_dict['distance_fields'] = np.ones(self.shape, dtype=np.float32)
+      return
+    self.gv.update(entities, player)
+    positions = {name: [(e.p.x, e.p.y) for e in entities if belongs(e)] for name, belongs in self.categories.items()}
+    fields = np.stack(list(entity_distance_fields(self.gv.grid, self.gv.gf, positions, self.max_steps).values()))
+    view = self.gv.view_of(fields, self.sight)
+    field = np.divide(view, self.max_steps, out=obs_dict.get('distance_fields'), dtype=np.float32)
+    field[view < 0] = 1
+    obs_dict['distance_fields'] = field
+
+
+class OccupancyObservation(TowerfallObservation):
+  '''
+  Cells occupied by the walls and by each kind of entity, one channel each, in a map centered at the player like
+  GridObservation. The player itself is not in the archers channel.
+
+  :param grid_view: Provides the level walls and the cell size.
+  :param sight: Same as in GridObservation.
+  :param channels: Channels of OccupancyRasterizer, in the order of the observation.
+  '''
+  def __init__(self,
+      grid_view: GridView,
+      sight: Optional[Union[Tuple[int, int], int]] = None,
+      channels: Sequence[str] = CHANNELS):
+    self.gv = grid_view
+    if isinstance(sight, int):
+      sight = (sight, sight)
+    self.sight = sight
+    self.rasterizer = OccupancyRasterizer(grid_view, channels)
+    m, n = self.gv.view_sight_length(sight)
+    self.shape = (len(self.rasterizer.channels), 2*m, 2*n)
+    self.obs_space = spaces.MultiBinary(self.shape)
+
+  def extend_obs_space(self, obs_space_dict: Dict[str, Space]):
+    if 'occupancy' in obs_space_dict:
+      raise Exception('Observation space already has \'occupancy\'')
+    obs_space_dict['occupancy'] = self.obs_space
+
+  def post_reset(self, state_scenario: Mapping[str, Any], player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    self.gv.set_scenario(state_scenario)
+    self.prev_player = None
+    self.rasterizer.exclude_player = player['playerIndex'] if player else None
+    self._extend_obs(player, entities, obs_dict)
+
+  def post_step(self, player: Optional[Entity], entities: List[Entity], command: str, obs_dict: Dict[str, Any]):
+    self._extend_obs(player, entities, obs_dict)
+
+  def _extend_obs(self, player: Optional[Entity], entities: List[Entity], obs_dict: Dict[str, Any]):
+    player = player or self.prev_player
+    self.prev_player = player
+    if not player:
+      obs_dict['occupancy'] = np.zeros(self.shape, dtype=np.int8)
+      return
+    self.gv.update(entities, player)
+    occupancy = self.rasterizer.rasterize([e.e for e in entities])
+    obs_dict['occupancy'] = self.gv.view_of(occupancy, self.sight)
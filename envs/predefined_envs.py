@@ -31,7 +31,7 @@ def create_simple_move_env(configs: Dict[str, Any], record_path: Optional[str]=N
 
 
 def create_kill_enemy(configs: Dict[str, Any], record_path: Optional[str]=None, verbose=0):
-  objective = KillEnemyObjective(**configs['objective_params'])
+  objective = KillEnemyObjective(**configs['objective_params'], grid_factor=2)
   towerfall = Towerfall(
     fastrun=True,
     config=dict(
@@ -0,0 +1,67 @@
+import argparse
+import json
+import logging
+import os
+
+from typing import List
+
+import numpy as np
+
+from common import Entity, GridView, NavigationTable, VisibilityTable, load_level
+from envs.curriculums import FollowCloseTargetCurriculum
+
+# Size of the archer hitbox.
+ARCHER_SIZE = (8, 14)
+
+
+def precompute_level(path: str, out: str, distances: List[int]):
+  '''
+  Writes everything derived from a level that doesn't depend on the state of the game to out/<level name>:
+    scenario.json: The scenario message of the level.
+    arrays.npz: grid10 with the level cells, nav_dist and nav_next, the tables of NavigationTable for the level grid,
+      and visibility, the bits of VisibilityTable. These are loaded with load_level_artifacts. The grids at other
+      resolutions and the masks of FreeSpaceIndex are not written, since they take milliseconds to build.
+    FollowCloseTargetCurriculum_episodes_<distance>.json: Tasks of the curriculum for each distance.
+  '''
+  scenario = load_level(path)
+  level_dir = os.path.join(out, scenario['name'])
+  os.makedirs(level_dir, exist_ok=True)
+  logging.info(f'Precomputing {path} into {level_dir}')
+  with open(os.path.join(level_dir, 'scenario.json'), 'w') as file:
+    json.dump(scenario, file)
+
+  arrays = dict(grid10=np.array(scenario['grid'], dtype=np.int8))
+  navigation = NavigationTable(arrays['grid10'])
+  arrays['nav_dist'] = navigation.dist
+  arrays['nav_next'] = navigation.next_step
+  arrays['visibility'] = VisibilityTable(arrays['grid10'], int(scenario['cellSize'])).bits
+  np.savez_compressed(os.path.join(level_dir, 'arrays.npz'), **arrays)
+
+  spawn = scenario['playerSpawns'][0] if scenario['playerSpawns'] else dict(x=160, y=110)
+  player = Entity(dict(
+    type='archer',
+    pos=spawn,
+    vel=dict(x=0, y=0),
+    size=dict(x=ARCHER_SIZE[0], y=ARCHER_SIZE[1]),
+    isEnemy=False))
+  for distance in distances:
+    filename = os.path.join(level_dir, f'FollowCloseTargetCurriculum_episodes_{distance}.json')
+    curriculum = FollowCloseTargetCurriculum(GridView(1), distance=distance, filename=filename)
+    curriculum.start_ends = curriculum.create_tasks(scenario, player, [player])
+    curriculum.save_tasks(filename)
+
+
+def main(levels: List[str], out: str, distances: List[int]):
+  logging.basicConfig(level=logging.INFO)
+  for path in levels:
+    precompute_level(path, out, distances)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Precomputes the arrays and curriculum tasks of level files offline.')
+  parser.add_argument('levels', nargs='+', help='Level xml files.')
+  parser.add_argument('--out', type=str, default='levels')
+  parser.add_argument('--distances', type=int, nargs='+', default=[20, 100])
+  args = parser.parse_args()
+
+  main(**vars(args))
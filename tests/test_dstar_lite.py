@@ -0,0 +1,83 @@
+import sys
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import DStarLite, Entity, PathGrid, Vec2, distance_fields, load_level
+
+
+def make_entity(x, y):
+  return Entity(dict(type='slime', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+
+
+def check(planner, start, goal, wall):
+  expected = distance_fields(wall, goal[None])[0][start]
+  path = planner.path()
+  if expected < 0:
+    assert path is None and planner.distance() == np.inf
+    return
+  assert planner.distance() == expected
+  assert len(path) == expected + 1 and path[0] == start and goal[path[-1]]
+  W, H = wall.shape
+  for a, b in zip(path[:-1], path[1:]):
+    assert (abs(a[0] - b[0]) % (W - 2)) + (abs(a[1] - b[1]) % (H - 2)) == 1
+    assert not wall[b] or goal[b]
+
+
+def test_repairs_match_search_from_scratch():
+  wall = np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+  free = np.argwhere(wall == 0)
+  rng = np.random.default_rng(0)
+  planner = DStarLite(10, budget=wall.size)
+  start = tuple(free[0])
+  goals = [tuple(free[k]) for k in rng.choice(len(free), 3)]
+  for frame in range(200):
+    # The start and goals move a cell at a time, and now and then a wall breaks or comes back.
+    i, j = start[0] + rng.integers(-1, 2), start[1] + rng.integers(-1, 2)
+    if wall[i % 32, j % 24] == 0:
+      start = (i % 32, j % 24)
+    k = rng.integers(len(goals))
+    i, j = goals[k][0] + rng.integers(-1, 2), goals[k][1] + rng.integers(-1, 2)
+    goals[k] = (i % 32, j % 24)
+    if frame % 10 == 0:
+      i, j = rng.integers(32), rng.integers(24)
+      wall[i, j] = 1 - wall[i, j]
+    if frame % 50 == 0 and len(goals) > 1:
+      goals.pop()
+    goal = np.zeros(wall.shape, dtype=np.bool_)
+    for g in goals:
+      goal[g] = True
+    planner.update(start, goal, wall)
+    check(planner, start, goal, wall)
+  assert planner.repairs > 150 and planner.replans >= 1
+
+
+def test_budget_falls_back_to_replanning():
+  wall = np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+  planner = DStarLite(10, budget=0)
+  goal = np.zeros(wall.shape, dtype=np.bool_)
+  goal[4, 1] = True
+  planner.update((16, 11), goal, wall)
+  goal[4, 1] = False
+  goal[27, 1] = True
+  assert not planner.update((16, 11), goal, wall)
+  assert planner.replans == 2 and planner.repairs == 0
+  check(planner, (16, 11), goal, wall)
+
+
+def test_closest_entity_like_path_grid():
+  wall = np.array(load_level('level_sample.xml')['grid'])
+  free = np.argwhere(wall == 0)
+  rng = np.random.default_rng(1)
+  planner = DStarLite(10)
+  path_grid = PathGrid(10)
+  entities = [make_entity(*((free[k] + 0.5) * 10)) for k in rng.choice(len(free), 4)]
+  for _ in range(20):
+    start = Vec2(*((free[rng.integers(len(free))] + 0.5) * 10))
+    e, path = planner.get_closest_entity(start, entities, wall)
+    expected, expected_path = path_grid.get_closest_entity(start, entities, wall)
+    if expected is None:
+      assert e is None and path is None
+      continue
+    assert path.end.depth == expected_path.end.depth
+    assert (path.end.i, path.end.j) == (int(e.p.x // 10), int(e.p.y // 10))
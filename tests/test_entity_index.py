@@ -0,0 +1,21 @@
+import sys
+
+sys.path.insert(0, '.')
+
+from common import EntityIndex, to_entities
+
+from tests.fixtures import make_update
+
+
+def test_entity_index():
+  entities = to_entities(make_update(n_arrows=50, n_enemies=3, n_archers=2)['entities'])
+  entity_index = EntityIndex(entities)
+
+  assert len(entity_index.of_type('arrow')) == 50
+  assert entity_index.of_type('dragon') == []
+  assert [e['id'] for e in entity_index.enemies] == [e['id'] for e in entities if e['isEnemy']]
+  for e in entities:
+    assert entity_index.get(e['id']) is e
+  assert entity_index.get(10000) is None
+  assert entity_index.archer(1)['playerIndex'] == 1
+  assert entity_index.archer(2) is None
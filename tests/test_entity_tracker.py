@@ -0,0 +1,78 @@
+import copy
+import sys
+
+sys.path.insert(0, '.')
+
+from common import (ArrowsChangedEvent, DespawnedEvent, EntityIndex,
+                    EntityTracker, SpawnedEvent, StateChangedEvent,
+                    to_entities)
+
+from tests.fixtures import make_entity
+from envs.kill_enemy_objective import KillEnemyObjective
+
+
+def frame(*entities):
+  return EntityIndex(to_entities(copy.deepcopy(list(entities))))
+
+
+def test_entity_tracker():
+  tracker = EntityTracker(capacity=2)
+  archer = make_entity(0, 'archer', playerIndex=0, arrows=['normal'])
+  arrow = make_entity(1, 'arrow', state='flying')
+  slime = make_entity(2, 'slime', isEnemy=True)
+
+  events = tracker.update(frame(archer, arrow, slime))
+  assert sorted(e.id for e in events if isinstance(e, SpawnedEvent)) == [0, 1, 2]
+  assert tracker.age_of(2) == 0
+
+  arrow['state'] = 'stuck'
+  archer['arrows'] = []
+  events = tracker.update(frame(archer, arrow))
+  state_changed = tracker.of_type(StateChangedEvent)
+  assert len(state_changed) == 1
+  assert (state_changed[0].id, state_changed[0].prev_state, state_changed[0].state) == (1, 'flying', 'stuck')
+  arrows_changed = tracker.of_type(ArrowsChangedEvent)
+  assert len(arrows_changed) == 1 and arrows_changed[0].delta == -1
+  assert [e.id for e in tracker.of_type(DespawnedEvent)] == [2]
+  assert tracker.age_of(2) == -1
+  assert tracker.age_of(0) == 1
+
+  events = tracker.update(frame(archer, arrow, make_entity(3, 'slime'), make_entity(4, 'slime')))
+  assert [e.id for e in events] == [3, 4]
+  assert tracker.age_of(1) == 2
+  assert tracker.last_seen_of(1) == 2
+  assert tracker.age_of(4) == 0
+
+  tracker.reset()
+  assert len(tracker.update(frame(archer))) == 1
+
+
+class _Env:
+  def __init__(self):
+    self.tracker = EntityTracker()
+
+
+def test_kill_reward():
+  env = _Env()
+  objective = KillEnemyObjective(enemy_count=2, bounty=5, episode_max_len=3)
+  objective.env = env
+  archer = make_entity(0, 'archer', playerIndex=0, arrows=[])
+  slimes = [make_entity(1, 'slime', isEnemy=True), make_entity(2, 'slime', isEnemy=True)]
+  env.tracker.update(frame(archer, *slimes))
+  objective.target_ids = {1, 2}
+  objective.episode_len = 0
+  objective.done = False
+
+  env.tracker.update(frame(archer, *slimes))
+  objective._update_reward(archer)
+  assert objective.rew == 0 and not objective.done
+
+  env.tracker.update(frame(archer, slimes[1]))
+  objective._update_reward(archer)
+  assert objective.rew == 5 and not objective.done
+
+  # A kill in the frame the episode times out gets the bounty without the penalty.
+  objective.episode_len = 3
+  env.tracker.update(frame(archer))
+  objective._update_reward(archer)
+  assert objective.rew == 5 and objective.done
@@ -0,0 +1,110 @@
+import sys
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from tests.fixtures import make_entity
+from common import Entity, EntityIndex, FreeSpaceIndex, GridView, level_free_space, load_level, to_entities
+from envs.kill_enemy_objective import KillEnemyObjective
+
+
+def make_grid_view(gf=2):
+  gv = GridView(gf)
+  gv.set_scenario(load_level('level_sample.xml'))
+  return gv
+
+
+def test_valid_positions_match_region_queries():
+  gv = make_grid_view()
+  index = FreeSpaceIndex(gv, (8, 14), on_floor=True)
+  assert len(index) > 0
+  half = np.array([4, 7])
+  assert not gv.is_region_collision_batch(index.positions - half, index.positions + half).any()
+  feet = index.positions - half
+  assert gv.is_region_collision_batch(feet - [0, 10], feet + [8, 0]).all()
+  assert index.is_valid(index.positions).all()
+  # A flying body fits in more places than a standing one.
+  assert index.mask.sum() < FreeSpaceIndex(gv, (8, 14)).mask.sum()
+
+
+def test_reachable_is_connected_subset():
+  gv = make_grid_view()
+  free = FreeSpaceIndex(gv, (8, 14))
+  reachable = FreeSpaceIndex(gv, (8, 14), reachable_from=(160, 130))
+  assert (reachable.mask <= free.mask).all()
+  assert reachable.mask[reachable.cell_of((160, 130))]
+  # Every reachable cell has a reachable neighbour.
+  m = reachable.mask
+  neighbours = np.roll(m, 1, 0) | np.roll(m, -1, 0) | np.roll(m, 1, 1) | np.roll(m, -1, 1)
+  assert (neighbours[m]).all()
+
+
+def test_sample_and_sample_near():
+  gv = make_grid_view()
+  index = FreeSpaceIndex(gv, (5, 5), seed=0)
+  samples = index.sample(200)
+  assert samples.shape == (200, 2)
+  assert index.is_valid(samples).all()
+  assert index.sample().shape == (2,)
+  near = index.sample_near((160, 110), 20, 40, n=100)
+  size = np.array([320, 240])
+  d = (near - (160, 110) + size / 2) % size - size / 2
+  dist = np.hypot(*d.T)
+  assert ((dist >= 20) & (dist <= 40)).all()
+  assert index.sample_near((160, 110), 1000, 2000) is None
+  # A band with a single position is only found looking at all of them.
+  p = index.positions[7]
+  assert (index.sample_near(p, 0, 1e-9, n=3) == p).all()
+  assert index.sample_near(p, 0, 1e-9).shape == (2,)
+
+  # Without replacement every position is different, and a band with too few positions gives None.
+  unique = index.sample_near((160, 110), 20, 40, n=50, replace=False)
+  assert len(np.unique(unique, axis=0)) == 50
+  band = index.sample_near(p, 0, 2.1, n=4, replace=False)
+  assert len(np.unique(band, axis=0)) == 4
+  assert index.sample_near(p, 0, 2.1, n=5, replace=False) is None
+
+
+def test_weighted_sampling_follows_weights():
+  gv = make_grid_view(5)
+  weights = np.zeros(gv.grid.shape)
+  index = FreeSpaceIndex(gv, (5, 5), seed=1)
+  a, b = index.cells[:2]
+  weights.ravel()[a] = 1
+  weights.ravel()[b] = 3
+  index.set_weights(weights)
+  samples = index.sample(4000)
+  picked_b = (samples == index.positions[1]).all(axis=1).mean()
+  assert ((samples == index.positions[0]).all(axis=1) | (samples == index.positions[1]).all(axis=1)).all()
+  assert abs(picked_b - 0.75) < 0.05
+
+
+def test_level_free_space_is_cached():
+  scenario = load_level('level_sample.xml')
+  assert level_free_space(scenario, 5) is level_free_space(scenario, 5)
+  assert level_free_space(scenario, 5) is not level_free_space(scenario, 5, on_floor=True)
+
+
+class _Env:
+  def __init__(self, entities):
+    self.entity_index = EntityIndex(to_entities(entities))
+
+
+def test_kill_enemy_placement_follows_level():
+  scenario = load_level('level_sample.xml')
+  grid = np.zeros((32, 24), dtype=np.int8)
+  grid[:, :5] = 1
+  floor = dict(scenario, grid=grid.tolist())
+  objective = KillEnemyObjective(enemy_count=2, grid_factor=5)
+  objective.env = _Env([make_entity(1, 'slime', isEnemy=True)])
+  # The first reset happens before the level is known.
+  assert len(objective.get_reset_entities()) == 3
+  objective.post_reset(floor, Entity(make_entity(0, 'archer')), [], {})
+  index = objective.free_space
+  assert index is level_free_space(floor, 5, (10, 10), on_floor=True, reachable_from=(160, 110))
+  enemies = [e['pos'] for e in objective.get_reset_entities()[1:]]
+  assert len(enemies) == 2 and index.is_valid([(e['x'], e['y']) for e in enemies]).all()
+  assert enemies[0] != enemies[1]
+
+  objective.post_reset(scenario, Entity(make_entity(0, 'archer')), [], {})
+  assert objective.free_space is not index
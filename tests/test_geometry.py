@@ -0,0 +1,26 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import Vec2, bounded, geometry, grid_pos
+
+
+def test_displacement_wraps():
+  d = geometry.displacement((10, 10), [(310, 10), (20, 230), (170, 130)])
+  assert np.allclose(d, [(-20, 0), (10, -20), (160 - 320, 120 - 240)])
+  assert np.allclose(geometry.displacement((10, 10), (310, 10), wrap_around=False), (300, 0))
+  assert np.allclose(geometry.distance((0, 0), [(316, 237)]), [5])
+  assert np.all(np.abs(geometry.normalized_displacement((0, 0), np.random.uniform(-500, 500, (100, 2)))) <= 1)
+
+
+def test_scalar_wrappers():
+  assert bounded(-1, 0, 32) == 31
+  assert bounded(32, 0, 32) == 0
+  assert bounded(5, 0, 32) == 5
+  assert grid_pos(Vec2(325, -3), 10) == (0, 23)
+  assert grid_pos(Vec2(25, 13), 10, cap=False) == (2, 1)
+  assert grid_pos(Vec2(-0.5, -10.5), 10, cap=False) == (0, -1)
+  i, j = geometry.grid_cells(np.array([[325, -3], [25, 13]]), 10)
+  assert list(i) == [0, 2] and list(j) == [23, 1]
@@ -0,0 +1,109 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import HEIGHT, HH, HW, WIDTH, Entity, GridView, Vec2, crop_grid, fill_grid, upsample_grid
+
+
+def upsample_loop(grid10, csize, gf):
+  '''The python loop GridView.set_scenario used before.'''
+  grid = np.zeros((WIDTH // gf, HEIGHT // gf), dtype=np.int8)
+  for i in range(grid10.shape[0]):
+    for j in range(grid10.shape[1]):
+      if grid10[i][j] == 1:
+        grid[csize*i // gf:csize*(i+1) // gf, csize*j // gf:csize*(j+1) // gf] = 1
+  return grid
+
+
+def test_upsample_matches_loop():
+  rng = np.random.default_rng(0)
+  grid10 = (rng.random((32, 24)) < 0.3).astype(np.int8)
+  for gf in [1, 2, 4, 5, 8, 10, 20, 40]:
+    assert np.array_equal(upsample_grid(grid10, 10, gf), upsample_loop(grid10, 10, gf)), gf
+
+
+def test_set_scenario_reuses_read_only_grids():
+  grid = np.zeros((32, 24), dtype=int)
+  grid[:, 0] = 1
+  a = GridView(5)
+  b = GridView(5)
+  a.set_scenario(dict(grid=grid.tolist(), cellSize=10))
+  b.set_scenario(dict(grid=grid.tolist(), cellSize=10))
+  assert a.fixed_grid is b.fixed_grid
+  assert a.fixed_grid10 is b.fixed_grid10
+  assert not a.fixed_grid.flags.writeable
+  assert a.fixed_grid[:, :2].all() and not a.fixed_grid[:, 2:].any()
+
+  c = GridView(10)
+  c.set_scenario(dict(grid=grid.tolist(), cellSize=10))
+  assert c.fixed_grid is not a.fixed_grid
+  grid[3, 5] = 1
+  a.set_scenario(dict(grid=grid.tolist(), cellSize=10))
+  assert a.fixed_grid is not b.fixed_grid
+  assert a.fixed_grid[6:8, 10:12].all()
+
+
+def make_wall(x, y, w=10, h=10):
+  return Entity(dict(type='crackedWall', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=w, y=h), isEnemy=False))
+
+
+def update_roll(gv, entities, me):
+  '''The copy and roll GridView.update used before.'''
+  grid = gv.fixed_grid.copy()
+  for e in entities:
+    if e.type == 'crackedWall':
+      fill_grid(e, grid)
+  shifted = np.roll(grid, -int(me.p.x - HW) // gv.gf, axis=0)
+  return grid, np.roll(shifted, -int(me.p.y - HH) // gv.gf, axis=1)
+
+
+def test_update_matches_roll():
+  rng = np.random.default_rng(1)
+  grid10 = (rng.random((32, 24)) < 0.2).astype(int)
+  for gf in [2, 5, 10]:
+    gv = GridView(gf)
+    gv.set_scenario(dict(grid=grid10.tolist(), cellSize=10))
+    walls = [make_wall(*rng.uniform((0, 0), (WIDTH, HEIGHT))) for _ in range(6)]
+    # Walls over the edges and a wall that is narrower than a cell.
+    walls += [make_wall(0, 0), make_wall(WIDTH - 2, 50), make_wall(40, HEIGHT - 1, 3, 3)]
+    for frame in range(40):
+      # Walls break and disappear, so cells must be restored.
+      entities = [w for w in walls if rng.random() < 0.7]
+      me = make_wall(*rng.uniform((-20, -20), (WIDTH + 20, HEIGHT + 20)))
+      me.type = 'archer'
+      gv.update(entities, me)
+      grid, shifted = update_roll(gv, entities, me)
+      assert np.array_equal(gv.grid, grid), (gf, frame)
+      assert np.array_equal(gv.shifted_grid, shifted), (gf, frame)
+      assert np.array_equal(gv.view(50), shifted[WIDTH//gf//2 - 50//gf:WIDTH//gf//2 + 50//gf, HEIGHT//gf//2 - 50//gf:HEIGHT//gf//2 + 50//gf])
+      assert np.shares_memory(gv.view(50), gv.tiled_grid)
+
+
+def region_collision_crop(gv, bl, tr):
+  '''The crop_grid based check GridView.is_region_collision used before.'''
+  crop = crop_grid(bl, tr, gv.grid)
+  if crop.shape[1] == 0:
+    return True
+  return crop.max() != 0
+
+
+def test_region_collision_matches_crop():
+  rng = np.random.default_rng(2)
+  grid10 = (rng.random((32, 24)) < 0.1).astype(int)
+  for gf in [2, 5]:
+    gv = GridView(gf)
+    gv.set_scenario(dict(grid=grid10.tolist(), cellSize=10))
+    me = make_wall(100, 100)
+    for frame in range(3):
+      gv.update([make_wall(*rng.uniform((0, 0), (WIDTH, HEIGHT))) for _ in range(3)], me)
+      bl = rng.uniform((-WIDTH, -HEIGHT), (2*WIDTH, 2*HEIGHT), size=(500, 2))
+      size = rng.uniform(10, 40, size=(500, 2))
+      size[:10] = rng.uniform(WIDTH, 2*WIDTH, size=(10, 2))  # Bigger than the arena
+      size[10:20, 1] = 0  # Empty in y
+      tr = bl + size
+      expected = [region_collision_crop(gv, Vec2(*a), Vec2(*b)) for a, b in zip(bl, tr)]
+      actual = [gv.is_region_collision(Vec2(*a), Vec2(*b)) for a, b in zip(bl, tr)]
+      assert actual == expected, (gf, frame)
+      assert gv.is_region_collision_batch(bl, tr).tolist() == expected
@@ -0,0 +1,105 @@
+import sys
+sys.path.insert(0, '.')
+
+import numpy as np
+import pytest
+
+from common import GridView, cast_rays, kernels, load_level, set_backend
+from common.kernels import _bfs_deque, bfs_kernel, cast_rays_kernel, fill_rects_kernel
+from common.raycast import _CORNER_EPS
+
+
+def make_blocked(gf=5):
+  gv = GridView(gf)
+  gv.set_scenario(load_level('level_sample.xml'))
+  return gv.grid
+
+
+def run_bfs(search, blocked, start, goal):
+  shape = blocked.shape
+  stamp = np.zeros(shape, dtype=np.int32)
+  parent = np.zeros(shape, dtype=np.int32)
+  dist = np.zeros(shape, dtype=np.int32)
+  queue = np.zeros(blocked.size, dtype=np.int32)
+  if search is bfs_kernel:
+    found = bfs_kernel(blocked, start[0], start[1], goal, stamp, 1, parent, dist, queue)
+  else:
+    found = search(blocked, start, goal, stamp, 1, parent, dist)
+  return found, stamp == 1, parent, dist
+
+
+def path(found, parent):
+  cells = [found]
+  while parent.flat[cells[-1]] != -1:
+    cells.append(parent.flat[cells[-1]])
+  return cells
+
+
+def test_bfs_backends_match():
+  blocked = make_blocked()
+  free = np.argwhere(blocked == 0)
+  rng = np.random.default_rng(0)
+  for start in free[rng.choice(len(free), 5)]:
+    # Without goals every reachable cell is visited.
+    no_goal = np.zeros(blocked.shape, dtype=np.bool_)
+    f1, r1, p1, d1 = run_bfs(bfs_kernel, blocked, tuple(start), no_goal)
+    f2, r2, p2, d2 = run_bfs(_bfs_deque, blocked, tuple(start), no_goal)
+    assert f1 == f2 == -1
+    assert (r1 == r2).all()
+    assert (p1[r1] == p2[r2]).all() and (d1[r1] == d2[r2]).all()
+
+    goal = np.zeros(blocked.shape, dtype=np.bool_)
+    goal.flat[rng.choice(blocked.size, 20)] = True
+    f1, r1, p1, d1 = run_bfs(bfs_kernel, blocked, tuple(start), goal)
+    f2, r2, p2, d2 = run_bfs(_bfs_deque, blocked, tuple(start), goal)
+    assert f1 == f2
+    if f1 != -1:
+      assert path(f1, p1) == path(f2, p2)
+      assert d1.flat[f1] == d2.flat[f2] == len(path(f1, p1)) - 1
+
+
+def test_cast_rays_backends_match():
+  rng = np.random.default_rng(1)
+  for gf in [1, 5]:
+    grid = make_blocked(gf)
+    o = rng.uniform(0, [320, 240], size=(300, 2))
+    # Integer directions go through corners of the cells.
+    d = np.concatenate([rng.normal(size=(200, 2)), rng.integers(-2, 3, size=(100, 2))])
+    max_dist = rng.uniform(0, 200, size=300)
+    expected = cast_rays(grid, gf, o, d, max_dist)
+    length = np.sqrt((d**2).sum(axis=1, keepdims=True))
+    u = d / np.where(length == 0, 1, length)
+    out = np.empty(300)
+    cast_rays_kernel(grid, gf, o, u, max_dist, _CORNER_EPS, out)
+    assert (out == expected).all()
+
+
+def test_fill_rects_matches_scatter():
+  rng = np.random.default_rng(2)
+  out = np.zeros((3, 16, 12), dtype=np.int8)
+  channel = rng.integers(0, 3, size=20)
+  x1 = rng.integers(0, 16, size=20)
+  y1 = rng.integers(0, 12, size=20)
+  w = rng.integers(0, 6, size=20)
+  h = rng.integers(0, 6, size=20)
+  fill_rects_kernel(out, channel, x1, y1, w, h)
+  expected = np.zeros_like(out)
+  for c, i, j, a, b in zip(channel, x1, y1, w, h):
+    for di in range(a):
+      for dj in range(b):
+        expected[c, (i + di) % 16, (j + dj) % 12] = 1
+  assert (out == expected).all()
+
+
+def test_backend_selection(monkeypatch):
+  monkeypatch.setenv('TOWERFALL_KERNELS', 'numpy')
+  assert kernels.get_backend() == 'numpy'
+  assert kernels.compiled(bfs_kernel) is None
+  if kernels.numba is None:
+    monkeypatch.delenv('TOWERFALL_KERNELS')
+    assert kernels.get_backend() == 'numpy'
+    with pytest.raises(Exception):
+      set_backend('numba')
+  set_backend('numpy')
+  assert kernels.get_backend() == 'numpy'
+  set_backend(None)
@@ -0,0 +1,68 @@
+import sys
+sys.path.insert(0, '.')
+
+import json
+import os
+
+import numpy as np
+
+from common import GridView, level_navigation, level_visibility, load_level, load_level_artifacts, parse_bitstring
+from envs.curriculums import TaskDecoder
+from precompute_levels import precompute_level
+
+
+def test_parse_bitstring_orientation():
+  grid = parse_bitstring('''
+    110
+    001
+  ''')
+  assert grid.shape == (3, 2)
+  # The first row is the top of the screen, which has the largest j.
+  assert grid[:, 1].tolist() == [1, 1, 0]
+  assert grid[:, 0].tolist() == [0, 0, 1]
+
+
+def test_load_level_sample():
+  scenario = load_level('level_sample.xml')
+  grid = np.array(scenario['grid'])
+  assert scenario['type'] == 'scenario'
+  assert scenario['cellSize'] == 10
+  assert grid.shape == (32, 24)
+  # Top rows of the Solids layer of the sample.
+  assert grid[:, 23].tolist() == [int(c) for c in '11111001111111100111111110011111']
+  assert grid[:, 22].tolist() == [int(c) for c in '11111000000011100111000000011111']
+  assert len(scenario['playerSpawns']) > 0
+  for spawn in scenario['playerSpawns']:
+    assert 0 <= spawn['x'] < 320 and 0 <= spawn['y'] < 240
+
+  gv = GridView(2)
+  gv.set_scenario(scenario)
+  assert gv.fixed_grid.shape == (160, 120)
+
+
+def test_level_spawns_are_free():
+  scenario = load_level('level_sample.xml')
+  gv = GridView(1)
+  gv.set_scenario(scenario)
+  spawns = np.array([[s['x'], s['y']] for s in scenario['playerSpawns']])
+  # Spawns stand on the floor, so the archer above them is free.
+  assert not gv.is_region_collision_batch(spawns + [-4, 1], spawns + [4, 14]).any()
+
+
+def test_precompute_level_sample(tmp_path):
+  precompute_level('level_sample.xml', str(tmp_path), [20])
+  level_dir = os.path.join(str(tmp_path), 'level_sample')
+  with open(os.path.join(level_dir, 'FollowCloseTargetCurriculum_episodes_20.json')) as file:
+    tasks = json.loads(file.read(), cls=TaskDecoder)
+  assert len(tasks) > 0
+  gv = GridView(1)
+  gv.set_scenario(load_level('level_sample.xml'))
+  starts = np.array([[s.x, s.y] for s, _ in tasks])
+  assert not gv.is_region_collision_batch(starts - [4, 7], starts + [4, 7]).any()
+
+  # Everything written is read back by the level tables.
+  arrays = load_level_artifacts(level_dir)
+  wall = arrays['grid10']
+  assert (level_navigation(wall, arrays).dist == arrays['nav_dist']).all()
+  assert (level_visibility(wall, 10, arrays).bits == arrays['visibility']).all()
+  assert set(arrays) == {'grid10', 'nav_dist', 'nav_next', 'visibility'}
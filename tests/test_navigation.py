@@ -0,0 +1,196 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+
+import numpy as np
+
+from common import (Entity, GridView, NavigationTable, SharedLevelCache, all_pairs_distances, distance_fields,
+                    entity_distance_fields, kernels, level_navigation, load_level, path_queries, use_shared_level_cache)
+from envs.objectives import FollowTargetObjective
+from envs.observations import DistanceFieldObservation
+
+
+def make_wall():
+  return np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+
+
+def bfs_distances(wall, start):
+  shape = wall.shape
+  stamp = np.zeros(shape, dtype=np.int32)
+  parent = np.zeros(shape, dtype=np.int32)
+  dist = np.zeros(shape, dtype=np.int32)
+  kernels.bfs(wall, start, np.zeros(shape, dtype=np.bool_), stamp, 1, parent, dist, np.zeros(wall.size, dtype=np.int32))
+  return np.where(stamp == 1, dist, -1)
+
+
+def test_distances_match_bfs():
+  wall = make_wall()
+  table = NavigationTable(wall)
+  rng = np.random.default_rng(0)
+  for i, j in zip(rng.integers(0, 32, 40), rng.integers(0, 24, 40)):
+    expected = bfs_distances(wall, (i, j))
+    # Searching from a cell gives the distances from it, which are the distances to it for free cells.
+    from_cell = table.dist[:, table.index((i, j))].reshape(wall.shape)
+    assert (from_cell == expected).all() or wall[i, j] != 0
+    if wall[i, j] == 0:
+      assert (table.distances_to((i, j))[wall == 0] == expected[wall == 0]).all()
+
+
+def test_blocked_cells():
+  wall = np.zeros((6, 4), dtype=np.int8)
+  wall[2, :] = 1
+  wall[3, 1] = 1
+  dist = all_pairs_distances(wall)
+  # Blocked targets can't be reached.
+  assert (dist[2 * 4 + 1] == -1).sum() == 23
+  # From a blocked cell the path starts through a free neighbour.
+  assert dist[0 * 4 + 0, 2 * 4 + 0] == 2
+  assert dist[5 * 4 + 0, 2 * 4 + 0] == 3
+  assert dist[3 * 4 + 1, 3 * 4 + 1] == 0
+
+
+def test_next_step_and_path():
+  wall = make_wall()
+  table = level_navigation(wall)
+  free = [tuple(c) for c in np.argwhere(wall == 0)]
+  rng = np.random.default_rng(1)
+  for _ in range(50):
+    source = free[rng.integers(len(free))]
+    target = free[rng.integers(len(free))]
+    path = table.path(source, target)
+    d = table.distance(source, target)
+    if d < 0:
+      assert path is None and table.next_cell(source, target) is None
+      continue
+    assert len(path) == d + 1 and path[0] == source and path[-1] == target
+    for a, b in zip(path[:-1], path[1:]):
+      assert wall[b] == 0
+      assert (abs(a[0] - b[0]) % 30) + (abs(a[1] - b[1]) % 22) == 1
+    assert table.next_cell(source, target) == (path[1] if d > 0 else None)
+  targets = free[:5]
+  k = table.closest(free[100], targets)
+  assert table.distance(free[100], targets[k]) == min(
+    table.distance(free[100], t) for t in targets if table.distance(free[100], t) >= 0)
+  assert table.closest(free[100], []) == -1
+
+
+def test_batched_queries():
+  wall = make_wall()
+  table = level_navigation(wall)
+  rng = np.random.default_rng(3)
+  sources = np.stack([rng.integers(0, 32, 500), rng.integers(0, 24, 500)], axis=1)
+  targets = np.stack([rng.integers(0, 32, 500), rng.integers(0, 24, 500)], axis=1)
+  targets[:10] = sources[:10]
+  directions, dist = table.query(sources, targets)
+  for (si, sj), (ti, tj), d, n in zip(sources, targets, directions, dist):
+    assert n == table.distance((si, sj), (ti, tj))
+    next = table.next_cell((si, sj), (ti, tj))
+    if next is None:
+      assert (d == 0).all()
+    else:
+      assert next == ((si + d[0]) % 32, (sj + d[1]) % 24)
+  directions, dist = path_queries(wall, 10, sources * 10 + 5, targets * 10 + 5)
+  assert (dist == table.query(sources, targets)[1]).all()
+
+
+def test_path_reward():
+  gv = GridView(5)
+  gv.set_scenario(load_level('level_sample.xml'))
+  player = Entity(dict(type='archer', pos=dict(x=160, y=130), vel=dict(x=0, y=0), size=dict(x=8, y=14), isEnemy=False))
+  objective = FollowTargetObjective(gv, max_distance=300, path_reward=True)
+  objective.set_target(player, 40, 20)
+  table = level_navigation(gv.fixed_grid10)
+  steps = table.distance((16, 13), (4, 2))
+  directions, _ = table.query([(16, 13)], [(4, 2)])
+  di, dj = directions[0].tolist()
+  # From the player to the center of the next cell, then cell to cell, then from the center of the target cell.
+  expected = np.hypot(165 + 10 * di - 160, 135 + 10 * dj - 130) + (steps - 1) * 10 + np.hypot(5, 5)
+  assert abs(objective.prev_rew_len - expected) < 1e-6
+  assert objective.prev_rew_len > objective.prev_disp_len
+
+  # Walking along the path from the center of the cell gets a pixel closer per pixel, also when crossing into the next
+  # cell, instead of jumping a whole cell.
+  prev = None
+  for k in range(15):
+    p = Entity(dict(type='archer', pos=dict(x=165 + k * di, y=135 + k * dj), vel=dict(x=0, y=0), size=dict(x=8, y=14),
+                    isEnemy=False))
+    d = objective._get_reward_distance(p, 0)
+    assert prev is None or abs(prev - d - 1) < 1e-6
+    prev = d
+
+
+def test_precomputed_and_shared():
+  wall = make_wall()
+  wall[0, 0] = 1 - wall[0, 0]
+  table = NavigationTable(wall)
+  arrays = dict(grid10=wall, nav_dist=table.dist, nav_next=table.next_step)
+  cache = SharedLevelCache(f'nav{os.getpid()}')
+  use_shared_level_cache(cache)
+  try:
+    shared = level_navigation(wall, arrays)
+    assert not shared.dist.flags.writeable
+    assert (shared.dist == table.dist).all() and (shared.next_step == table.next_step).all()
+    assert level_navigation(wall) is shared
+  finally:
+    use_shared_level_cache(None)
+    cache.unlink()
+
+
+def test_distance_fields_match_bfs():
+  wall = make_wall()
+  rng = np.random.default_rng(2)
+  free = np.argwhere(wall == 0)
+  sources = np.zeros((3,) + wall.shape, dtype=np.bool_)
+  groups = [free[rng.integers(len(free), size=k)] for k in (1, 4, 9)]
+  for c, cells in enumerate(groups):
+    sources[c, cells[:, 0], cells[:, 1]] = True
+  fields = distance_fields(wall, sources)
+  for c, cells in enumerate(groups):
+    each = np.stack([bfs_distances(wall, tuple(cell)) for cell in cells]).astype(np.int32)
+    each[each < 0] = 10**6
+    expected = each.min(axis=0)
+    expected[expected == 10**6] = -1
+    assert (fields[c][wall == 0] == expected[wall == 0]).all()
+  capped = distance_fields(wall, sources, max_steps=5)
+  assert ((capped == fields) | ((capped == -1) & (fields > 5))).all()
+
+
+def test_distance_fields_blocked_sources():
+  wall = np.zeros((6, 4), dtype=np.int8)
+  wall[2, :] = 1
+  sources = np.zeros((1, 6, 4), dtype=np.bool_)
+  # An arrow stuck in the wall is reached from both sides.
+  sources[0, 2, 1] = True
+  field = distance_fields(wall, sources)[0]
+  assert field[2, 1] == 0
+  assert field[1, 1] == 1 and field[3, 1] == 1
+  assert field[4, 1] == 2 and field[0, 1] == 2 and field[5, 1] == 3
+  # Blocked cells next to it step into it, others go through their free neighbours.
+  assert field[2, 0] == 1 and field[2, 2] == 1
+  assert field[2, 3] == 4
+
+
+def test_entity_distance_fields():
+  wall = make_wall()
+  fields = entity_distance_fields(wall, 10, dict(enemies=[(165, 135), (45, 45)], arrows=np.zeros((0, 2))))
+  assert fields['enemies'][16, 13] == 0 and fields['enemies'][4, 4] == 0
+  assert (fields['arrows'] == -1).all()
+
+
+def test_distance_field_observation():
+  scenario = load_level('level_sample.xml')
+  player = Entity(dict(type='archer', pos=dict(x=160, y=130), vel=dict(x=0, y=0), size=dict(x=8, y=14), isEnemy=False))
+  slime = Entity(dict(type='slime', pos=dict(x=185, y=135), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+  obs = DistanceFieldObservation(GridView(5), sight=50, max_dist=100)
+  space = {}
+  obs.extend_obs_space(space)
+  obs_dict = {}
+  obs.post_reset(scenario, player, [player, slime], obs_dict)
+  field = obs_dict['distance_fields']
+  assert field.shape == space['distance_fields'].shape == (3, 20, 20)
+  assert field.dtype == np.float32 and field.min() >= 0 and field.max() <= 1
+  assert (field[1:] == 1).all()
+  # The player is at the center of the view.
+  assert 0 < field[0, 10, 10] < 1
+  assert field[0, 10 + 5, 10 + 1] == 0
@@ -0,0 +1,95 @@
+import sys
+sys.path.insert(0, '.')
+
+import copy
+import pickle
+
+import numpy as np
+import pytest
+
+from gym import spaces
+
+from common import Entity, GridView, load_level
+from envs import (ArrowDangerObservation, DistanceFieldObservation, FollowTargetObjective, GridObservation,
+                  LidarObservation, ObservationBuffer, PlayerObservation)
+
+
+def make_player():
+  return Entity(dict(type='archer', pos=dict(x=160, y=130), vel=dict(x=3, y=-12), size=dict(x=8, y=14), isEnemy=False,
+                     dodgeCooldown=False, state='normal', facing=1, onGround=True, onWall=False))
+
+
+def make_components():
+  gv = GridView(5)
+  return [
+    PlayerObservation(),
+    GridObservation(gv, sight=50),
+    ArrowDangerObservation(gv),
+    LidarObservation(gv),
+    DistanceFieldObservation(gv, sight=50),
+    FollowTargetObjective(gv),
+  ]
+
+
+def fill(components, obs_dict):
+  scenario = load_level('level_sample.xml')
+  player = make_player()
+  slime = Entity(dict(type='slime', pos=dict(x=185, y=135), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+  arrow = Entity(dict(type='arrow', pos=dict(x=120, y=130), vel=dict(x=4, y=0), size=dict(x=8, y=2), isEnemy=False,
+                      state='shooting'))
+  for c in components:
+    if isinstance(c, FollowTargetObjective):
+      c.post_reset(scenario, player, [player, slime, arrow], obs_dict, target=(40, 20))
+    else:
+      c.post_reset(scenario, player, [player, slime, arrow], obs_dict)
+
+
+def test_buffer_matches_dict():
+  expected = {}
+  fill(make_components(), expected)
+  components = make_components()
+  obs_space = {}
+  for c in components:
+    c.extend_obs_space(obs_space)
+  buffer = ObservationBuffer(spaces.Dict(obs_space))
+  fill(components, buffer.obs_dict)
+  assert set(buffer.obs_dict) == set(expected)
+  for key, value in expected.items():
+    view = buffer.obs_dict[key]
+    assert view.shape == np.shape(value) and np.shares_memory(view, buffer.flat)
+    assert np.allclose(view, value), key
+  assert buffer.flat_space.contains(buffer.flat)
+  assert buffer.flat.size == sum(int(np.prod(np.shape(v))) for v in expected.values())
+
+
+def test_slices_and_bounds():
+  space = spaces.Dict(dict(a=spaces.Discrete(3, start=1), b=spaces.MultiBinary((2, 2)),
+                           c=spaces.Box(low=-2, high=2, shape=(3,), dtype=np.float32)))
+  buffer = ObservationBuffer(space)
+  assert [buffer.slices[k] for k in 'abc'] == [slice(0, 1), slice(1, 5), slice(5, 8)]
+  assert (buffer.flat_space.low == [1, 0, 0, 0, 0, -2, -2, -2]).all()
+  assert (buffer.flat_space.high == [3, 1, 1, 1, 1, 2, 2, 2]).all()
+  buffer.obs_dict['a'] = 2
+  buffer.obs_dict['c'][1] = 1.5
+  assert (buffer.flat == [2, 0, 0, 0, 0, 0, 1.5, 0]).all()
+  with pytest.raises(Exception):
+    buffer.obs_dict['d'] = 0
+  with pytest.raises(Exception):
+    ObservationBuffer(spaces.Dict(dict(a=spaces.MultiDiscrete([2, 3]))))
+
+
+def test_copies_are_plain_and_detached():
+  space = spaces.Dict(dict(a=spaces.Discrete(2), b=spaces.Box(low=-1, high=1, shape=(2, 2), dtype=np.float32)))
+  buffer = ObservationBuffer(space)
+  buffer.obs_dict['b'] = np.ones((2, 2))
+  snapshot = buffer.snapshot()
+  flat = buffer.snapshot_flat()
+  copies = [copy.copy(buffer.obs_dict), copy.deepcopy(buffer.obs_dict), pickle.loads(pickle.dumps(buffer.obs_dict)),
+            buffer.obs_dict.copy(), snapshot]
+  buffer.obs_dict['b'] = np.zeros((2, 2))
+  buffer.obs_dict['a'] = 1
+  assert (flat == [0, 1, 1, 1, 1]).all()
+  for c in copies:
+    assert type(c) is dict and set(c) == {'a', 'b'}
+    assert c['a'] == 0 and (c['b'] == 1).all() and c['b'].shape == (2, 2)
+    assert not np.shares_memory(c['b'], buffer.flat)
@@ -0,0 +1,95 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import math
+
+import numpy as np
+
+from common import CHANNELS, Entity, GridView, OccupancyRasterizer
+from envs import OccupancyObservation
+
+
+def entity(type, x, y, w=8, h=8, **kwargs):
+  e = dict(type=type, pos=dict(x=x, y=y), size=dict(x=w, y=h), isEnemy=False, state='normal')
+  e.update(kwargs)
+  return e
+
+
+def rasterize_loop(gv, entities, exclude_player):
+  '''Marks the cells of every entity one by one.'''
+  W, H = gv.fixed_grid.shape
+  out = np.zeros((len(CHANNELS), W, H), dtype=np.int8)
+  out[0] = gv.fixed_grid
+  for e in entities:
+    channels = []
+    if e['type'] == 'crackedWall':
+      channels.append(0)
+    if e['isEnemy']:
+      channels.append(1)
+    if e['type'] == 'arrow' and e['state'] == 'flying':
+      channels.append(2)
+    if e['type'] == 'arrow' and e['state'] == 'stuck':
+      channels.append(3)
+    if e['type'] == 'item':
+      channels.append(4)
+    if e['type'] == 'archer' and e.get('playerIndex') != exclude_player:
+      channels.append(5)
+    x, y, w, h = e['pos']['x'], e['pos']['y'], e['size']['x'], e['size']['y']
+    for i in range(math.floor((x - w/2) / gv.gf), math.ceil((x + w/2) / gv.gf)):
+      for j in range(math.floor((y - h/2) / gv.gf), math.ceil((y + h/2) / gv.gf)):
+        for c in channels:
+          out[c, i % W, j % H] = 1
+  return out
+
+
+def test_matches_loop():
+  rng = np.random.default_rng(0)
+  grid = (rng.random((32, 24)) < 0.1).astype(int)
+  gv = GridView(5)
+  gv.set_scenario(dict(grid=grid.tolist(), cellSize=10))
+  rasterizer = OccupancyRasterizer(gv, exclude_player=0)
+  for frame in range(5):
+    entities = [
+      entity('archer', 3, 100, 8, 14, playerIndex=0),
+      entity('archer', 318, 238, 8, 14, playerIndex=1),  # Over both edges
+      entity('slime', *rng.uniform(0, 320, 2), isEnemy=True),
+      entity('crackedWall', 160, 1, 10, 10),
+      entity('item', *rng.uniform(0, 240, 2)),
+      entity('archer', 200, 50, 8, 14, playerIndex=2, isEnemy=True),  # In two channels
+    ]
+    for _ in range(20):
+      entities.append(entity('arrow', *rng.uniform(-20, 340, 2), *rng.uniform(1, 12, 2), state=rng.choice(['flying', 'stuck'])))
+    out = rasterizer.rasterize(entities)
+    assert np.array_equal(out, rasterize_loop(gv, entities, 0)), frame
+    assert out is rasterizer.out
+  assert rasterizer.channel('archers')[0, 0] and not rasterizer.channel('archers')[0, 20]
+
+
+def test_channel_subset_and_empty_update():
+  gv = GridView(10)
+  gv.set_scenario(dict(grid=np.zeros((32, 24), dtype=int).tolist(), cellSize=10))
+  rasterizer = OccupancyRasterizer(gv, channels=['items', 'enemies'])
+  out = rasterizer.rasterize([entity('item', 15, 15, 10, 10)])
+  assert out.shape == (2, 32, 24)
+  assert out[0].sum() == 1 and out[0, 1, 1] and out[1].sum() == 0
+  assert not rasterizer.rasterize([]).any()
+
+
+def test_occupancy_observation():
+  scenario = dict(grid=np.zeros((32, 24), dtype=int).tolist(), cellSize=10)
+  player = Entity(entity('archer', 160, 130, vel=dict(x=0, y=0), playerIndex=0))
+  other = Entity(entity('archer', 140, 130, vel=dict(x=0, y=0), playerIndex=1))
+  slime = Entity(entity('slime', 185, 135, 10, 10, vel=dict(x=0, y=0), isEnemy=True))
+  obs = OccupancyObservation(GridView(5), sight=50, channels=['enemies', 'archers'])
+  space = {}
+  obs.extend_obs_space(space)
+  obs_dict = {}
+  obs.post_reset(scenario, player, [player, other, slime], obs_dict)
+  occupancy = obs_dict['occupancy']
+  assert occupancy.shape == space['occupancy'].shape == (2, 20, 20)
+  # The player is at the center of the view.
+  assert occupancy[0].sum() == 4 and occupancy[0, 14:16, 10:12].all()
+  assert occupancy[1].sum() == 4 and occupancy[1, 5:7, 9:11].all()
+  obs.post_step(None, [other, slime], '', obs_dict)
+  assert (obs_dict['occupancy'] == occupancy).all()
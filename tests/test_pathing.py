@@ -0,0 +1,69 @@
+import sys
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import Entity, PathGrid, Vec2, grid_pos, load_level
+
+
+def make_entity(x, y):
+  return Entity(dict(type='slime', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+
+
+def reference_closest(start, entities, wall):
+  '''Breadth first search over cell objects, the way PathGrid used to search.'''
+  W, H = wall.shape
+  by_cell = {}
+  for e in entities:
+    i, j = grid_pos(e.p, 10)
+    by_cell.setdefault((i % W, j % H), []).append(e)
+  i, j = grid_pos(start, 10)
+  start = (i % W, j % H)
+  prev = {start: None}
+  to_visit = [start]
+  while to_visit:
+    cell = to_visit.pop(0)
+    if cell in by_cell:
+      cells = [cell]
+      while prev[cells[-1]] is not None:
+        cells.append(prev[cells[-1]])
+      return by_cell[cell][0], cells[::-1]
+    for di, dj in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+      next = ((cell[0] + di) % W, (cell[1] + dj) % H)
+      if next not in prev and not wall[next]:
+        prev[next] = cell
+        to_visit.append(next)
+  return None, None
+
+
+def test_matches_object_search_and_reuses_buffers():
+  wall = np.array(load_level('level_sample.xml')['grid'])
+  free = np.argwhere(wall == 0)
+  rng = np.random.default_rng(0)
+  path_grid = PathGrid(10)
+  for _ in range(30):
+    start = Vec2(*((free[rng.integers(len(free))] + 0.5) * 10))
+    entities = [make_entity(*((free[k] + rng.uniform(0, 1, 2)) * 10)) for k in rng.choice(len(free), 3)]
+    e, path = path_grid.get_closest_entity(start, entities, wall)
+    expected, cells = reference_closest(start, entities, wall)
+    assert e is expected
+    walked = [path.start]
+    while walked[-1] is not path.end:
+      walked.append(walked[-1].next)
+    assert [(c.i, c.j) for c in walked] == cells
+    assert path.end.depth == len(cells) - 1
+  stamp = path_grid.stamp
+  path_grid.get_closest_entity(start, entities, wall)
+  assert path_grid.stamp is stamp
+
+
+def test_unreachable_and_same_cell():
+  wall = np.zeros((32, 24), dtype=int)
+  wall[10, :] = 1
+  wall[20, :] = 1
+  path_grid = PathGrid(10)
+  assert path_grid.get_closest_entity(Vec2(155, 55), [make_entity(55, 55)], wall) == (None, None)
+  target = make_entity(151, 52)
+  e, path = path_grid.get_closest_entity(Vec2(155, 55), [target], wall)
+  assert e is target
+  assert path.start is path.end is path.checkpoint
@@ -0,0 +1,110 @@
+import sys
+sys.path.insert(0, '.')
+
+import heapq
+
+import numpy as np
+
+from common import ArcherMotion, PlatformGraph, level_platform_graph, load_level, measure_archer_motion
+
+
+def make_wall():
+  return np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+
+
+def make_steps(height: int):
+  '''Floor at j=0 with a block of the given height in the middle, and a ceiling far above.'''
+  wall = np.zeros((20, 16), dtype=np.int8)
+  wall[:, 0] = 1
+  wall[:, 15] = 1
+  wall[9:11, 1:1 + height] = 1
+  return wall
+
+
+def dijkstra(graph, s, g):
+  best = {s: 0.0}
+  heap = [(0.0, s)]
+  while heap:
+    cost, k = heapq.heappop(heap)
+    if k == g:
+      return cost
+    if cost > best[k]:
+      continue
+    for t, c, _ in graph.neighbours(graph.cell(k)):
+      t = graph.index(t)
+      if cost + c < best.get(t, np.inf):
+        best[t] = cost + c
+        heapq.heappush(heap, (cost + c, t))
+  return None
+
+
+def test_standable_and_walks():
+  graph = PlatformGraph(make_steps(1))
+  assert graph.standable[3, 1] and graph.standable[9, 2] and not graph.standable[3, 2]
+  moves = {(cell, move) for cell, _, move in graph.neighbours((3, 1))}
+  assert ((2, 1), 'walk') in moves and ((4, 1), 'walk') in moves
+  # Off the block the archer falls.
+  assert any(move == 'fall' and cell[1] == 1 for cell, _, move in graph.neighbours((10, 2)))
+
+
+def test_jump_height():
+  low = PlatformGraph(make_steps(1), motion=ArcherMotion(dash_distance=0))
+  moves = [move for _, move in low.route((3, 1), (9, 2))]
+  assert moves[-1] == 'jump' and set(moves[1:-1]) <= {'walk'}
+  high = PlatformGraph(make_steps(3), motion=ArcherMotion(dash_distance=0))
+  assert high.route((3, 1), (9, 4)) is None
+  assert not high.reachable((3, 1))[9, 4]
+  # Going down is still possible, and a dash gets on top.
+  assert high.route((9, 4), (3, 1)) is not None
+  assert PlatformGraph(make_steps(3)).route((3, 1), (9, 4)) is not None
+
+
+def test_route_is_fastest():
+  graph = level_platform_graph(make_wall())
+  rng = np.random.default_rng(0)
+  nodes = graph.nodes
+  for _ in range(30):
+    s, g = rng.choice(nodes, 2)
+    route = graph.route(graph.cell(s), graph.cell(g))
+    expected = dijkstra(graph, s, g)
+    if expected is None:
+      assert route is None
+      continue
+    assert route[0] == (graph.cell(s), '') and route[-1][0] == graph.cell(g)
+    assert abs(graph.route_cost(route) - expected) < 1e-3
+    assert graph.route(graph.cell(s), graph.cell(g)) is route
+  assert level_platform_graph(make_wall()) is graph
+
+
+def test_can_reach():
+  graph = level_platform_graph(make_wall())
+  assert graph.node_at((160, 130)) == (16, 11)
+  # A target just above the floor can be reached, one high in the air can't.
+  assert graph.can_reach((160, 130), (35, 25))
+  assert not graph.can_reach((160, 130), (40, 110))
+
+
+def test_measure_archer_motion():
+  motion = ArcherMotion(body_size=(8, 12), run_speed=1.2, gravity=0.25, max_fall=2.5, jump_height=24)
+  x, y, vy = 310.0, 200.0, 0.0
+  frames = []
+  for t in range(60):
+    on_ground = t < 10 or y <= 100
+    frames.append(dict(entities=[
+      dict(type='slime', playerIndex=0, pos=dict(x=0, y=0)),
+      dict(type='archer', playerIndex=0, pos=dict(x=x, y=y), size=dict(x=8, y=12), onGround=on_ground,
+           onWall=False, state='normal')]))
+    if t == 9:
+      vy = motion.jump_speed
+    elif on_ground:
+      vy = 0.0
+    if not on_ground or t == 9:
+      vy = max(vy - motion.gravity, -motion.max_fall)
+    # Wraps around the right border while running.
+    x = (x + motion.run_speed) % 320
+    y = max(y + vy, 100)
+  measured = measure_archer_motion(frames, base=ArcherMotion(dash_speed=5))
+  assert measured.body_size == (8, 12) and measured.dash_speed == 5
+  for name in ('run_speed', 'gravity', 'max_fall', 'jump_height'):
+    assert abs(getattr(measured, name) - getattr(motion, name)) < 1e-6, name
+  assert measure_archer_motion([]).gravity == ArcherMotion().gravity
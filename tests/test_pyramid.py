@@ -0,0 +1,78 @@
+import sys
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import Entity, GridView, OccupancyPyramid, line_of_sight, load_level, pool_grid, set_backend
+
+
+def make_entity(type, x, y, w, h):
+  return Entity(dict(type=type, pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=w, y=h), isEnemy=False))
+
+
+def test_levels_pool_blocks():
+  grid = np.zeros((8, 4), dtype=np.int8)
+  grid[0, 0] = 1
+  grid[2:4, 2:4] = 1
+  pyramid = OccupancyPyramid(grid, 1)
+  assert [g.shape for g in pyramid.any_levels] == [(8, 4), (4, 2), (2, 1)]
+  assert pool_grid(grid).tolist() == pyramid.any_levels[1].tolist() == [[1, 0], [0, 1], [0, 0], [0, 0]]
+  assert pyramid.full_levels[1].tolist() == [[0, 0], [0, 1], [0, 0], [0, 0]]
+  # A size is odd at the last level, so it stops there.
+  assert len(OccupancyPyramid(grid, 1, max_levels=10)) == 3
+
+
+def test_line_of_sight_matches_fine_grid():
+  rng = np.random.default_rng(1)
+  scenario = load_level('level_sample.xml')
+  for gf in [1, 2, 5]:
+    gv = GridView(gf)
+    gv.set_scenario(scenario)
+    pyramid = OccupancyPyramid(gv.grid, gf)
+    p1 = rng.uniform(0, [320, 240], size=(500, 2))
+    p2 = p1 + rng.uniform(-200, 200, size=(500, 2))
+    p2[:10] = p1[:10]
+    # Axis aligned segments along cell boundaries.
+    p1[10:20] = np.floor(p1[10:20] / 16) * 16
+    p2[10:20] = p1[10:20] + [[rng.uniform(-150, 150), 0]]
+    expected = line_of_sight(gv.grid, gf, p1, p2)
+    for level in range(len(pyramid)):
+      assert (pyramid.line_of_sight(p1, p2, level=level) == expected).all()
+    assert pyramid.line_of_sight(p1[20], p2[20]) == expected[20]
+    assert (gv.is_clean_path_batch(p1, p2) == expected).all()
+    # The numpy kernels go through the pyramid for large batches over fine grids.
+    set_backend('numpy')
+    try:
+      assert (gv.is_clean_path_batch(p1, p2) == expected).all()
+    finally:
+      set_backend(None)
+
+
+def test_nearest_free_cell():
+  rng = np.random.default_rng(2)
+  gv = GridView(2)
+  gv.set_scenario(load_level('level_sample.xml'))
+  pyramid = gv.get_pyramid()
+  i, j = np.nonzero(gv.grid == 0)
+  size = np.array([320, 240])
+  for pos in rng.uniform(0, size, size=(50, 2)):
+    d = (np.stack([i, j], axis=1) * 2 + 1 - pos + size / 2) % size - size / 2
+    best = np.hypot(*d.T).min()
+    ni, nj = pyramid.nearest_free_cell(pos)
+    assert gv.grid[ni, nj] == 0
+    d = (np.array([ni, nj]) * 2 + 1 - pos + size / 2) % size - size / 2
+    assert np.isclose(np.hypot(*d), best)
+  assert OccupancyPyramid(np.ones((4, 4), dtype=np.int8), 1).nearest_free_cell((1, 1)) is None
+
+
+def test_pyramid_follows_cracked_walls():
+  gv = GridView(1)
+  gv.set_scenario(load_level('level_sample.xml'))
+  player = make_entity('archer', 160, 110, 8, 14)
+  gv.update([player], player)
+  assert gv.get_pyramid().line_of_sight((100, 130), (220, 130))
+  wall = make_entity('crackedWall', 160, 130, 20, 20)
+  gv.update([player, wall], player)
+  assert not gv.get_pyramid().line_of_sight((100, 130), (220, 130))
+  gv.update([player], player)
+  assert gv.get_pyramid().line_of_sight((100, 130), (220, 130))
@@ -0,0 +1,95 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import Entity, GridView, PathGrid, Vec2, cast_rays, line_of_sight, ray_directions
+
+
+def make_grid():
+  grid = np.zeros((32, 24), dtype=int)
+  grid[20, :] = 1  # Vertical wall at x in [200, 210)
+  grid[:, 2] = 1  # Floor at y in [20, 30)
+  return grid
+
+
+def march(grid, cell_size, origin, direction, max_dist, step=4e-3):
+  '''Walks the ray in tiny steps. Slow but obviously right.'''
+  d = np.asarray(direction, dtype=np.float64)
+  d /= np.linalg.norm(d)
+  t = 0
+  while t < max_dist:
+    i, j = ((np.asarray(origin) + d * t) // cell_size).astype(int)
+    if grid[i % grid.shape[0], j % grid.shape[1]]:
+      return t
+    t += step
+  return max_dist
+
+
+def test_axis_rays_and_wrap():
+  dist = cast_rays(make_grid(), 10, (105, 105), [(1, 0), (-1, 0), (0, -1), (0, 1), (0, 0)], 300)
+  # Left and up go around the edges of the arena.
+  assert np.allclose(dist, [95, 215, 75, 155, 300])
+  assert np.allclose(cast_rays(make_grid(), 10, (105, 25), [(1, 0)], 300), [0])
+  assert np.allclose(cast_rays(make_grid(), 10, (105, 105), [(1, 0)], 50), [50])
+
+
+def test_matches_marching():
+  rng = np.random.default_rng(0)
+  grid = (rng.random((32, 24)) < 0.15).astype(int)
+  origins = rng.uniform(0, 300, size=(20, 2))
+  directions = rng.normal(size=(20, 2))
+  dist = cast_rays(grid, 10, origins, directions, 80)
+  expected = [march(grid, 10, o, d, 80) for o, d in zip(origins, directions)]
+  assert np.allclose(dist, expected, atol=5e-3)
+
+
+def test_grid_view_ray():
+  gv = GridView(5)
+  gv.set_scenario(dict(grid=make_grid().tolist(), cellSize=10))
+  assert gv.ray(Vec2(105, 105), Vec2(2, 0), 300) == 95
+  assert gv.ray(Vec2(105, 105), Vec2(0, 2), 100) == 100
+  assert np.allclose(ray_directions(4), [(1, 0), (0, 1), (-1, 0), (0, -1)], atol=1e-12)
+
+
+def test_line_of_sight_thin_walls_and_corners():
+  grid = np.zeros((160, 120), dtype=int)
+  grid[50, 40:80] = 1  # Wall one cell thick at x in [100, 102)
+  assert not line_of_sight(grid, 2, (90, 100), (110, 103))
+  # Grazing the end of the wall, only through its corner.
+  assert not line_of_sight(grid, 2, (98, 164), (104, 158))
+  assert line_of_sight(grid, 2, (98, 166), (104, 160))
+
+  grid = np.zeros((32, 24), dtype=int)
+  grid[5, 4] = 1
+  # Diagonals between cell centers go through corners, where both cells beside it are checked.
+  assert not line_of_sight(grid, 10, (35, 35), (65, 65))
+  assert not line_of_sight(grid, 10, (65, 65), (35, 35))
+  assert line_of_sight(grid, 10, (35, 55), (65, 85))
+
+
+def test_line_of_sight_wrap_and_batch():
+  grid = np.zeros((32, 24), dtype=int)
+  grid[0, :] = 1
+  grid[16, 10] = 1
+  assert not line_of_sight(grid, 10, (315, 50), (15, 50))
+  assert line_of_sight(grid, 10, (315, 50), (15, 50), wrap_around=False)
+  assert line_of_sight(grid, 10, (315, 50), (305, 50))
+  assert not line_of_sight(grid, 10, (5, 50), (5, 50))
+
+  p2 = [(165, 5), (165, 105), (100, 105), (315, 105), (165, 235)]
+  assert line_of_sight(grid, 10, (165, 55), p2).tolist() == [True, False, True, True, True]
+  assert line_of_sight(grid, 10, np.full((2, 3, 2), 55.0), np.full((2, 3, 2), 75.0)).shape == (2, 3)
+
+
+def test_path_checkpoint():
+  grid = np.zeros((32, 24), dtype=int)
+  grid[6, 0:6] = 1
+  path_grid = PathGrid(10)
+  target = Entity(dict(type='slime', pos=dict(x=85, y=25), vel=dict(x=0, y=0), size=dict(x=8, y=8), isEnemy=True))
+  e, path = path_grid.get_closest_entity(Vec2(45, 25), [target], grid)
+  assert e is target
+  # The checkpoint is the last cell before the path goes around the wall out of sight.
+  assert line_of_sight(grid, 10, (45, 25), (path.checkpoint.pos.x, path.checkpoint.pos.y))
+  assert not line_of_sight(grid, 10, (45, 25), (path.checkpoint.next.pos.x, path.checkpoint.next.pos.y))
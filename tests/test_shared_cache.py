@@ -0,0 +1,126 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from common import Entity, GridView, SharedLevelCache, load_level, use_shared_level_cache
+from envs.curriculums import FollowCloseTargetCurriculum
+
+
+def _attach(prefix, queue):
+  cache = SharedLevelCache(prefix)
+  a = cache.get('a')
+  queue.put(None if a is None else (a.sum(), a.flags.writeable))
+  cache.close()
+
+
+def _set_scenario(prefix, grid, queue):
+  use_shared_level_cache(SharedLevelCache(prefix))
+  gv = GridView(5)
+  gv.set_scenario(dict(grid=grid, cellSize=10))
+  queue.put(int(gv.fixed_grid.sum()))
+
+
+def run(target, *args):
+  # Spawned instead of forked so the worker doesn't inherit the grids cached in this process.
+  ctx = mp.get_context('spawn')
+  queue = ctx.Queue()
+  p = ctx.Process(target=target, args=args + (queue,))
+  p.start()
+  result = queue.get(timeout=30)
+  p.join()
+  return result
+
+
+def test_publish_and_attach_from_another_process():
+  cache = SharedLevelCache(f'test{os.getpid()}')
+  try:
+    assert cache.get('a') is None
+    a = cache.get_or_create('a', lambda: np.arange(12, dtype=np.int32).reshape(3, 4))
+    assert a.shape == (3, 4) and not a.flags.writeable
+    assert cache.get_or_create('a', lambda: np.zeros(1)) is not None
+    assert run(_attach, cache.prefix) == (66, False)
+  finally:
+    cache.unlink()
+  assert SharedLevelCache(cache.prefix).get('a') is None
+
+
+def test_level_grids_shared_with_workers():
+  grid = np.zeros((32, 24), dtype=int)
+  grid[:, 0] = 1
+  # A level no other test uses, so it isn't in the cache of this process yet.
+  grid[7, 13] = 1
+  cache = SharedLevelCache(f'test{os.getpid()}')
+  use_shared_level_cache(cache)
+  try:
+    gv = GridView(5)
+    gv.set_scenario(dict(grid=grid.tolist(), cellSize=10))
+    assert len(cache._owned) == 2
+    # The worker attaches to the blocks published here.
+    assert run(_set_scenario, cache.prefix, grid.tolist()) == gv.fixed_grid.sum() == 64 * 2 + 4
+  finally:
+    use_shared_level_cache(None)
+    cache.unlink()
+
+
+def test_header_size_limit():
+  cache = SharedLevelCache(f'hdr{os.getpid()}')
+  try:
+    # Shapes with more dimensions make longer headers, going one byte at a time through the size limit.
+    for n in range(28, 36):
+      for last in (1, 10, 100):
+        shape = (1,) * n + (last,)
+        try:
+          cache.publish(f'a{n}_{last}', np.zeros(shape, dtype=np.int8))
+        except Exception as e:
+          assert 'too long' in str(e)
+          continue
+        assert SharedLevelCache(cache.prefix).get(f'a{n}_{last}').shape == shape
+  finally:
+    cache.unlink()
+
+
+def test_curriculum_tasks_shared(tmp_path):
+  scenario = load_level('level_sample.xml')
+  spawn = scenario['playerSpawns'][0]
+  player = Entity(dict(type='archer', pos=spawn, vel=dict(x=0, y=0), size=dict(x=8, y=14), isEnemy=False))
+  cache = SharedLevelCache(f'cur{os.getpid()}')
+  use_shared_level_cache(cache)
+  try:
+    first = FollowCloseTargetCurriculum(GridView(5), distance=20, filename=str(tmp_path / 'a.json'))
+    assert not first.is_reset_valid(scenario, player, [player])
+    assert len(first.start_ends) > 0
+    # Another worker attaches to the tasks instead of creating them.
+    second = FollowCloseTargetCurriculum(GridView(5), distance=20, filename=str(tmp_path / 'b.json'))
+    second.create_tasks = None
+    assert not second.is_reset_valid(scenario, player, [player])
+    assert sorted((s.x, s.y, e.x, e.y) for s, e in second.start_ends) == \
+      sorted((s.x, s.y, e.x, e.y) for s, e in first.start_ends)
+  finally:
+    use_shared_level_cache(None)
+    cache.unlink()
+
+
+def test_block_being_filled_is_not_read():
+  cache = SharedLevelCache(f'half{os.getpid()}')
+  try:
+    # Created by another process that has not written the header and the ready flag yet.
+    block = shared_memory.SharedMemory(name=cache.block_name('a'), create=True, size=256)
+    assert cache.get('a') is None
+    # Publishing waits for it, then uses its own copy.
+    a = cache.publish('a', np.arange(3))
+    assert (a == [0, 1, 2]).all() and not a.flags.writeable
+    # A header for more data than the block holds is not read either.
+    header = b'{"dtype": "<i8", "shape": [1000]}\0'
+    block.buf[1:1 + len(header)] = header
+    block.buf[0] = 1
+    assert cache.get('a') is None
+    block.close()
+    block.unlink()
+  finally:
+    cache.unlink()
@@ -0,0 +1,49 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import HEIGHT, WIDTH, SpatialHash
+
+
+def brute_distance(positions, p):
+  d = np.abs(positions - np.asarray(p))
+  d = np.minimum(d, (WIDTH, HEIGHT) - d)
+  return np.sqrt((d**2).sum(axis=1))
+
+
+def check_queries(n_points):
+  rng = np.random.default_rng(n_points)
+  positions = rng.uniform((0, 0), (WIDTH, HEIGHT), size=(n_points, 2))
+  spatial_hash = SpatialHash(cell_size=20)
+  spatial_hash.build(positions)
+
+  for p in [(0, 0), (319.5, 5), (160, 239), (-10, 250), (100, 100)]:
+    dist = brute_distance(positions, np.mod(p, (WIDTH, HEIGHT)))
+
+    idx, d = spatial_hash.knn(p, 7)
+    assert np.allclose(d, np.sort(dist)[:7])
+    assert np.allclose(dist[idx], d)
+
+    idx, d = spatial_hash.query_radius(p, 35)
+    assert set(idx) == set(np.nonzero(dist <= 35)[0])
+    assert np.all(np.diff(d) >= 0)
+
+    bl = np.asarray(p) - (30, 15)
+    idx = spatial_hash.query_box(bl, bl + (60, 30))
+    inside = ((positions[:, 0] - bl[0]) % WIDTH < 60) & ((positions[:, 1] - bl[1]) % HEIGHT < 30)
+    assert set(idx) == set(np.nonzero(inside)[0])
+
+  idx, _ = spatial_hash.knn((10, 10), 5000)
+  assert len(idx) == len(positions)
+
+
+def test_spatial_hash():
+  check_queries(30)
+  check_queries(800)
+
+  spatial_hash = SpatialHash()
+  spatial_hash.build(np.zeros((0, 2)))
+  assert len(spatial_hash.knn((10, 10), 3)[0]) == 0
+  assert len(spatial_hash.query_radius((10, 10), 50)[0]) == 0
@@ -0,0 +1,71 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from common import ArrowPredictor, Entity, GridView
+from envs import ArrowDangerObservation
+
+
+def make_grid_view():
+  grid = np.zeros((32, 24), dtype=int)
+  grid[20, :] = 1  # Vertical wall at x in [200, 210)
+  grid[:, 2] = 1  # Floor at y in [20, 30)
+  gv = GridView(5)
+  gv.set_scenario(dict(grid=grid.tolist(), cellSize=10))
+  return gv
+
+
+def test_predict_gravity_and_walls():
+  predictor = ArrowPredictor(make_grid_view(), frames=20, gravity=0.5)
+  traj, impact = predictor.predict(
+    np.array([[100., 150.], [150., 100.], [50., 60.]]),
+    np.array([[0., 0.], [6., 0.], [0., 0.]]))
+
+  # Free fall: y(t) = y0 - g * t * (t + 1) / 2 with semi-implicit Euler.
+  t = np.arange(6)
+  assert np.allclose(traj[:6, 0, 1], 150 - 0.5 * t * (t + 1) / 2)
+  assert np.allclose(traj[:, 0, 0], 100)
+
+  # Moving right, it gets stuck before entering the wall at x=200.
+  assert impact[1] <= 9
+  assert np.all(traj[:, 1, 0] < 200)
+  assert np.all(traj[impact[1]:, 1] == traj[impact[1], 1])
+
+  # Falls onto the floor at y=30.
+  assert impact[2] <= 20
+  assert traj[-1, 2, 1] >= 30
+
+
+def test_danger_map():
+  predictor = ArrowPredictor(make_grid_view(), frames=10, gravity=0)
+  traj, impact = predictor.predict(np.array([[100., 100.]]), np.array([[5., 0.]]))
+  danger = predictor.danger_map((120, 100), traj, impact, (8, 4), 10)
+  # Row j=2 holds y in [100, 110). Cell i holds x in [120 + 10 * (i - 4), ...).
+  assert list(danger[:, 2]) == [np.inf, np.inf, 0, 2, 4, 6, 8, 10]
+  assert np.all(np.isinf(danger[:, [0, 1, 3]]))
+
+  # Wraps around the arena edge.
+  traj, impact = predictor.predict(np.array([[318., 100.]]), np.array([[5., 0.]]))
+  danger = predictor.danger_map((5, 100), traj, impact, (4, 4), 10)
+  assert danger[1, 2] == 0 and danger[2, 2] == 2
+
+
+def test_arrow_danger_observation_alone():
+  player = Entity(dict(type='archer', pos=dict(x=120, y=105), vel=dict(x=0, y=0), size=dict(x=8, y=14), isEnemy=False))
+  arrow = Entity(dict(type='arrow', pos=dict(x=95, y=105), vel=dict(x=5, y=0), size=dict(x=8, y=2), isEnemy=False,
+                      state='flying'))
+  open_grid = np.zeros((32, 24), dtype=int)
+  walled_grid = open_grid.copy()
+  walled_grid[13, :] = 1  # Vertical wall at x in [130, 140)
+  dangers = []
+  for grid in (open_grid, walled_grid):
+    # Alone, so nothing else sets the scenario of its grid view.
+    observation = ArrowDangerObservation(GridView(5), sight=40, frames=10)
+    obs_dict = {}
+    observation.post_reset(dict(grid=grid.tolist(), cellSize=10), player, [player, arrow], obs_dict)
+    dangers.append(obs_dict['arrow_danger'])
+  # Row j=3 holds the arrow. Cell i holds x in [120 + 10 * (i - 4), ...).
+  assert np.all(dangers[0][2:7, 3] > 0)
+  assert np.all(dangers[1][2:5, 3] > 0) and np.all(dangers[1][5:, 3] == 0)
@@ -0,0 +1,87 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+
+import numpy as np
+
+from common import (Entity, PathGrid, SharedLevelCache, Vec2, VisibilityTable, level_visibility, line_of_sight,
+                    load_level, use_shared_level_cache)
+
+
+def make_wall():
+  return np.array(load_level('level_sample.xml')['grid'], dtype=np.int8)
+
+
+def make_entity(x, y):
+  return Entity(dict(type='slime', pos=dict(x=x, y=y), vel=dict(x=0, y=0), size=dict(x=10, y=10), isEnemy=True))
+
+
+def test_bits_match_line_of_sight():
+  wall = make_wall()
+  table = level_visibility(wall, 10)
+  rng = np.random.default_rng(0)
+  cells = np.stack([rng.integers(0, 32, 500), rng.integers(0, 24, 500)], axis=1)
+  targets = np.stack([rng.integers(0, 32, 500), rng.integers(0, 24, 500)], axis=1)
+  expected = line_of_sight(wall, 10, (cells + 0.5) * 10, (targets + 0.5) * 10)
+  # Nothing is seen from or through to blocked cells.
+  expected &= (wall[cells[:, 0], cells[:, 1]] == 0) & (wall[targets[:, 0], targets[:, 1]] == 0)
+  assert (table.can_see((cells + 0.5) * 10, (targets + 0.5) * 10) == expected).all()
+  for c, t, e in zip(cells[:50], targets[:50], expected[:50]):
+    assert table.visible(tuple(c), tuple(t)) == e
+    assert table.visible_from(tuple(c))[tuple(t)] == e
+  assert (table.visible_cells(tuple(cells[0]), targets) == table.can_see((cells[0] + 0.5) * 10, (targets + 0.5) * 10)).all()
+
+
+def test_paths_checkpoint_and_waypoints():
+  wall = make_wall()
+  free = np.argwhere(wall == 0)
+  rng = np.random.default_rng(1)
+  path_grid = PathGrid(10)
+  smooth_grid = PathGrid(10)
+  smooth_grid.visibility = table = level_visibility(wall, 10)
+  W, H = wall.shape
+  for _ in range(20):
+    start = Vec2(*((free[rng.integers(len(free))] + 0.5) * 10))
+    entities = [make_entity(*((free[k] + 0.5) * 10)) for k in rng.choice(len(free), 3)]
+    _, expected = path_grid.get_closest_entity(start, entities, wall)
+    _, path = smooth_grid.get_closest_entity(start, entities, wall)
+    if expected is None:
+      assert path is None
+      continue
+    assert expected.waypoints is None
+    assert (path.checkpoint.i, path.checkpoint.j) == (expected.checkpoint.i, expected.checkpoint.j)
+    waypoints = path.waypoints
+    assert waypoints[0] is path.start and waypoints[-1] is path.end
+    for a, b in zip(waypoints[:-1], waypoints[1:]):
+      assert a.depth < b.depth
+      adjacent = (abs(a.i - b.i) % (W - 2)) + (abs(a.j - b.j) % (H - 2)) == 1
+      assert adjacent or table.visible((a.i, a.j), (b.i, b.j))
+
+
+def test_other_level_is_ignored():
+  wall = make_wall()
+  other = wall.copy()
+  other[:, 1] = 0
+  path_grid = PathGrid(10)
+  path_grid.visibility = level_visibility(wall, 10)
+  _, path = path_grid.get_closest_entity(Vec2(15, 15), [make_entity(305, 15)], other)
+  assert path.waypoints is None
+
+
+def test_precomputed_and_shared():
+  wall = np.zeros((10, 6), dtype=np.int8)
+  wall[3, 1:5] = 1
+  table = VisibilityTable(wall, 10)
+  assert not table.visible((1, 2), (4, 2)) and table.visible((1, 0), (4, 0))
+  arrays = dict(grid10=wall, visibility=table.bits)
+  cache = SharedLevelCache(f'vis{os.getpid()}')
+  use_shared_level_cache(cache)
+  try:
+    shared = level_visibility(wall, 10, arrays)
+    assert not shared.bits.flags.writeable
+    assert (shared.bits == table.bits).all()
+    assert level_visibility(wall, 10) is shared
+  finally:
+    use_shared_level_cache(None)
+    cache.unlink()